@@ -0,0 +1,124 @@
+import asyncio
+import logging
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import text
+
+from app.api.routes import parse_symbols
+from app.core.config import settings
+from app.core.cross_section import CrossSection
+from app.db.database import async_session
+
+logger = logging.getLogger("analytics")
+
+router = APIRouter()
+
+# Fed by the price hub (see main.py); every view below is served from its per-bucket cache
+cross_section = CrossSection(
+    bucket_seconds=settings.analytics_bucket_seconds,
+    buckets=settings.analytics_buckets,
+    max_symbols=settings.analytics_max_symbols,
+)
+
+STOCK_TYPES_SQL = text("SELECT symbol, type FROM stocks")
+
+WINDOW = Query(15, ge=1, le=settings.analytics_buckets - 1, description="Closed buckets to look back over")
+
+async def refresh_types():
+    # Stock.type per symbol for /analytics/sectors; reloaded periodically so new listings get their sector
+    while True:
+        try:
+            async with async_session() as session:
+                rows = (await session.execute(STOCK_TYPES_SQL)).all()
+            cross_section.set_types({symbol: stock_type for symbol, stock_type in rows})
+        except Exception as e:
+            logger.error(f"[Analytics] Loading stock types failed: {e}")
+        await asyncio.sleep(settings.analytics_type_refresh)
+
+async def view(coro):
+    try:
+        return await coro
+    except ValueError as e:
+        # Not enough closed buckets since startup for this window yet
+        raise HTTPException(status_code=503, detail=str(e))
+
+# ---------------------------------
+# Top Movers: /analytics/movers?window=15&limit=20
+# ---------------------------------
+@router.get("/analytics/movers")
+async def movers(window: int = WINDOW, limit: int = Query(20, ge=1, le=500)):
+    result = await view(cross_section.movers(window, limit))
+    return {"window_s": window * settings.analytics_bucket_seconds, **result}
+
+# ---------------------------------
+# Correlation Matrix: /analytics/correlation?symbols=AAPL,MSFT&window=60
+# Pearson correlation of per-bucket log returns; symbols without a full window are listed as missing.
+# The matrix is computed (and cached) for the whole universe, so /analytics/correlation/{symbol} ranks
+# peers across thousands of symbols. Returning it as JSON is what's capped: N symbols are N² numbers,
+# ~9M (tens of MB, seconds of encoding) for 3000, so an unfiltered request is limited to
+# analytics_corr_max_symbols rows and a filtered one to quotes_max_symbols.
+# ---------------------------------
+@router.get("/analytics/correlation")
+async def correlation(symbols: str = Query(None), window: int = WINDOW):
+    rows, corr = await view(cross_section.correlation(window))
+    position = np.full(len(cross_section), -1)
+    position[rows] = np.arange(len(rows))
+
+    if symbols:
+        requested = parse_symbols(symbols)
+        if len(requested) > settings.quotes_max_symbols:
+            raise HTTPException(status_code=400, detail=f"At most {settings.quotes_max_symbols} symbols per request")
+        known, missing = cross_section.lookup(requested)
+        found = [row for row in known if position[row] >= 0]
+        missing += [cross_section.symbols[row] for row in known if position[row] < 0]
+    else:
+        if len(rows) > settings.analytics_corr_max_symbols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{len(rows)} symbols have a full window, more than the {settings.analytics_corr_max_symbols} "
+                       f"returned unfiltered; pass up to {settings.quotes_max_symbols} in symbols=",
+            )
+        found, missing = list(rows), []
+
+    index = position[found]
+    return {
+        "window_s": window * settings.analytics_bucket_seconds,
+        "symbols": [cross_section.symbols[row] for row in found],
+        "matrix": np.round(corr[np.ix_(index, index)], 4).tolist(),
+        "missing": missing,
+    }
+
+# ---------------------------------
+# Most / Least Correlated Peers: /analytics/correlation/AAPL?limit=10
+# ---------------------------------
+@router.get("/analytics/correlation/{symbol}")
+async def peers(symbol: str, window: int = WINDOW, limit: int = Query(10, ge=1, le=100)):
+    rows, corr = await view(cross_section.correlation(window))
+    found, _ = cross_section.lookup([symbol])
+    hits = np.flatnonzero(rows == found[0]) if found else np.empty(0, dtype=int)
+    if not hits.size:
+        raise HTTPException(status_code=404, detail=f"No full {window}-bucket window for {symbol}")
+
+    row = corr[hits[0]].copy()
+    row[hits[0]] = np.nan   # itself
+    order = np.argsort(row)
+    order = order[np.isfinite(row[order])]
+    as_pairs = lambda idx: [[cross_section.symbols[rows[i]], round(float(row[i]), 4)] for i in idx]
+    return {
+        "symbol": symbol,
+        "window_s": window * settings.analytics_bucket_seconds,
+        "most": as_pairs(order[::-1][:limit]),
+        "least": as_pairs(order[:limit]),
+    }
+
+# ---------------------------------
+# Sector / Type Aggregates: /analytics/sectors?window=60
+# ---------------------------------
+@router.get("/analytics/sectors")
+async def sectors(window: int = WINDOW):
+    return {"window_s": window * settings.analytics_bucket_seconds, "types": await view(cross_section.sectors(window))}
+
+@router.get("/analytics/stats")
+async def analytics_stats():
+    return cross_section.stats()
@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.downsample import lttb
+from app.db.database import get_db
+
+router = APIRouter()
+
+# Every query below is a range scan on ix_stock_price_history_stock_time (stock_id, trade_time_stamp)
+
+STOCK_ID_SQL = text("SELECT id FROM stocks WHERE symbol = :symbol")
+
+# Keyset page: (trade_time_stamp, id) after the cursor — no OFFSET, so page N costs the same as page 1
+PAGE_SQL = text("""
+    SELECT id, trade_time_stamp, price
+    FROM stock_price_history
+    WHERE stock_id = :stock_id
+      AND trade_time_stamp >= :start AND trade_time_stamp < :end
+      AND (trade_time_stamp, id) > (:after_ts, :after_id)
+    ORDER BY trade_time_stamp, id
+    LIMIT :limit
+""")
+
+# Server-side time buckets: one row per bucket with the last price plus the range
+BUCKET_SQL = text("""
+    SELECT floor(extract(epoch FROM trade_time_stamp)::float8 / CAST(:width AS float8)) * CAST(:width AS float8) AS bucket,
+           (array_agg(price ORDER BY trade_time_stamp DESC))[1] AS close,
+           min(price) AS low,
+           max(price) AS high
+    FROM stock_price_history
+    WHERE stock_id = :stock_id AND trade_time_stamp >= :start AND trade_time_stamp < :end
+    GROUP BY bucket
+    ORDER BY bucket
+""")
+
+RANGE_SQL = text("""
+    SELECT extract(epoch FROM trade_time_stamp)::float8 AS ts, price
+    FROM stock_price_history
+    WHERE stock_id = :stock_id AND trade_time_stamp >= :start AND trade_time_stamp < :end
+    ORDER BY trade_time_stamp
+    LIMIT :limit
+""")
+
+def lttb_points(rows, points: int) -> list[list]:
+    # Runs in a worker thread: up to history_lttb_max_rows rows are too many to walk on the event loop
+    ts = np.fromiter((r.ts for r in rows), dtype=np.float64, count=len(rows))
+    prices = np.fromiter((r.price for r in rows), dtype=np.float64, count=len(rows))
+    kept = lttb(ts, prices, points)
+    return [[int(t * 1000), p] for t, p in zip(ts[kept].tolist(), prices[kept].tolist())]
+
+def to_utc_naive(ts: Optional[datetime]) -> Optional[datetime]:
+    # stock_price_history stores naive UTC timestamps
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def epoch_ms(ts: datetime) -> int:
+    return int(ts.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    return f"{ts.isoformat()}_{row_id}"
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        ts, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# ---------------------------------
+# /history/{symbol}
+#   raw:     ?limit=1000[&cursor=...]          → keyset-paged rows, "next" cursor until exhausted
+#   bucket:  ?points=1000&method=bucket         → [ts_ms, close, low, high] per time bucket
+#   lttb:    ?points=1000&method=lttb           → [ts_ms, price] keeping the visual shape
+# ---------------------------------
+@router.get("/history/{symbol}")
+async def history(
+    symbol: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: Optional[int] = Query(None, ge=3, le=10_000),
+    method: Literal["bucket", "lttb"] = "bucket",
+    limit: int = Query(1000, ge=1, le=10_000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    end = to_utc_naive(end) or datetime.utcnow()
+    start = to_utc_naive(start) or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    stock_id = (await db.execute(STOCK_ID_SQL, {"symbol": symbol})).scalar()
+    if stock_id is None:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol {symbol}")
+
+    window = {"stock_id": stock_id, "start": start, "end": end}
+
+    if points is None:
+        after_ts, after_id = decode_cursor(cursor) if cursor else (start, 0)
+        rows = (await db.execute(PAGE_SQL, {**window, "after_ts": after_ts, "after_id": after_id, "limit": limit})).all()
+        return {
+            "symbol": symbol,
+            "points": [[epoch_ms(r.trade_time_stamp), r.price] for r in rows],
+            "next": encode_cursor(rows[-1].trade_time_stamp, rows[-1].id) if len(rows) == limit else None,
+        }
+
+    if method == "bucket":
+        width = max((end - start).total_seconds() / points, 0.001)
+        rows = (await db.execute(BUCKET_SQL, {**window, "width": width})).all()
+        return {
+            "symbol": symbol,
+            "bucket_seconds": width,
+            "points": [[int(r.bucket * 1000), r.close, r.low, r.high] for r in rows],
+        }
+
+    rows = (await db.execute(RANGE_SQL, {**window, "limit": settings.history_lttb_max_rows})).all()
+    return {
+        "symbol": symbol,
+        "truncated": len(rows) == settings.history_lttb_max_rows,
+        "points": await asyncio.to_thread(lttb_points, rows, points),
+    }
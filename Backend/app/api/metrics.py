@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Response
+
+from app.api.routes import quote_cache
+from app.api.stream import price_hub
+from app.api.analytics import cross_section
+from services.metrics import CONTENT_TYPE, counter, gauge, histogram, render
+
+router = APIRouter()
+
+# Same registry/format as the ingestion services (services/metrics.py), so one scrape config covers all
+REQUEST_SECONDS = histogram("api_request_seconds", "HTTP request duration", ("method", "route", "status"))
+STREAM_CLIENTS = gauge("api_stream_clients", "Connected /ws/prices and /sse/prices clients")
+STREAM_MESSAGES = counter("api_stream_messages_total", "Price messages received from Redis by the hub")
+QUOTE_CACHE = counter("api_quote_cache_total", "Quote cache lookups by outcome, and Redis round trips", ("event",))
+ANALYTICS = counter("api_analytics_total", "Cross-section price updates and view computations/cache hits", ("event",))
+ANALYTICS_SYMBOLS = gauge("api_analytics_symbols", "Symbols tracked in the cross-section matrix")
+
+STREAM_CLIENTS.set_function(lambda: len(price_hub))
+STREAM_MESSAGES.set_function(lambda: price_hub.messages)
+for event in ("hits", "coalesced", "misses", "round_trips"):
+    QUOTE_CACHE.labels(event).set_function(lambda event=event: getattr(quote_cache, event))
+for event in ("updates", "dropped", "computations", "cache_hits"):
+    ANALYTICS.labels(event).set_function(lambda event=event: getattr(cross_section, event))
+ANALYTICS_SYMBOLS.set_function(lambda: len(cross_section))
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -1,7 +1,43 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.config import settings
+from app.core.quote_cache import QuoteCache
+from app.db.redis_client import get_redis
 
 router = APIRouter()
 
+quote_cache = QuoteCache(ttl=settings.quote_cache_ttl)
+
 @router.get("/ping")
 async def ping():
     return {"status": "ok"}
+
+def parse_symbols(symbols: str) -> list[str]:
+    # "AAPL, MSFT,AAPL" → ["AAPL", "MSFT"], order kept
+    return list(dict.fromkeys(s.strip() for s in symbols.split(",") if s.strip()))
+
+# ---------------------------------
+# Batch Quotes
+# ---------------------------------
+@router.get("/quotes")
+async def quotes(symbols: str = Query(..., description="Comma-separated symbols, e.g. AAPL,MSFT,BINANCE:BTCUSDT")):
+    requested = parse_symbols(symbols)
+    if not requested:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(requested) > settings.quotes_max_symbols:
+        raise HTTPException(status_code=400, detail=f"At most {settings.quotes_max_symbols} symbols per request")
+
+    redis = get_redis()
+    if redis is None:
+        raise HTTPException(status_code=503, detail="Redis not connected")
+
+    prices = await quote_cache.get_many(redis, requested)
+    # Compact: symbol → price, with unknown symbols listed once instead of as nulls
+    return {
+        "q": {symbol: price for symbol, price in prices.items() if price is not None},
+        "missing": [symbol for symbol, price in prices.items() if price is None],
+    }
+
+@router.get("/quotes/stats")
+async def quotes_stats():
+    return quote_cache.stats()
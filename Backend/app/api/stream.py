@@ -0,0 +1,131 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.api.routes import parse_symbols, quote_cache
+from app.core.config import settings
+from app.core.price_hub import PriceHub
+from app.db.redis_client import get_redis
+
+router = APIRouter()
+
+# One Redis subscription per process, fanned out to every connected client
+price_hub = PriceHub(max_clients=settings.stream_max_clients)
+
+def limited(symbols: list[str]) -> set[str]:
+    if len(symbols) > settings.quotes_max_symbols:
+        raise ValueError(f"At most {settings.quotes_max_symbols} symbols per stream")
+    return set(symbols)
+
+def symbol_filter(symbols: Optional[str]) -> Optional[set[str]]:
+    if not symbols:
+        return None
+    return limited(parse_symbols(symbols))
+
+def requested_filter(message) -> tuple[bool, Optional[set[str]]]:
+    # (valid, filter) for a client's filter message: {"symbols": [...] | "AAPL,MSFT" | null}. An empty
+    # list means no symbols; too many raises ValueError, as for the query parameter
+    if not isinstance(message, dict) or "symbols" not in message:
+        return False, None
+    requested = message["symbols"]
+    if requested is None:
+        return True, None
+    if isinstance(requested, str):
+        return True, limited(parse_symbols(requested))
+    if isinstance(requested, list) and all(isinstance(s, str) for s in requested):
+        return True, limited(list(dict.fromkeys(s.strip() for s in requested if s.strip())))
+    return False, None
+
+async def initial_snapshot(symbols: Optional[set[str]]) -> dict:
+    # Filtered clients get current prices straight away instead of waiting for the next trade
+    redis = get_redis()
+    if not symbols or redis is None:
+        return {}
+    prices = await quote_cache.get_many(redis, symbols)
+    return {symbol: [price, None] for symbol, price in prices.items() if price is not None}
+
+# ---------------------------------
+# WebSocket: /ws/prices?symbols=AAPL,MSFT
+# Send {"symbols": [...]} (or "AAPL,MSFT") to change the filter, {"symbols": []} for nothing and
+# {"symbols": null} for everything; other messages are ignored.
+# ---------------------------------
+@router.websocket("/ws/prices")
+async def ws_prices(websocket: WebSocket, symbols: Optional[str] = None):
+    await websocket.accept()
+    try:
+        sub = price_hub.subscribe(symbol_filter(symbols))
+    except (ValueError, OverflowError) as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    async def receive_filters():
+        # Returns when the client disconnects or asks for too many symbols
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                continue
+            try:
+                valid, requested = requested_filter(message)
+            except ValueError as e:
+                await websocket.close(code=1013, reason=str(e))
+                return
+            if valid:   # anything malformed leaves the current filter as it is
+                price_hub.update_filter(sub, requested)
+
+    receiver = asyncio.create_task(receive_filters())
+    try:
+        snapshot = await initial_snapshot(sub.symbols)
+        if snapshot:
+            await websocket.send_text(json.dumps(snapshot, separators=(",", ":")))
+        while True:
+            # Whichever comes first: a batch (or heartbeat) to send, or the client going away
+            batch = asyncio.create_task(sub.next_batch(timeout=settings.stream_heartbeat))
+            await asyncio.wait({receiver, batch}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                batch.cancel()   # nothing is lost: undelivered updates stay pending on the subscriber
+                break
+            await websocket.send_text(json.dumps(batch.result(), separators=(",", ":")))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        price_hub.unsubscribe(sub)
+
+# ---------------------------------
+# Server-Sent Events: /sse/prices?symbols=AAPL,MSFT
+# ---------------------------------
+@router.get("/sse/prices")
+async def sse_prices(request: Request, symbols: Optional[str] = Query(None)):
+    try:
+        sub = price_hub.subscribe(symbol_filter(symbols))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            snapshot = await initial_snapshot(sub.symbols)
+            if snapshot:
+                yield f"data: {json.dumps(snapshot, separators=(',', ':'))}\n\n"
+            while not await request.is_disconnected():
+                batch = await sub.next_batch(timeout=settings.stream_heartbeat)
+                if batch:
+                    yield f"data: {json.dumps(batch, separators=(',', ':'))}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            price_hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/stream/stats")
+async def stream_stats():
+    return price_hub.stats()
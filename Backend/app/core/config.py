@@ -20,6 +20,24 @@ class Settings(BaseSettings):
     redis_url: str
     finnhub_api_key: str
 
+    # /quotes
+    quote_cache_ttl: float = 0.25       # seconds a cached price may be served
+    quotes_max_symbols: int = 1000      # symbols per request
+
+    # /ws/prices and /sse/prices
+    stream_max_clients: int = 5000      # per API process
+    stream_heartbeat: float = 15.0      # seconds between keep-alives on idle streams
+
+    # /history
+    history_lttb_max_rows: int = 500_000    # raw rows read per LTTB request
+
+    # /analytics
+    analytics_bucket_seconds: float = 60.0  # width of one time bucket
+    analytics_buckets: int = 240            # buckets kept per symbol (4h at 60s)
+    analytics_max_symbols: int = 8192       # preallocated rows; symbols beyond this are ignored
+    analytics_corr_max_symbols: int = 500   # largest matrix returned unfiltered (N² JSON numbers; computed for all)
+    analytics_type_refresh: float = 300.0   # seconds between Stock.type reloads
+
     model_config = SettingsConfigDict(env_file_encoding="utf-8")
 
 # Exported settings
@@ -0,0 +1,255 @@
+# app/core/cross_section.py
+
+import asyncio
+import time
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+# ---------------------------------
+# Rolling Cross-Section of the Whole Universe
+# ---------------------------------
+# One preallocated float64 matrix, symbols × time buckets, used as a ring along the time axis. The live
+# feed (PriceHub listener) only writes each symbol's latest price; when a bucket closes, that column is
+# copied into the ring in one vectorised assignment, so symbols that didn't trade carry their last close.
+#
+# Views are computed over *closed* buckets only, so a result stays valid until the next bucket closes: it
+# is cached per (view, window) and recomputed at most once per bucket. The matrix slice is copied on the
+# event loop and the maths runs in a worker thread (NumPy/BLAS release the GIL).
+
+UNKNOWN_TYPE = "unknown"
+
+class CrossSection:
+    def __init__(self, bucket_seconds: float, buckets: int, max_symbols: int,
+                 clock: Callable[[], float] = time.time):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.max_symbols = max_symbols
+        self.clock = clock
+
+        self.closes = np.full((max_symbols, buckets), np.nan)   # ring of bucket closes
+        self.latest = np.full(max_symbols, np.nan)              # current (open) bucket
+        self.type_codes = np.zeros(max_symbols, dtype=np.int32)
+        self.symbols: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.types: list[str] = [UNKNOWN_TYPE]                   # type code → Stock.type
+        self._type_of: dict[str, str] = {}
+
+        self.bucket = self._bucket_at(clock())                  # id of the open bucket
+        self.first_bucket = self.bucket                         # nothing closed before this
+        self._cache: dict[tuple, object] = {}
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+        self.updates = 0
+        self.dropped = 0
+        self.computations = 0
+        self.cache_hits = 0
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _bucket_at(self, ts: float) -> int:
+        return int(ts // self.bucket_seconds)
+
+    # ---------------------------------
+    # Feed
+    # ---------------------------------
+    def _row(self, symbol: str) -> Optional[int]:
+        row = self.rows.get(symbol)
+        if row is None:
+            if len(self.symbols) >= self.max_symbols:
+                return None
+            row = self.rows[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.type_codes[row] = self._type_code(self._type_of.get(symbol, UNKNOWN_TYPE))
+        return row
+
+    def update(self, updates: dict[str, list]):
+        # PriceHub listener: {symbol: [price, exchange_ts_ms]} from one streamer flush
+        self.roll()
+        rows, prices = [], []
+        for symbol, update in updates.items():
+            row = self._row(symbol)
+            if row is None:
+                self.dropped += 1
+                continue
+            price = update[0] if isinstance(update, (list, tuple)) else update
+            if price is None or price <= 0:
+                continue
+            rows.append(row)
+            prices.append(price)
+        if rows:
+            self.latest[rows] = prices
+            self.updates += len(rows)
+
+    def roll(self):
+        # Close every bucket that ended since the last call; a gap longer than the ring rewrites all of it
+        current = self._bucket_at(self.clock())
+        if current <= self.bucket:
+            return
+        n = len(self.symbols)
+        closed = range(max(self.bucket, current - self.buckets), current)
+        self.closes[:n, [b % self.buckets for b in closed]] = self.latest[:n, None]
+        self.bucket = current
+        self._cache.clear()
+
+    # ---------------------------------
+    # Types (Stock.type)
+    # ---------------------------------
+    def _type_code(self, stock_type: str) -> int:
+        try:
+            return self.types.index(stock_type)
+        except ValueError:
+            self.types.append(stock_type)
+            return len(self.types) - 1
+
+    def set_types(self, type_of: dict[str, str]):
+        self._type_of = dict(type_of)
+        for symbol, row in self.rows.items():
+            self.type_codes[row] = self._type_code(self._type_of.get(symbol, UNKNOWN_TYPE))
+        self._cache = {key: value for key, value in self._cache.items() if key[0] != "sectors"}
+
+    # ---------------------------------
+    # Windows
+    # ---------------------------------
+    def available(self) -> int:
+        # Closed buckets held in the ring
+        return min(self.bucket - self.first_bucket, self.buckets)
+
+    def _window(self, points: int) -> np.ndarray:
+        # Last `points` closed bucket closes, oldest first → (symbols, points) copy
+        cols = [b % self.buckets for b in range(self.bucket - points, self.bucket)]
+        return self.closes[:len(self.symbols), cols]
+
+    async def _cached(self, key: tuple, points: int, compute):
+        self.roll()
+        if points > self.available():
+            raise ValueError(f"Window needs {points} closed buckets, only {self.available()} so far")
+        if key in self._cache:
+            self.cache_hits += 1
+            return self._cache[key]
+
+        # One computation per (view, bucket), detached from the request that started it: a client that
+        # disconnects stops waiting (shield) without cancelling the result other requests are waiting on,
+        # and the finished result is cached either way
+        inflight = (key, self.bucket)
+        task = self._inflight.get(inflight)
+        if task is not None:
+            self.cache_hits += 1
+        else:
+            window, codes = self._window(points), self.type_codes[:len(self.symbols)].copy()
+            task = self._inflight[inflight] = asyncio.create_task(self._compute(inflight, compute, window, codes))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _compute(self, inflight: tuple, compute, window: np.ndarray, codes: np.ndarray):
+        key, bucket = inflight
+        try:
+            result = await asyncio.to_thread(compute, window, codes)
+            self.computations += 1
+            if self.bucket == bucket:
+                self._cache[key] = result
+            return result
+        finally:
+            del self._inflight[inflight]
+
+    # ---------------------------------
+    # Views
+    # ---------------------------------
+    async def returns(self, window: int) -> np.ndarray:
+        # Simple return over the last `window` closed buckets; NaN where a symbol has no price yet
+        return await self._cached(("returns", window), window + 1, lambda w, _: window_returns(w))
+
+    async def movers(self, window: int, limit: int) -> dict:
+        ret = await self.returns(window)
+        valid = np.flatnonzero(np.isfinite(ret))
+        k = min(limit, len(valid))
+        if not k:
+            return {"gainers": [], "losers": []}
+        values = ret[valid]
+        top = valid[np.argpartition(-values, k - 1)[:k]]
+        bottom = valid[np.argpartition(values, k - 1)[:k]]
+        top = top[np.argsort(-ret[top])]
+        bottom = bottom[np.argsort(ret[bottom])]
+        return {
+            "gainers": [[self.symbols[i], float(ret[i])] for i in top],
+            "losers": [[self.symbols[i], float(ret[i])] for i in bottom],
+        }
+
+    async def correlation(self, window: int) -> tuple[np.ndarray, np.ndarray]:
+        # (rows of symbols with a full window of non-constant prices, their float32 correlation matrix)
+        return await self._cached(("correlation", window), window + 1, lambda w, _: correlation_matrix(w))
+
+    async def sectors(self, window: int) -> dict:
+        counts, mean, std, advancers, decliners = await self._cached(
+            ("sectors", window), window + 1, lambda w, codes: sector_stats(window_returns(w), codes, len(self.types))
+        )
+        return {
+            self.types[code]: {
+                "symbols": int(counts[code]),
+                "mean_return": float(mean[code]),
+                "std_return": float(std[code]),
+                "advancers": int(advancers[code]),
+                "decliners": int(decliners[code]),
+            }
+            for code in np.flatnonzero(counts)
+        }
+
+    def lookup(self, symbols: Iterable[str]) -> tuple[list[int], list[str]]:
+        rows, missing = [], []
+        for symbol in symbols:
+            row = self.rows.get(symbol)
+            if row is None:
+                missing.append(symbol)
+            else:
+                rows.append(row)
+        return rows, missing
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self.symbols),
+            "capacity": self.max_symbols,
+            "bucket_seconds": self.bucket_seconds,
+            "closed_buckets": self.available(),
+            "updates": self.updates,
+            "dropped": self.dropped,
+            "computations": self.computations,
+            "cache_hits": self.cache_hits,
+        }
+
+# ---------------------------------
+# Vectorised Kernels (pure NumPy, no per-symbol Python loops)
+# ---------------------------------
+
+def window_returns(closes: np.ndarray) -> np.ndarray:
+    first, last = closes[:, 0], closes[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = last / first - 1.0
+    ret[~(first > 0)] = np.nan
+    return ret
+
+def correlation_matrix(closes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Pearson correlation of log returns: one GEMM over z-scored rows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_returns = np.diff(np.log(closes), axis=1)
+    std = log_returns.std(axis=1)
+    rows = np.flatnonzero(np.isfinite(log_returns).all(axis=1) & (std > 0))
+    z = log_returns[rows]
+    z = ((z - z.mean(axis=1, keepdims=True)) / (std[rows, None] * np.sqrt(z.shape[1]))).astype(np.float32)
+    # z-scoring in float64 keeps the float32 GEMM (half the memory traffic of float64) accurate to ~1e-6
+    corr = z @ z.T
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return rows, corr
+
+def sector_stats(ret: np.ndarray, codes: np.ndarray, groups: int) -> tuple[np.ndarray, ...]:
+    valid = np.isfinite(ret)
+    codes, ret = codes[valid], ret[valid]
+    counts = np.bincount(codes, minlength=groups)
+    total = np.bincount(codes, weights=ret, minlength=groups)
+    squares = np.bincount(codes, weights=ret * ret, minlength=groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / counts
+        std = np.sqrt(np.maximum(squares / counts - mean * mean, 0.0))
+    advancers = np.bincount(codes[ret > 0], minlength=groups)
+    decliners = np.bincount(codes[ret < 0], minlength=groups)
+    return counts, mean, std, advancers, decliners
@@ -0,0 +1,157 @@
+# app/core/price_hub.py
+
+import asyncio
+import json
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger("price-hub")
+
+PRICES_CHANNEL = "stock:prices"   # WebSocket.py publishes {symbol: [price, exchange_ts_ms]} once per flush
+
+# ---------------------------------
+# Per-Client Conflating Buffer
+# ---------------------------------
+# A client never holds more than one pending update per symbol: if it falls behind, newer prices
+# overwrite older ones instead of queueing, so memory per client is bounded by its symbol filter.
+
+class Subscriber:
+    __slots__ = ("symbols", "_pending", "_event", "conflated", "delivered")
+
+    def __init__(self, symbols: Optional[set[str]]):
+        self.symbols = symbols            # None = every symbol
+        self._pending: dict[str, list] = {}
+        self._event = asyncio.Event()
+        self.conflated = 0
+        self.delivered = 0
+
+    def offer(self, symbol: str, update: list):
+        if symbol in self._pending:
+            self.conflated += 1
+        self._pending[symbol] = update
+        self._event.set()
+
+    async def next_batch(self, timeout: Optional[float] = None) -> dict[str, list]:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._event.clear()
+        batch, self._pending = self._pending, {}
+        self.delivered += len(batch)
+        return batch
+
+# ---------------------------------
+# Hub: one Redis subscription per process
+# ---------------------------------
+
+class PriceHub:
+    def __init__(self, max_clients: int):
+        self.max_clients = max_clients
+        self._by_symbol: dict[str, set[Subscriber]] = {}
+        self._all: set[Subscriber] = set()
+        self._clients: set[Subscriber] = set()
+        self._listeners: list[Callable[[dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.messages = 0
+
+    def __len__(self):
+        return len(self._clients)
+
+    def start(self, redis):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # --- clients ---
+    def subscribe(self, symbols: Optional[set[str]] = None) -> Subscriber:
+        if len(self._clients) >= self.max_clients:
+            raise OverflowError("Too many streaming clients")
+        sub = Subscriber(symbols)
+        self._clients.add(sub)
+        self._index(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._clients.discard(sub)
+        self._unindex(sub)
+
+    def update_filter(self, sub: Subscriber, symbols: Optional[set[str]]):
+        self._unindex(sub)
+        sub.symbols = symbols
+        self._index(sub)
+
+    def _index(self, sub: Subscriber):
+        if sub.symbols is None:
+            self._all.add(sub)
+        else:
+            for symbol in sub.symbols:
+                self._by_symbol.setdefault(symbol, set()).add(sub)
+
+    def _unindex(self, sub: Subscriber):
+        self._all.discard(sub)
+        for symbol in sub.symbols or ():
+            subs = self._by_symbol.get(symbol)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_symbol[symbol]
+
+    # --- in-process consumers (e.g. analytics), fed every message before client fan-out ---
+    def add_listener(self, listener: Callable[[dict], None]):
+        self._listeners.append(listener)
+
+    # --- fan-out ---
+    def dispatch(self, updates: dict[str, list]):
+        for listener in self._listeners:
+            try:
+                listener(updates)
+            except Exception as e:
+                logger.error(f"[PriceHub] Listener {listener!r} failed: {e}")
+        # Cost is per (symbol, interested client) — clients filtering on other symbols are never touched
+        for symbol, update in updates.items():
+            for sub in self._by_symbol.get(symbol, ()):
+                sub.offer(symbol, update)
+            for sub in self._all:
+                sub.offer(symbol, update)
+
+    async def _listen(self, redis):
+        delay = 1
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(PRICES_CHANNEL)
+                logger.info(f"[PriceHub] Subscribed to {PRICES_CHANNEL}")
+                delay = 1
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self.messages += 1
+                    try:
+                        self.dispatch(json.loads(message["data"]))
+                    except ValueError as e:
+                        logger.warning(f"[PriceHub] Bad message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PriceHub] Subscription lost: {e} — retrying in {delay}s")
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "symbols_watched": len(self._by_symbol),
+            "wildcard_clients": len(self._all),
+            "messages": self.messages,
+            "conflated": sum(sub.conflated for sub in self._clients),
+        }
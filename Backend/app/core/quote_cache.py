@@ -0,0 +1,90 @@
+# app/core/quote_cache.py
+
+import asyncio
+import time
+from typing import Iterable, Optional
+
+from services.trade_codec import read_snapshots
+
+# ---------------------------------
+# Short-TTL Quote Cache
+# ---------------------------------
+# Prices change many times a second, so entries live for well under a second — long enough that a burst
+# of clients asking for the same symbols costs one Redis round-trip instead of one per request.
+# Symbols already being fetched by another request are awaited rather than fetched again.
+
+class QuoteCache:
+    def __init__(self, ttl: float, max_entries: int = 50_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, Optional[float]]] = {}   # symbol → (expires_at, price)
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.round_trips = 0
+
+    async def get_many(self, redis, symbols: Iterable[str]) -> dict[str, Optional[float]]:
+        now = time.monotonic()
+        result, to_fetch, waiting = {}, [], {}
+
+        for symbol in symbols:
+            entry = self._entries.get(symbol)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                result[symbol] = entry[1]
+            elif symbol in self._inflight:
+                self.coalesced += 1
+                waiting[symbol] = self._inflight[symbol]
+            else:
+                self.misses += 1
+                to_fetch.append(symbol)
+
+        if to_fetch:
+            task = self._fetch(redis, to_fetch)
+            waiting.update(dict.fromkeys(to_fetch, task))
+
+        # shield(): a request that goes away stops waiting, but the read it shares with others carries on
+        for symbol, task in waiting.items():
+            result[symbol] = (await asyncio.shield(task)).get(symbol)
+
+        return result
+
+    def _fetch(self, redis, symbols: list[str]) -> asyncio.Task:
+        # Detached from the request that starts it, so that request being cancelled (its client
+        # disconnected) can't cancel a read other requests are coalesced onto; the result is cached either way
+        task = asyncio.create_task(self._read(redis, symbols))
+        # Mark the exception as retrieved even when every request waiting on it has gone
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        for symbol in symbols:
+            self._inflight[symbol] = task
+        return task
+
+    async def _read(self, redis, symbols: list[str]) -> dict[str, Optional[float]]:
+        try:
+            self.round_trips += 1
+            # One pipelined HMGET per symbol (plus legacy keys for symbols not migrated yet)
+            snapshots = await read_snapshots(redis, symbols)
+            fetched = {symbol: snapshot.price if snapshot else None for symbol, snapshot in snapshots.items()}
+
+            if len(self._entries) + len(fetched) > self.max_entries:
+                self._entries.clear()
+            expires = time.monotonic() + self.ttl
+            for symbol, price in fetched.items():
+                self._entries[symbol] = (expires, price)
+            return fetched
+        finally:
+            task = asyncio.current_task()
+            for symbol in symbols:
+                if self._inflight.get(symbol) is task:
+                    del self._inflight[symbol]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "round_trips": self.round_trips,
+        }
@@ -1,21 +1,49 @@
-from fastapi import FastAPI
+import time
+import asyncio
+
+from fastapi import FastAPI, Request
 from app.api.routes import router as api_router
-from app.db.redis_client import init_redis, close_redis
-from Backend.Utils.SyncRedis import initialize_redis_symbols
+from app.api.stream import router as stream_router, price_hub
+from app.api.history import router as history_router
+from app.api.metrics import router as metrics_router, REQUEST_SECONDS
+from app.api.analytics import router as analytics_router, cross_section, refresh_types
+from app.db.redis_client import init_redis, close_redis, get_redis
 
 app = FastAPI()
 
-# Include only the API router (WebSocket runs separately)
+# The Finnhub ingester (services/WebSocket.py) runs separately; /ws/prices here only fans prices out
 app.include_router(api_router)
+app.include_router(stream_router)
+app.include_router(history_router)
+app.include_router(metrics_router)
+app.include_router(analytics_router)
+
+background_tasks: set[asyncio.Task] = set()
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route template (/history/{symbol}), not the raw path, so label cardinality stays bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(time.perf_counter() - start)
+    return response
 
 @app.on_event("startup")
 async def startup_event():
     # Initialize Redis connection
     await init_redis()
 
-    # Perform a one-time sync of stock symbols to Redis
-    await initialize_redis_symbols()
+    # Single pub/sub subscription shared by all streaming clients; the analytics matrix reads the same feed
+    price_hub.add_listener(cross_section.update)
+    price_hub.start(get_redis())
+    background_tasks.add(asyncio.create_task(refresh_types()))
+
+    # stock:symbols is owned by the trigger service (services/SyncRedis.py), kept in sync from NOTIFY deltas
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await price_hub.stop()
+    for task in background_tasks:
+        task.cancel()
     await close_redis()
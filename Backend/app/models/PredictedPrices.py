@@ -1,6 +1,6 @@
 # app/models/PredictedPrices.py
 
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, Float, DateTime, ForeignKey
 from app.db.database import Base
 
 class PredictedPrices(Base):
@@ -11,3 +11,5 @@ class PredictedPrices(Base):
     predicted_price = Column(Float)
     prediction_time = Column(DateTime)   # The time this prediction is for
     generated_at = Column(DateTime)      # When this prediction was made
+    direction = Column(SmallInteger, nullable=True)    # 0 = down, 1 = up, 2 = neutral
+    confidence = Column(Float, nullable=True)          # Probability of `direction`
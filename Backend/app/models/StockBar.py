@@ -0,0 +1,18 @@
+# app/models/StockBar.py
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from app.db.database import Base
+
+class StockBar(Base):
+    __tablename__ = "stock_bars"
+
+    stock_id = Column(Integer, ForeignKey("stocks.id"), primary_key=True)
+    resolution = Column(String, primary_key=True)       # '1s', '1m', '5m'
+    bucket_start = Column(DateTime, primary_key=True)   # UTC start of the bar
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+    vwap = Column(Float)
+    trade_count = Column(Integer, nullable=False)
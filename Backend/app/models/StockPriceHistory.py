@@ -1,12 +1,20 @@
 # app/models/StockPriceHistory.py
 
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Float, DateTime, ForeignKey, Index
 from app.db.database import Base
 
 class StockPriceHistory(Base):
     __tablename__ = "stock_price_history"
 
-    id = Column(Integer, primary_key=True)
+    id = Column(BigInteger, primary_key=True)
     stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False, index=True)
     price = Column(Float, nullable=False) 
-    trade_time_stamp = Column(DateTime, nullable=False, index=True)
+    trade_time_stamp = Column(DateTime, primary_key=True)   # partition key, so part of the PK
+    volume = Column(Float)
+
+    # Serves per-symbol range scans and keyset pagination in /history.
+    # Range-partitioned by day/hour; partitions are managed by services/partitions.py
+    __table_args__ = (
+        Index("ix_stock_price_history_stock_time", "stock_id", "trade_time_stamp"),
+        {"postgresql_partition_by": "RANGE (trade_time_stamp)"},
+    )
@@ -0,0 +1,98 @@
+# benchmarks/bench_cross_section.py
+#
+# app/core/cross_section.py against the per-request pandas pipeline it replaces, on a synthetic universe:
+# correlation matrix, movers and type aggregates, checking both agree.
+#
+# Usage (from Backend/):
+#   python -m benchmarks.bench_cross_section                       # 3000 symbols × 240 one-minute buckets
+#   python -m benchmarks.bench_cross_section --symbols 5000 --window 120
+
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from app.core.cross_section import CrossSection
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def fill(cs: CrossSection, clock: FakeClock, closes: np.ndarray) -> float:
+    # Feed one streamer-style message per bucket, then close it; returns seconds spent in update()
+    symbols = [f"SYM{i}" for i in range(closes.shape[0])]
+    spent = 0.0
+    for col in range(closes.shape[1]):
+        message = {symbol: [float(price), None] for symbol, price in zip(symbols, closes[:, col])}
+        start = time.perf_counter()
+        cs.update(message)
+        spent += time.perf_counter() - start
+        clock.now += cs.bucket_seconds
+    cs.roll()
+    return spent
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+async def run(args):
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, (args.symbols, args.buckets)), axis=1))
+    types = {f"SYM{i}": ("stock", "crypto", "forex")[i % 3] for i in range(args.symbols)}
+
+    clock = FakeClock()
+    cs = CrossSection(bucket_seconds=60, buckets=args.buckets, max_symbols=args.symbols, clock=clock)
+    cs.set_types(types)
+    update_s = fill(cs, clock, closes)
+    print(f"{args.symbols} symbols × {args.buckets} buckets, window {args.window}")
+    print(f"  feed            {update_s / args.buckets * 1000:8.2f} ms per {args.symbols}-symbol message")
+
+    # Baseline: what a request handler would do from an export
+    window = closes[:, -(args.window + 1):]
+    frame = pd.DataFrame(window.T, columns=list(types))
+    expected, pandas_s = timed(lambda: np.log(frame).diff().iloc[1:].corr().to_numpy())
+
+    start = time.perf_counter()
+    rows, corr = await cs.correlation(args.window)
+    first_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(100):
+        await cs.correlation(args.window)
+    cached_s = (time.perf_counter() - start) / 100
+
+    assert len(rows) == args.symbols
+    err = float(np.abs(corr - expected).max())
+    assert err < 1e-4, f"correlation differs from pandas by {err}"
+    print(f"  correlation     pandas {pandas_s * 1000:8.1f} ms | numpy {first_s * 1000:7.1f} ms "
+          f"| cached {cached_s * 1e6:6.1f} µs  (max |diff| {err:.1e})")
+
+    expected_ret = window[:, -1] / window[:, 0] - 1
+    start = time.perf_counter()
+    movers = await cs.movers(args.window, 20)
+    movers_s = time.perf_counter() - start
+    best = int(np.argmax(expected_ret))
+    assert movers["gainers"][0][0] == f"SYM{best}"
+    start = time.perf_counter()
+    sectors = await cs.sectors(args.window)
+    sectors_s = time.perf_counter() - start
+    reference = pd.Series(expected_ret, index=list(types)).groupby(pd.Series(types)).mean()
+    for name, stats in sectors.items():
+        assert abs(stats["mean_return"] - reference[name]) < 1e-12
+    print(f"  movers          {movers_s * 1000:8.2f} ms | sectors {sectors_s * 1000:.2f} ms (first computation each)")
+    print(f"  stats           {cs.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=3000)
+    parser.add_argument("--buckets", type=int, default=240)
+    parser.add_argument("--window", type=int, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
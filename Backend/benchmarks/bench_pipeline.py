@@ -0,0 +1,309 @@
+# benchmarks/bench_pipeline.py
+#
+# End-to-end ingestion benchmark: replay_server.py → WebSocket.py → Redis → fetcher.py → Postgres, all local.
+# Reports sustained throughput, p50/p99 latency per hop (from the services' /metrics) and CPU per component.
+#
+# Needs a local Redis and Postgres (REDIS_URL / DATABASE_URL) with the app schema; seeds `stocks` with
+# REPLAY:<id> symbols for the recording and removes them again afterwards (--cleanup also deletes the
+# replayed history rows). Use --json to save a result and --baseline to fail on regressions.
+#
+# Usage (from Backend/):
+#   python -m benchmarks.bench_pipeline --rate 5000 --duration 60
+#   python -m benchmarks.bench_pipeline --mode streams --workers 2 --rate 20000 --json run.json
+#   python -m benchmarks.bench_pipeline --baseline run.json --tolerance 0.1
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from pathlib import Path
+
+import asyncpg
+import psutil
+from redis.asyncio import Redis
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SERVICES_DIR = BENCHMARKS_DIR.parent / "services"
+sys.path.append(str(SERVICES_DIR))
+
+from trade_codec import snapshot_key
+from benchmarks.replay_server import load_recording
+
+DEFAULT_RECORDING = Path(__file__).resolve().parents[2] / "assets" / "stock_data.csv"
+SYMBOL_FORMAT = "REPLAY:{id}"
+REPLAY_PORT = 8765
+WS_METRICS_PORT = 9201
+FETCHER_METRICS_PORT = 9202
+
+LATENCIES = {
+    "exchange→redis": "ingest_exchange_to_redis_seconds",
+    "redis→postgres": "history_redis_to_postgres_seconds",
+    "exchange→postgres": "history_exchange_to_postgres_seconds",
+    "redis flush": "ingest_flush_seconds",
+    "postgres write": "history_flush_seconds",
+}
+
+# -------------------- PROMETHEUS TEXT ---------------------
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$')
+
+def parse_metrics(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', labels or "")))
+            samples[(name, labels)] = float(value)
+    return samples
+
+def scrape(ports: list[int]) -> dict:
+    # Shards expose separate registries; sum identical series across them
+    total = {}
+    for port in ports:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            for key, value in parse_metrics(response.read().decode()).items():
+                total[key] = total.get(key, 0.0) + value
+    return total
+
+def delta(after: dict, before: dict, name: str) -> float:
+    return sum(v - before.get(k, 0.0) for k, v in after.items() if k[0] == name)
+
+def quantile(after: dict, before: dict, name: str, q: float):
+    # histogram_quantile over the window: bucket deltas summed across label sets, linear within a bucket
+    buckets = {}
+    for key, value in after.items():
+        if key[0] != f"{name}_bucket":
+            continue
+        le = dict(key[1])["le"]
+        buckets[le] = buckets.get(le, 0.0) + value - before.get(key, 0.0)
+    ordered = sorted(((float(le), count) for le, count in buckets.items()), key=lambda b: b[0])
+    if not ordered or ordered[-1][1] <= 0:
+        return None
+    rank = q * ordered[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in ordered:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / max(count - lower_count, 1e-12)
+        lower_bound, lower_count = bound, count
+    return None
+
+# -------------------- PROCESSES ---------------------
+
+def cpu_seconds(procs: list[psutil.Process]) -> float:
+    total = 0.0
+    for proc in procs:
+        try:
+            for p in [proc, *proc.children(recursive=True)]:
+                times = p.cpu_times()
+                total += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+def find_processes(*names) -> list[psutil.Process]:
+    # Local datastores, for CPU attribution; empty when they run in containers or remotely
+    found = []
+    for proc in psutil.process_iter(["name"]):
+        if any(n in (proc.info["name"] or "") for n in names):
+            found.append(proc)
+    return found
+
+def spawn(args: list[str], env: dict, log: Path) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=SERVICES_DIR, env=env,
+                            stdout=log.open("w"), stderr=subprocess.STDOUT)
+
+async def seed_symbols(symbols: list[str], dsn: str, redis_url: str):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.executemany(
+            "INSERT INTO stocks (symbol, name, type) VALUES ($1, $1, 'replay') ON CONFLICT (symbol) DO NOTHING",
+            [(s,) for s in symbols],
+        )
+    finally:
+        await conn.close()
+    redis = Redis.from_url(redis_url, decode_responses=True)
+    await redis.sadd("stock:symbols", *symbols)
+    await redis.close()
+
+async def cleanup(symbols: list[str], dsn: str, redis_url: str, history: bool):
+    # Always unseeds the REPLAY:<id> symbols so they stop being streamed and listed; their history rows go
+    # only with --cleanup, and stocks that kept rows (history, bars, predictions) stay for the foreign keys
+    redis = Redis.from_url(redis_url, decode_responses=True)
+    try:
+        await redis.srem("stock:symbols", *symbols)
+        await redis.delete(*map(snapshot_key, symbols))
+    finally:
+        await redis.close()
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction():
+            if history:
+                await conn.execute(
+                    "DELETE FROM stock_price_history "
+                    "WHERE stock_id IN (SELECT id FROM stocks WHERE symbol = ANY($1::text[]))",
+                    symbols,
+                )
+            status = await conn.execute(
+                """
+                DELETE FROM stocks s WHERE s.symbol = ANY($1::text[])
+                    AND NOT EXISTS (SELECT 1 FROM stock_price_history h WHERE h.stock_id = s.id)
+                    AND NOT EXISTS (SELECT 1 FROM stock_bars b WHERE b.stock_id = s.id)
+                    AND NOT EXISTS (SELECT 1 FROM predicted_prices p WHERE p.stock_id = s.id)
+                """,
+                symbols,
+            )
+    finally:
+        await conn.close()
+    kept = len(symbols) - int(status.split()[-1])
+    if kept:
+        print(f"Kept {kept} REPLAY stocks that still have rows; rerun with --cleanup to drop their history")
+
+def wait_for_metrics(ports: list[int], timeout: float = 60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return scrape(ports)
+        except OSError:
+            if time.time() > deadline:
+                raise RuntimeError(f"Metrics endpoints {ports} never came up — see the *.log files")
+            time.sleep(0.5)
+
+# -------------------- RUN ---------------------
+
+def run(args) -> dict:
+    dsn = os.environ["DATABASE_URL"].replace("postgresql+asyncpg://", "postgresql://")
+    redis_url = os.environ["REDIS_URL"]
+    symbols = sorted(set(load_recording([str(p) for p in args.recording], SYMBOL_FORMAT)[0]))
+    asyncio.run(seed_symbols(symbols, dsn, redis_url))
+
+    env = {
+        **os.environ,
+        "FINNHUB_WS_URL": f"ws://127.0.0.1:{REPLAY_PORT}",
+        "WS_METRICS_PORT": str(WS_METRICS_PORT),
+        "METRICS_PORT": str(FETCHER_METRICS_PORT),
+    }
+    if args.mode == "streams":
+        env.update(WS_TICK_STREAMS="1", INGEST_MODE="streams")
+
+    logs = Path(args.logs)
+    logs.mkdir(parents=True, exist_ok=True)
+    replay_args = [str(BENCHMARKS_DIR / "replay_server.py"), *map(str, args.recording), "--loop",
+                   "--port", str(REPLAY_PORT), "--wait-clients", str(args.workers), "--rate", str(args.rate)]
+    procs = {
+        "replay": spawn(replay_args, env, logs / "replay.log"),
+        "streamer": spawn(["WebSocket.py", "--workers", str(args.workers)], env, logs / "streamer.log"),
+        "fetcher": spawn(["fetcher.py"], env, logs / "fetcher.log"),
+    }
+    ws_ports = [WS_METRICS_PORT + i for i in range(args.workers)]
+    try:
+        wait_for_metrics(ws_ports + [FETCHER_METRICS_PORT])
+        print(f"Warming up for {args.warmup}s...")
+        time.sleep(args.warmup)
+
+        components = {name: [psutil.Process(p.pid)] for name, p in procs.items()}
+        components["redis-server"] = find_processes("redis-server")
+        components["postgres"] = find_processes("postgres")
+        cpu_before = {name: cpu_seconds(p) for name, p in components.items()}
+        before = scrape(ws_ports + [FETCHER_METRICS_PORT])
+        start = time.time()
+
+        time.sleep(args.duration)
+
+        after = scrape(ws_ports + [FETCHER_METRICS_PORT])
+        elapsed = time.time() - start
+        cpu_after = {name: cpu_seconds(p) for name, p in components.items()}
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        asyncio.run(cleanup(symbols, dsn, redis_url, history=args.cleanup))
+
+    return {
+        "config": {"mode": args.mode, "workers": args.workers, "rate": args.rate, "duration": elapsed},
+        "throughput": {
+            "trades_received_per_s": delta(after, before, "ingest_trades_total") / elapsed,
+            "trades_dropped_per_s": delta(after, before, "ingest_dropped_trades_total") / elapsed,
+            "redis_flushes_per_s": delta(after, before, "ingest_flushes_total") / elapsed,
+            "rows_written_per_s": delta(after, before, "history_rows_written_total") / elapsed,
+        },
+        "latency_ms": {
+            hop: {f"p{int(q * 100)}": (v * 1000 if (v := quantile(after, before, name, q)) is not None else None)
+                  for q in (0.5, 0.99)}
+            for hop, name in LATENCIES.items()
+        },
+        "cpu_percent": {
+            name: round((cpu_after[name] - cpu_before[name]) / elapsed * 100, 1)
+            for name in components if components[name]
+        },
+    }
+
+def report(result: dict):
+    cfg = result["config"]
+    print(f"\n{cfg['mode']} mode, {cfg['workers']} streamer worker(s), replay {cfg['rate']:.0f} trades/s, "
+          f"{cfg['duration']:.0f}s window")
+    print("\nThroughput")
+    for name, value in result["throughput"].items():
+        print(f"  {name:>24}: {value:12.1f}")
+    print("\nLatency (ms)            p50          p99")
+    for hop, qs in result["latency_ms"].items():
+        fmt = lambda v: f"{v:12.2f}" if v is not None else f"{'—':>12}"
+        print(f"  {hop:>18}: {fmt(qs['p50'])} {fmt(qs['p99'])}")
+    print("\nCPU (% of one core)")
+    for name, value in result["cpu_percent"].items():
+        print(f"  {name:>18}: {value:8.1f}")
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Throughput may not fall, and p99 latency may not rise, by more than the tolerance
+    regressions = []
+    for name, old in baseline["throughput"].items():
+        new = result["throughput"].get(name)
+        if name != "trades_dropped_per_s" and old and new is not None and new < old * (1 - tolerance):
+            regressions.append(f"{name}: {new:.1f} < {old:.1f}")
+    for hop, qs in baseline["latency_ms"].items():
+        old, new = qs.get("p99"), result["latency_ms"].get(hop, {}).get("p99")
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{hop} p99: {new:.2f}ms > {old:.2f}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recording", nargs="+", type=Path, default=[DEFAULT_RECORDING])
+    parser.add_argument("--mode", choices=("snapshot", "streams"), default="snapshot",
+                        help="fetcher ingest mode (streams also enables WS_TICK_STREAMS)")
+    parser.add_argument("--workers", type=int, default=1, help="streamer processes")
+    parser.add_argument("--rate", type=float, default=5000, help="replayed trades per second")
+    parser.add_argument("--warmup", type=float, default=15)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--logs", default="bench_pipeline_logs")
+    parser.add_argument("--cleanup", action="store_true", help="also delete replayed rows from stock_price_history")
+    parser.add_argument("--json", help="write the result here")
+    parser.add_argument("--baseline", help="earlier --json result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions vs baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n✅ Within tolerance of baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_quotes.py
+#
+# Measures the /quotes read path against a live Redis:
+#   naive    — one snapshot HMGET per symbol per request, awaited in turn
+#   pipeline — trade_codec.read_snapshots: every symbol's HMGET in one pipeline, no cache
+#   cached   — QuoteCache (sub-second TTL + request coalescing), as served by /quotes
+#
+# Usage (from Backend/):
+#   REDIS_URL=redis://localhost:6379 python -m benchmarks.bench_quotes --clients 200 --requests 50 --symbols 50
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from redis.asyncio import Redis
+
+from app.core.quote_cache import QuoteCache
+from services.trade_codec import SNAPSHOT_FIELDS, read_snapshots, snapshot_key, write_snapshot
+
+UNIVERSE = [f"BENCH:{i:05d}" for i in range(2000)]
+
+async def seed(redis):
+    pipe = redis.pipeline()
+    now_ms = int(time.time() * 1000)
+    for symbol in UNIVERSE:
+        write_snapshot(pipe, symbol, round(random.uniform(1, 500), 4), now_ms, 1, now_ms)
+    await pipe.execute()
+
+async def cleanup(redis):
+    await redis.delete(*[snapshot_key(symbol) for symbol in UNIVERSE])
+
+async def naive(redis, symbols):
+    return [await redis.hmget(snapshot_key(s), SNAPSHOT_FIELDS) for s in symbols]
+
+async def pipeline(redis, symbols):
+    return await read_snapshots(redis, symbols)
+
+def make_cached(ttl):
+    cache = QuoteCache(ttl=ttl)
+
+    async def cached(redis, symbols):
+        return await cache.get_many(redis, symbols)
+
+    cached.cache = cache
+    return cached
+
+async def run(mode, fn, redis, args):
+    # A handful of "watchlists" shared by many clients, like dashboards polling the same symbols
+    watchlists = [random.sample(UNIVERSE, args.symbols) for _ in range(args.watchlists)]
+    latencies = []
+
+    async def client():
+        for _ in range(args.requests):
+            symbols = random.choice(watchlists)
+            start = time.perf_counter()
+            await fn(redis, symbols)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+    print(f"{mode:>8}: {len(latencies) / elapsed:10.0f} req/s | "
+          f"p50 {p(0.50):7.2f}ms | p99 {p(0.99):7.2f}ms | mean {statistics.mean(latencies) * 1000:7.2f}ms")
+    if hasattr(fn, "cache"):
+        print(f"          cache: {fn.cache.stats()}")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--symbols", type=int, default=50, help="symbols per request")
+    parser.add_argument("--watchlists", type=int, default=10, help="distinct symbol lists shared by clients")
+    parser.add_argument("--ttl", type=float, default=0.25)
+    args = parser.parse_args()
+
+    redis = Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+    await seed(redis)
+    try:
+        print(f"{args.clients} clients × {args.requests} requests × {args.symbols} symbols")
+        await run("naive", naive, redis, args)
+        await run("pipeline", pipeline, redis, args)
+        await run("cached", make_cached(args.ttl), redis, args)
+    finally:
+        await cleanup(redis)
+        await redis.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+# benchmarks/bench_windows.py
+#
+# Notebook loop vs services/windows.py on the same data, checking both produce identical samples.
+#
+# Usage (from Backend/):
+#   python -m benchmarks.bench_windows                         # synthetic: 50 symbols × 20k ticks
+#   python -m benchmarks.bench_windows --csv ../assets/stock_data.csv
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "services"))
+
+from windows import build_dataset, build_dataset_loop, iter_batches
+
+def load(args):
+    if args.csv:
+        df = pd.read_csv(args.csv)
+        price_col = "price" if "price" in df.columns else "current_price"
+        time_col = "trade_time_stamp" if "trade_time_stamp" in df.columns else "last_updated"
+        df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
+        df[price_col] = pd.to_numeric(df[price_col], errors="coerce")
+        df = df.dropna(subset=[time_col, price_col]).sort_values(["stock_id", time_col], kind="stable")
+        return df["stock_id"].to_numpy(), df[price_col].to_numpy(dtype=np.float64), df[time_col].to_numpy()
+
+    rng = np.random.default_rng(0)
+    ids = np.repeat(np.arange(args.symbols), args.ticks)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, len(ids))))
+    times = np.tile(np.arange(args.ticks, dtype=np.int64) * 10_000, args.symbols)
+    return ids, prices, times
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=4096)
+    args = parser.parse_args()
+
+    ids, prices, times = load(args)
+    print(f"{len(prices):,} ticks, {len(np.unique(ids))} symbols")
+
+    (lX, ly, lid, lt), loop_s = timed(lambda: build_dataset_loop(ids, prices, times))
+    (vX, vy, vid, vt), vec_s = timed(lambda: build_dataset(ids, prices, times))
+    batches, batch_s = timed(lambda: sum(len(b[1]) for b in iter_batches(ids, prices, times, args.batch)))
+
+    assert np.array_equal(lX, vX) and np.array_equal(ly, vy), "vectorised samples differ from the loop"
+    assert np.array_equal(lid, vid) and np.array_equal(lt, vt), "vectorised metadata differs from the loop"
+    assert batches == len(vy)
+
+    print(f"   loop: {loop_s:8.3f}s  X={lX.shape}")
+    print(f" vector: {vec_s:8.3f}s  ({loop_s / vec_s:.1f}× faster)")
+    print(f"batched: {batch_s:8.3f}s  ({args.batch} samples per batch, {args.batch * lX.shape[1] * 8 / 1e6:.1f} MB peak X)")
+
+if __name__ == "__main__":
+    main()
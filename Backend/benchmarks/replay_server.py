@@ -0,0 +1,178 @@
+# benchmarks/replay_server.py
+#
+# Local stand-in for wss://ws.finnhub.io: speaks the same subscribe/unsubscribe → {"type": "trade", "data": [...]}
+# protocol and replays recorded prices, so WebSocket.py → Redis → fetcher.py can be load-tested without an
+# API key or market hours. Point the streamer at it with FINNHUB_WS_URL=ws://localhost:8765.
+#
+# Inputs: assets/stock_data.csv (stock_id, current_price, last_updated) or backup exports
+# (stock_id, price, trade_time_stamp[, volume]; .csv, .csv.gz or .parquet). Symbols are derived from
+# stock_id with --symbol-format. Trades are stamped with the wall-clock send time, so downstream latency
+# metrics measure the pipeline rather than the age of the recording.
+#
+# Lives with the benchmarks rather than in services/, so the services image doesn't ship it.
+#
+# Usage (from Backend/):
+#   python benchmarks/replay_server.py ../assets/stock_data.csv --speed 60   # original spacing, 60× faster
+#   python benchmarks/replay_server.py backups/*.parquet --rate 20000 --loop # fixed 20k trades/s, forever
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+import websockets
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("replay-server")
+
+FRAME_INTERVAL = 0.01       # seconds between trade frames; trades due in between are batched together
+PING_INTERVAL = 10          # Finnhub sends {"type":"ping"} on otherwise idle sockets
+STATS_INTERVAL = 10
+
+# -------------------- RECORDING ---------------------
+
+def load_recording(paths: list[str], symbol_format: str):
+    frames = []
+    for path in paths:
+        df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+        price_col = "price" if "price" in df.columns else "current_price"
+        time_col = "trade_time_stamp" if "trade_time_stamp" in df.columns else "last_updated"
+        frame = pd.DataFrame({
+            "stock_id": df["stock_id"],
+            "price": pd.to_numeric(df[price_col], errors="coerce"),
+            "time": pd.to_datetime(df[time_col], errors="coerce"),
+            "volume": pd.to_numeric(df["volume"], errors="coerce") if "volume" in df.columns else 0.0,
+        })
+        frames.append(frame.dropna(subset=["stock_id", "price", "time"]))
+
+    data = pd.concat(frames).sort_values("time", kind="stable")
+    symbols = np.array([symbol_format.format(id=int(i)) for i in data["stock_id"]], dtype=object)
+    offsets = (data["time"] - data["time"].iloc[0]).dt.total_seconds().to_numpy()
+    return symbols, data["price"].to_numpy(), data["volume"].fillna(0).to_numpy(), offsets
+
+# -------------------- CLIENTS ---------------------
+
+class Client:
+    def __init__(self, ws):
+        self.ws = ws
+        self.symbols: set[str] = set()
+        self.sent = 0
+        self.last_send = time.monotonic()
+
+class ReplayServer:
+    def __init__(self, symbols, prices, volumes, offsets, speed: float = None, rate: float = None,
+                 loop: bool = False):
+        self.symbols, self.prices, self.volumes, self.offsets = symbols, prices, volumes, offsets
+        self.speed = speed
+        self.rate = rate
+        self.loop = loop
+        self.clients: set[Client] = set()
+        self.sent = 0
+        self.finished = False
+
+    async def handler(self, ws, path=None):
+        client = Client(ws)
+        self.clients.add(client)
+        logger.info(f"Client connected ({len(self.clients)} total)")
+        try:
+            async for message in ws:
+                msg = json.loads(message)
+                if msg.get("type") == "subscribe":
+                    client.symbols.add(msg.get("symbol"))
+                elif msg.get("type") == "unsubscribe":
+                    client.symbols.discard(msg.get("symbol"))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(client)
+            logger.info(f"Client disconnected after {client.sent} trades ({len(self.clients)} left)")
+
+    def _due(self, elapsed: float) -> int:
+        # Index one past the last trade that should have been sent `elapsed` seconds into this pass
+        if self.rate:
+            return min(int(elapsed * self.rate), len(self.prices))
+        return int(np.searchsorted(self.offsets, elapsed * self.speed, side="right"))
+
+    async def _send(self, client: Client, trades: list[dict]):
+        try:
+            await client.ws.send(json.dumps({"type": "trade", "data": trades}, separators=(",", ":")))
+            client.sent += len(trades)
+            client.last_send = time.monotonic()
+        except websockets.ConnectionClosed:
+            self.clients.discard(client)
+
+    async def _ping(self, client: Client):
+        try:
+            await client.ws.send('{"type":"ping"}')
+            client.last_send = time.monotonic()
+        except websockets.ConnectionClosed:
+            self.clients.discard(client)
+
+    async def replay(self):
+        while True:
+            start, cursor = time.monotonic(), 0
+            while cursor < len(self.prices):
+                await asyncio.sleep(FRAME_INTERVAL)
+                end = self._due(time.monotonic() - start)
+                if end <= cursor:
+                    continue
+                now_ms = int(time.time() * 1000)
+                batch = [
+                    {"s": s, "p": float(p), "t": now_ms, "v": float(v), "c": None}
+                    for s, p, v in zip(self.symbols[cursor:end], self.prices[cursor:end], self.volumes[cursor:end])
+                ]
+                cursor = end
+
+                sends = []
+                for client in list(self.clients):
+                    trades = [t for t in batch if t["s"] in client.symbols]
+                    if trades:
+                        sends.append(self._send(client, trades))
+                    elif time.monotonic() - client.last_send > PING_INTERVAL:
+                        sends.append(self._ping(client))
+                await asyncio.gather(*sends)
+                self.sent += len(batch)
+            logger.info(f"Recording finished ({len(self.prices)} trades)")
+            if not self.loop:
+                self.finished = True
+                return
+
+    async def log_stats(self):
+        last = 0
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            logger.info(f"[Stats] {(self.sent - last) / STATS_INTERVAL:.0f} trades/s, {self.sent} total, "
+                        f"{len(self.clients)} clients")
+            last = self.sent
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay recorded trades over the Finnhub WebSocket protocol")
+    parser.add_argument("paths", nargs="+", help="CSV / CSV.gz / Parquet recordings")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="speed-up over the recorded spacing")
+    pace.add_argument("--rate", type=float, help="fixed trades per second, ignoring recorded spacing")
+    parser.add_argument("--loop", action="store_true", help="restart the recording when it ends")
+    parser.add_argument("--symbol-format", default="REPLAY:{id}", help="symbol for each stock_id")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--wait-clients", type=int, default=1, help="start replaying once this many clients subscribed")
+    args = parser.parse_args()
+
+    symbols, prices, volumes, offsets = load_recording(args.paths, args.symbol_format)
+    logger.info(f"Loaded {len(prices)} trades for {len(set(symbols))} symbols spanning {offsets[-1]:.0f}s")
+
+    server = ReplayServer(symbols, prices, volumes, offsets, speed=args.speed, rate=args.rate, loop=args.loop)
+    async with websockets.serve(server.handler, args.host, args.port, max_size=None):
+        logger.info(f"🚀 Replay server on ws://{args.host}:{args.port}")
+        while sum(1 for c in server.clients if c.symbols) < args.wait_clients:
+            await asyncio.sleep(0.1)
+        asyncio.create_task(server.log_stats())
+        await server.replay()
+        # Keep sockets open so the pipeline can drain before clients see a disconnect
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,74 +1,226 @@
 # services/SyncRedis.py
 
 import os
+import json
+import asyncio
 from dotenv import load_dotenv
 from pathlib import Path
 from redis.asyncio import Redis
 import asyncpg
-from sqlalchemy import select
-from datetime import datetime
+
+from trade_codec import snapshot_key
 
 if os.environ.get("ENV") != "fly":
     load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 
 REDIS_URL = os.environ.get("REDIS_URL")
 DATABASE_URL = os.environ.get("DATABASE_URL")
+DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+SYMBOLS_KEY = "stock:symbols"
+SYMBOL_EVENTS_CHANNEL = "stock:symbols:events"   # {"add": [...], "remove": [...]} per applied change set
+NOTIFY_CHANNEL = "stock_changed"
+DELTA_BATCH = 1000          # notifications applied per Redis pipeline
+LISTEN_CHECK_INTERVAL = 30  # seconds between listener connection health checks
+
+# -------------------------- NOTIFY TRIGGER ---------------------------------------------------------
+# One NOTIFY per changed row carrying what changed, so listeners apply a delta instead of rescanning
+# `stocks`. Notifications are delivered on commit, in commit order; a bulk import is just N deltas.
+
+STOCK_NOTIFY_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_stock_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object('op', 'INSERT', 'symbol', NEW.symbol)::text);
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object('op', 'DELETE', 'symbol', OLD.symbol)::text);
+        ELSIF NEW.symbol IS DISTINCT FROM OLD.symbol THEN
+            PERFORM pg_notify('{NOTIFY_CHANNEL}',
+                json_build_object('op', 'UPDATE', 'symbol', NEW.symbol, 'old_symbol', OLD.symbol)::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS stock_changed ON stocks",
+    """
+    CREATE TRIGGER stock_changed
+    AFTER INSERT OR DELETE OR UPDATE OF symbol ON stocks
+    FOR EACH ROW EXECUTE FUNCTION notify_stock_changed()
+    """,
+]
+
+async def ensure_notify_trigger(pg_pool):
+    async with pg_pool.acquire() as conn:
+        async with conn.transaction():
+            for ddl in STOCK_NOTIFY_DDL:
+                await conn.execute(ddl)
+
+def parse_change(payload: str):
+    # → [(op, symbol)] with op "add"/"remove", or None when the payload carries no delta
+    try:
+        data = json.loads(payload) if payload else None
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not data.get("symbol"):
+        return None
+    op = data.get("op")
+    if op == "INSERT":
+        return [("add", data["symbol"])]
+    if op == "DELETE":
+        return [("remove", data["symbol"])]
+    if op == "UPDATE":
+        old = data.get("old_symbol")
+        return ([("remove", old)] if old else []) + [("add", data["symbol"])]
+    return None
+
+def net_changes(changes) -> tuple[list, list]:
+    # Collapse an ordered [(op, symbol)] list into final adds/removes (e.g. remove then re-add = add)
+    added, removed = set(), set()
+    for op, symbol in changes:
+        if op == "add":
+            added.add(symbol)
+            removed.discard(symbol)
+        else:
+            removed.add(symbol)
+            added.discard(symbol)
+    return sorted(added), sorted(removed)
+
+def publish_changes(pipe, added, removed):
+    # Lets streamers (WebSocket.py) subscribe/unsubscribe on their open socket without a reconnect
+    if added or removed:
+        pipe.publish(SYMBOL_EVENTS_CHANNEL, json.dumps({"add": list(added), "remove": list(removed)}))
 
 # -------------------------- LOAD STOCK SYMBOLS FROM DB ---------------------------------------------
 
-async def fetch_symbols():
+async def fetch_symbols(pg_pool=None):
     try:
-        conn = await asyncpg.connect(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
-        rows = await conn.fetch("SELECT symbol FROM stocks")
-        await conn.close()
+        if pg_pool is not None:
+            async with pg_pool.acquire() as conn:
+                rows = await conn.fetch("SELECT symbol FROM stocks")
+        else:
+            conn = await asyncpg.connect(DSN)
+            try:
+                rows = await conn.fetch("SELECT symbol FROM stocks")
+            finally:
+                await conn.close()
         return [row["symbol"] for row in rows]
     except Exception as e:
         print(f"❌ Failed to fetch symbols from DB: {e}")
-        return []
-
-# ----------------------------------- INITIAL POPULATION -------------------------------------
+        return None
+
+# ----------------------------------- FULL RECONCILE -------------------------------------
+# Safety net only (startup, after a LISTEN reconnect, periodically): the NOTIFY deltas keep the set
+# current in between.
+
+async def reconcile_symbols(redis, pg_pool=None) -> tuple[set, set]:
+    current_symbols = await fetch_symbols(pg_pool)
+    if current_symbols is None:
+        raise RuntimeError("Could not read stocks for reconcile")
+    current_symbols = set(current_symbols)
+    existing_symbols = set(await redis.smembers(SYMBOLS_KEY))
+
+    to_add = current_symbols - existing_symbols
+    to_remove = existing_symbols - current_symbols
+    if to_add or to_remove:
+        pipe = redis.pipeline(transaction=False)
+        to_add_list, to_remove_list = list(to_add), list(to_remove)
+        for i in range(0, len(to_add_list), DELTA_BATCH):
+            pipe.sadd(SYMBOLS_KEY, *to_add_list[i:i + DELTA_BATCH])
+        for i in range(0, len(to_remove_list), DELTA_BATCH):
+            pipe.srem(SYMBOLS_KEY, *to_remove_list[i:i + DELTA_BATCH])
+            pipe.delete(*map(snapshot_key, to_remove_list[i:i + DELTA_BATCH]))
+        publish_changes(pipe, to_add_list, to_remove_list)
+        await pipe.execute()
+        print(f"✅ Reconciled Redis symbols: +{len(to_add)} -{len(to_remove)}")
+    return to_add, to_remove
 
 async def initialize_redis_symbols():
     redis = Redis.from_url(REDIS_URL, decode_responses=True)
-    symbols = await fetch_symbols()
-
-    if not symbols:
-        print("⚠️ No symbols found.")
-        return
-
     try:
-        await redis.delete("stock:symbols")
-        BATCH_SIZE = 1000
-        for i in range(0, len(symbols), BATCH_SIZE):
-            batch = symbols[i:i + BATCH_SIZE]
-            await redis.sadd("stock:symbols", *batch)
-        print(f"✅ Initialized Redis with {len(symbols)} symbols.")
+        await reconcile_symbols(redis)
+        print(f"✅ Initialized Redis with {await redis.scard(SYMBOLS_KEY)} symbols.")
     except Exception as e:
         print(f"❌ Redis init failed: {e}")
-
-
-# ------------------------------------INCREMENTAL SYNC --------------------------------------
-
-
-async def sync_symbols_to_redis():
-    redis = Redis.from_url(REDIS_URL, decode_responses=True)
-
-    current_symbols = set(await fetch_symbols())
-
-    try:
-        existing_symbols = await redis.smembers("stock:symbols")
-        existing_symbols = set(existing_symbols)
-
-        to_add = current_symbols - existing_symbols
-        to_remove = existing_symbols - current_symbols
-
-        if to_add:
-            await redis.sadd("stock:symbols", *to_add)
-            print(f" Added {len(to_add)} new symbols.")
-        if to_remove:
-            await redis.srem("stock:symbols", *to_remove)
-            print(f" Removed {len(to_remove)} symbols.")
-        if not to_add and not to_remove:
-            print("✅ Redis already in sync.")
-    except Exception as e:
-        print(f"❌ Redis sync failed: {e}")
+    finally:
+        await redis.close()
+
+# ------------------------------------ DELTA SYNC --------------------------------------
+# Long-lived Redis client and Postgres pool; every NOTIFY becomes an SADD/SREM, drained in batches so a
+# burst of notifications costs one pipeline round trip, not one table scan per row.
+
+class SymbolSync:
+    def __init__(self, redis, pg_pool):
+        self.redis = redis
+        self.pg_pool = pg_pool
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # A delta and a full diff must not interleave: a reconcile that read `stocks` before a delta
+        # committed would otherwise undo that delta in Redis (and publish the reverse change)
+        self._lock = asyncio.Lock()
+        self.applied = 0
+        self.reconciles = 0
+
+    def on_notify(self, conn, pid, channel, payload):
+        self._queue.put_nowait(payload)
+
+    async def apply(self, payloads: list[str]):
+        async with self._lock:
+            return await self._apply(payloads)
+
+    async def _apply(self, payloads: list[str]):
+        changes, unparsed = [], 0
+        for payload in payloads:
+            change = parse_change(payload)
+            if change is None:
+                unparsed += 1
+            else:
+                changes.extend(change)
+
+        if changes:
+            pipe = self.redis.pipeline(transaction=False)
+            for op, symbol in changes:   # order matters for a rename followed by a re-insert
+                if op == "add":
+                    pipe.sadd(SYMBOLS_KEY, symbol)
+                else:
+                    pipe.srem(SYMBOLS_KEY, symbol)
+                    pipe.delete(snapshot_key(symbol))   # snapshots don't expire; a delisted symbol's goes here
+            publish_changes(pipe, *net_changes(changes))
+            await pipe.execute()
+            self.applied += len(changes)
+        if unparsed:
+            # Legacy trigger without a payload: fall back to a diff
+            await self._reconcile()
+        return changes
+
+    async def reconcile(self):
+        # Also run by the periodic cron job, concurrently with listen()
+        async with self._lock:
+            return await self._reconcile()
+
+    async def _reconcile(self):
+        self.reconciles += 1
+        return await reconcile_symbols(self.redis, self.pg_pool)
+
+    async def listen(self, dsn: str = DSN):
+        conn = await asyncpg.connect(dsn)
+        try:
+            await conn.add_listener(NOTIFY_CHANNEL, self.on_notify)
+            print(f"✅ Listening to '{NOTIFY_CHANNEL}' notifications from Postgres")
+            # Changes made while no listener was attached are only visible to a full diff
+            await self.reconcile()
+            while not conn.is_closed():
+                try:
+                    payload = await asyncio.wait_for(self._queue.get(), LISTEN_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    continue
+                batch = [payload]
+                while len(batch) < DELTA_BATCH and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self.apply(batch)
+            raise ConnectionError("LISTEN connection closed")
+        finally:
+            await conn.close()
+
+    def stats(self) -> dict:
+        return {"applied": self.applied, "reconciles": self.reconciles, "queued": self._queue.qsize()}
@@ -1,4 +1,8 @@
 import asyncio
+import argparse
+import multiprocessing
+import signal
+import time
 import websockets
 import json
 import logging
@@ -11,7 +15,7 @@ from redis.asyncio import Redis
 from dotenv import load_dotenv
 
 # --- Logging ---
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(processName)s:%(message)s")
 logger = logging.getLogger("websocket-streamer")
 
 # --- ENV Setup ---
@@ -19,13 +23,64 @@ sys.path.append(str(Path(__file__).resolve().parent))
 if not os.environ.get("ENV"):
     load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
-FINNHUB_API_KEY = os.environ["FINNHUB_API_KEY"]
+from sharding import symbols_for_shard, dirty_key, group_by_partition
+from tick_streams import append_ticks
+from bars import start_bar_engine
+from background import keep_running
+from indicators import IndicatorEngine
+from metrics import counter, gauge, histogram, start_metrics_server, SIZE_BUCKETS
+from trade_codec import write_snapshot, LEGACY_PRICE_PREFIX, LEGACY_TRADE_PREFIX
+
 REDIS_URL = os.environ["REDIS_URL"]
-FINNHUB_WS_URL = f"wss://ws.finnhub.io?token={FINNHUB_API_KEY}"
+# Override to point at a local stand-in, e.g. ws://localhost:8765 for benchmarks/replay_server.py
+FINNHUB_WS_URL = os.environ.get("FINNHUB_WS_URL") or f"wss://ws.finnhub.io?token={os.environ['FINNHUB_API_KEY']}"
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
 
 SYMBOLS_KEY = "stock:symbols"
-PRICE_PREFIX = "stock:price:"
-TRADE_PREFIX = "stock:trade:"
+SYMBOL_EVENTS_CHANNEL = "stock:symbols:events"   # published by SyncRedis whenever stock:symbols changes
+PRICES_CHANNEL = "stock:prices" # one {symbol: [price, ts]} message per flush, fanned out by the API
+
+# --- Write Path Tuning ---
+QUEUE_MAXSIZE = int(os.environ.get("WS_QUEUE_MAXSIZE", "10000"))          # frames waiting for the flusher
+FLUSH_INTERVAL = float(os.environ.get("WS_FLUSH_INTERVAL", "0.25"))       # seconds between time-triggered flushes
+FLUSH_MAX_SYMBOLS = int(os.environ.get("WS_FLUSH_MAX_SYMBOLS", "500"))    # size trigger for the per-symbol buffer
+STATS_INTERVAL = int(os.environ.get("WS_STATS_INTERVAL", "60"))           # seconds between stats log lines
+
+# --- Snapshot Migration ---
+LEGACY_KEYS = os.environ.get("WS_LEGACY_KEYS", "0") == "1"                # also write stock:price/stock:trade for old readers
+
+# --- Tick Streams ---
+TICK_STREAMS = os.environ.get("WS_TICK_STREAMS", "0") == "1"              # also XADD every raw tick (see tick_streams.py)
+
+# --- Bars ---
+BARS_ENABLED = os.environ.get("WS_BARS", "0") == "1"                      # build OHLCV bars from every tick (see bars.py)
+
+# --- Indicators ---
+INDICATORS_ENABLED = os.environ.get("WS_INDICATORS", "0") == "1"          # live EMA/volatility/VWAP/RSI (see indicators.py)
+
+# --- Supervisor ---
+WS_WORKERS = int(os.environ.get("WS_WORKERS", "1"))                       # streamer processes (1 = no supervisor)
+WORKER_RESTART_DELAY = 5                                                  # seconds before respawning a dead worker
+
+# --- Metrics ---
+METRICS_PORT = int(os.environ.get("WS_METRICS_PORT", "9101"))            # shard i serves /metrics on port + i (0 = off)
+
+FRAMES = counter("ingest_frames_total", "Trade frames received from Finnhub")
+TRADES = counter("ingest_trades_total", "Trades received from Finnhub")
+DROPPED = counter("ingest_dropped_trades_total", "Trades shed because the flush queue was full")
+COALESCED = counter("ingest_coalesced_trades_total", "Trades superseded by a newer trade before flushing")
+FLUSHES = counter("ingest_flushes_total", "Redis flush pipelines by result", ("result",))
+EXCHANGE_TO_REDIS = histogram(
+    "ingest_exchange_to_redis_seconds", "Exchange trade timestamp to Redis pipeline acknowledged (newest trade per symbol)"
+)
+FLUSH_SECONDS = histogram("ingest_flush_seconds", "Redis flush pipeline round trip")
+PIPELINE_COMMANDS = histogram("ingest_pipeline_commands", "Commands per Redis flush pipeline", buckets=SIZE_BUCKETS)
+FLUSH_SYMBOLS = histogram("ingest_flush_symbols", "Symbols written per flush", buckets=SIZE_BUCKETS)
+RECONNECTS = counter("ws_reconnects_total", "Finnhub WebSocket reconnects by cause", ("reason",))
+SYMBOL_CHANGES = counter("ws_symbol_changes_total", "Live subscribe/unsubscribe messages sent", ("action",))
+QUEUE_DEPTH = gauge("ingest_queue_depth", "Frames waiting for the flusher")
+SUBSCRIBED = gauge("ws_subscribed_symbols", "Symbols subscribed on the open socket")
 
 # --- Redis Utils ---
 async def get_symbols(redis: Redis) -> Set[str]:
@@ -36,37 +91,246 @@ async def get_symbols(redis: Redis) -> Set[str]:
         logger.error(f"[Redis] Failed to fetch symbols: {e}")
         return set()
 
-async def flush_trades(redis: Redis, trades: list[dict]):
+async def flush_trades(redis: Redis, trades: list[dict], ticks: list[dict] = None, sinks: list = ()):
     pipe = redis.pipeline()
-    now = datetime.now(timezone.utc).isoformat()
+    now_ms = int(time.time() * 1000)
 
     for trade in trades:
         symbol = trade.get("s")
         price = trade.get("p")
-        timestamp = trade.get("t")
-        volume = trade.get("v", 0)
         if not symbol or price is None:
             continue
+        # One numeric hash per symbol (see trade_codec.py) — no JSON on the hot path
+        write_snapshot(pipe, symbol, price, trade.get("t"), trade.get("v", 0), now_ms)
+
+        if LEGACY_KEYS:
+            pipe.set(f"{LEGACY_PRICE_PREFIX}{symbol}", price)
+            pipe.setex(f"{LEGACY_TRADE_PREFIX}{symbol}", 3600, json.dumps({
+                "price": price,
+                "timestamp": trade.get("t"),
+                "volume": trade.get("v", 0),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }))
 
-        trade_info = {
-            "price": price,
-            "timestamp": timestamp,
-            "volume": volume,
-            "updated_at": now
-        }
+    dirty = {trade["s"] for trade in trades if trade.get("s")}
+    if dirty:
+        for partition, symbols in group_by_partition(dirty).items():
+            pipe.sadd(dirty_key(partition), *symbols)   # drained by whichever fetcher owns the partition
+        pipe.publish(PRICES_CHANNEL, json.dumps(
+            {trade["s"]: [trade["p"], trade.get("t")] for trade in trades if trade.get("s") and trade.get("p") is not None},
+            separators=(",", ":"),
+        ))
 
-        pipe.set(f"{PRICE_PREFIX}{symbol}", price)
-        pipe.setex(f"{TRADE_PREFIX}{symbol}", 3600, json.dumps(trade_info))
+    if ticks:
+        append_ticks(pipe, ticks)
 
+    for sink in sinks:
+        sink.write(pipe)
+
+    PIPELINE_COMMANDS.observe(len(pipe))
+    start = time.perf_counter()
     try:
         await pipe.execute()
     except Exception as e:
+        FLUSHES.labels("error").inc()
         logger.error(f"[Redis] Pipeline failed: {e}")
+        return False
+
+    FLUSH_SECONDS.observe(time.perf_counter() - start)
+    FLUSHES.labels("ok").inc()
+    FLUSH_SYMBOLS.observe(len(trades))
+    now_ms = time.time() * 1000
+    for trade in trades:
+        if trade.get("t"):
+            EXCHANGE_TO_REDIS.observe(max(now_ms - trade["t"], 0) / 1000)
+    return True
+
+# --- Write Path Stats ---
+class StreamStats:
+    __slots__ = ("frames", "trades", "dropped", "coalesced", "flushes", "flushed", "failed_flushes")
+
+    def __init__(self):
+        self.frames = 0          # trade frames received from Finnhub
+        self.trades = 0          # trades parsed out of those frames
+        self.dropped = 0         # trades dropped because the queue was full
+        self.coalesced = 0       # trades superseded by a newer trade before flushing
+        self.flushes = 0         # pipelines sent to Redis
+        self.flushed = 0         # symbols written across all pipelines
+        self.failed_flushes = 0
+
+    def snapshot(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+async def log_stats(stats: StreamStats, queue: asyncio.Queue, sinks: list):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        logger.info(f"[Stats] queue={queue.qsize()}/{queue.maxsize} {stats.snapshot()}")
+        for sink in sinks:
+            logger.info(f"[Stats] {type(sink).__name__}: {sink.stats()}")
+
+# --- Receive Side ---
+def enqueue_trades(queue: asyncio.Queue, stats: StreamStats, trades: list[dict]):
+    stats.frames += 1
+    stats.trades += len(trades)
+    FRAMES.inc()
+    TRADES.inc(len(trades))
+    try:
+        queue.put_nowait(trades)
+    except asyncio.QueueFull:
+        # Newer prices win, so shed the oldest frame rather than the incoming one
+        oldest = queue.get_nowait()
+        stats.dropped += len(oldest)
+        DROPPED.inc(len(oldest))
+        queue.put_nowait(trades)
+
+# --- Flush Side ---
+# Sinks see every raw trade through on_ticks() as frames are dequeued, and add their own
+# commands to the flush pipeline through write(pipe)
+async def flush_loop(redis: Redis, queue: asyncio.Queue, stats: StreamStats, sinks: list):
+    loop = asyncio.get_running_loop()
+    buffer: dict[str, dict] = {}
+    ticks: list[dict] = []   # every raw trade, only kept when tick streams are enabled
+    deadline = None
+
+    while True:
+        timeout = None if deadline is None else max(deadline - loop.time(), 0)
+        try:
+            trades = await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            trades = None
+
+        if trades:
+            if TICK_STREAMS:
+                ticks.extend(trades)
+            for sink in sinks:
+                sink.on_ticks(trades)
+            for trade in trades:
+                symbol = trade.get("s")
+                if not symbol or trade.get("p") is None:
+                    continue
+                previous = buffer.get(symbol)
+                if previous is not None:
+                    stats.coalesced += 1
+                    COALESCED.inc()
+                    if (previous.get("t") or 0) > (trade.get("t") or 0):
+                        continue
+                buffer[symbol] = trade
+            if buffer and deadline is None:
+                deadline = loop.time() + FLUSH_INTERVAL
+
+        if buffer and (len(buffer) >= FLUSH_MAX_SYMBOLS or loop.time() >= deadline):
+            batch = list(buffer.values())
+            batch_ticks, ticks = ticks, []
+            buffer.clear()
+            deadline = None
+            if await flush_trades(redis, batch, batch_ticks, sinks):
+                stats.flushes += 1
+                stats.flushed += len(batch)
+            else:
+                stats.failed_flushes += 1
+
+async def subscribe_all(ws, symbols: Set[str], action: str = "subscribe"):
+    # Sent concurrently so thousands of symbols don't cost thousands of sequential awaits
+    await asyncio.gather(*(ws.send(json.dumps({"type": action, "symbol": sym})) for sym in symbols))
+
+# --- Live Subscriptions ---
+# Tracks what the open socket is subscribed to. attach() (bulk, after every connect) and apply() (deltas
+# from SYMBOL_EVENTS_CHANNEL) share a lock, so an event can't slip between reading stock:symbols and
+# subscribing: it is either already in the set read, or applied right after.
+class Subscriptions:
+    def __init__(self, redis: Redis, shard_index: int, shard_count: int):
+        self.redis = redis
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.ws = None
+        self.active: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self.subscribed = 0
+        self.unsubscribed = 0
+
+    def _mine(self, symbols) -> Set[str]:
+        return symbols_for_shard(symbols, self.shard_index, self.shard_count)
+
+    async def attach(self, ws) -> Set[str]:
+        async with self._lock:
+            symbols = self._mine(await get_symbols(self.redis))
+            self.ws, self.active = ws, set()
+            await subscribe_all(ws, symbols)
+            self.active = symbols
+            return symbols
+
+    def detach(self):
+        self.ws = None
+        self.active = set()
+
+    async def apply(self, added, removed):
+        async with self._lock:
+            if self.ws is None:
+                return   # the next attach() reads the full set anyway
+            to_add = self._mine(added) - self.active
+            to_remove = self._mine(removed) & self.active
+            if to_add:
+                await subscribe_all(self.ws, to_add)
+                self.active |= to_add
+                self.subscribed += len(to_add)
+                SYMBOL_CHANGES.labels("subscribe").inc(len(to_add))
+            if to_remove:
+                await subscribe_all(self.ws, to_remove, "unsubscribe")
+                self.active -= to_remove
+                self.unsubscribed += len(to_remove)
+                SYMBOL_CHANGES.labels("unsubscribe").inc(len(to_remove))
+            if to_add or to_remove:
+                logger.info(f"[WS] Live update: +{len(to_add)} -{len(to_remove)} → {len(self.active)} symbols")
+
+    async def resync(self):
+        # Events may have been missed while the watcher was disconnected: diff against the source of truth
+        # (read directly: get_symbols() turns a Redis error into an empty set, i.e. "unsubscribe all")
+        current = self._mine(await self.redis.smembers(SYMBOLS_KEY))
+        await self.apply(current, self.active - current)
+
+    async def watch(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(SYMBOL_EVENTS_CHANNEL)
+                await self.resync()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    await self.apply(event.get("add", ()), event.get("remove", ()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Symbols] Event watcher failed: {e}")
+            finally:
+                await pubsub.close()
+            await asyncio.sleep(3)
 
 # --- Streamer ---
-async def stream_trades():
+async def stream_trades(shard_index: int = 0, shard_count: int = 1):
     redis = Redis.from_url(REDIS_URL, decode_responses=True)
-    logger.info("[Redis] Connected ✅")
+    logger.info(f"[Redis] Connected ✅ (shard {shard_index + 1}/{shard_count})")
+
+    # The flusher outlives individual connections so buffered trades survive a reconnect
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)
+    stats = StreamStats()
+    sinks = []
+    if BARS_ENABLED:
+        shard_symbols = symbols_for_shard(await get_symbols(redis), shard_index, shard_count)
+        sinks.append(await start_bar_engine(redis, DSN, shard_symbols))
+    if INDICATORS_ENABLED:
+        sinks.append(IndicatorEngine())
+    # Restarted if they ever end: without the flusher or the watcher the shard would keep receiving
+    # trades it never writes, or stay subscribed to a stale symbol set
+    keep_running(lambda: flush_loop(redis, queue, stats, sinks), "flush-loop")
+    keep_running(lambda: log_stats(stats, queue, sinks), "log-stats")
+    subscriptions = Subscriptions(redis, shard_index, shard_count)
+    keep_running(subscriptions.watch, "symbol-watcher")
+
+    QUEUE_DEPTH.set_function(queue.qsize)
+    SUBSCRIBED.set_function(lambda: len(subscriptions.active))
+    await start_metrics_server(METRICS_PORT and METRICS_PORT + shard_index)
 
     reconnect_delay = 3
     max_delay = 60
@@ -78,36 +342,110 @@ async def stream_trades():
                 logger.info("[WS] Connected ✅")
                 reconnect_delay = 3
 
-                symbols = await get_symbols(redis)
+                symbols = await subscriptions.attach(ws)
                 if not symbols:
-                    logger.warning("[WS] No symbols to subscribe — sleeping 30s")
-                    await asyncio.sleep(30)
-                    continue
-
-                for sym in symbols:
-                    await ws.send(json.dumps({"type": "subscribe", "symbol": sym}))
+                    # Stay connected: symbols added later arrive through the event watcher
+                    logger.warning("[WS] No symbols to subscribe yet — waiting for symbol events")
+                else:
+                    logger.info(f"[WS] Subscribed to {len(symbols)} symbols")
 
                 while True:
-                    msg = await asyncio.wait_for(ws.recv(), timeout=30)
+                    try:
+                        msg = await asyncio.wait_for(ws.recv(), timeout=30)
+                    except asyncio.TimeoutError:
+                        if subscriptions.active:
+                            raise
+                        continue   # an idle socket is expected while nothing is subscribed
                     data = json.loads(msg)
                     if data.get("type") == "trade":
-                        await flush_trades(redis, data.get("data", []))
+                        active = subscriptions.active
+                        # Trades still in flight for just-unsubscribed symbols are not ingested
+                        trades = [t for t in data.get("data", []) if t.get("s") in active]
+                        if trades:
+                            enqueue_trades(queue, stats, trades)
 
         except asyncio.TimeoutError:
+            RECONNECTS.labels("timeout").inc()
             logger.warning("[WS] Timeout — retrying")
         except websockets.ConnectionClosed:
+            RECONNECTS.labels("closed").inc()
             logger.warning("[WS] Connection closed — reconnecting")
         except Exception as e:
+            RECONNECTS.labels("error").inc()
             logger.error(f"[WS] Error: {e}")
 
+        subscriptions.detach()
         logger.info(f"[WS] Reconnecting in {reconnect_delay}s...")
         await asyncio.sleep(reconnect_delay)
         reconnect_delay = min(reconnect_delay * 2, max_delay)
 
+# --- Worker Processes ---
+def run_worker(shard_index: int, shard_count: int):
+    # Parent handles shutdown; workers just die with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(stream_trades(shard_index, shard_count))
+    except Exception as e:
+        logger.exception(f"[FATAL] Shard {shard_index} crashed: {e}")
+
+def spawn_worker(shard_index: int, shard_count: int) -> multiprocessing.Process:
+    proc = multiprocessing.Process(
+        target=run_worker,
+        args=(shard_index, shard_count),
+        name=f"shard-{shard_index}",
+        daemon=True,
+    )
+    proc.start()
+    logger.info(f"[Supervisor] Started shard {shard_index} (pid {proc.pid})")
+    return proc
+
+def supervise(worker_count: int):
+    workers = {i: spawn_worker(i, worker_count) for i in range(worker_count)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Dead shards wait out WORKER_RESTART_DELAY side by side, each against its own deadline, while the
+    # 1s tick keeps noticing SIGTERM
+    restart_at: dict[int, float] = {}
+    while not stopping:
+        time.sleep(1)
+        now = time.monotonic()
+        for i, proc in list(workers.items()):
+            if stopping:
+                break
+            if i in restart_at:
+                if now >= restart_at[i]:
+                    del restart_at[i]
+                    workers[i] = spawn_worker(i, worker_count)
+            elif not proc.is_alive():
+                logger.warning(f"[Supervisor] Shard {i} exited with code {proc.exitcode} — restarting in {WORKER_RESTART_DELAY}s")
+                restart_at[i] = now + WORKER_RESTART_DELAY
+
+    logger.info("[Supervisor] Stopping workers...")
+    for proc in workers.values():
+        proc.terminate()
+    for proc in workers.values():
+        proc.join(timeout=10)
+
 # --- Boot ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finnhub → Redis trade streamer")
+    parser.add_argument("--workers", type=int, default=WS_WORKERS,
+                        help="number of streamer processes; symbols are split between them by stable hash")
+    args = parser.parse_args()
+
     try:
-        logger.info("🚀 Starting real-time streamer (flushes immediately)")
-        asyncio.run(stream_trades())
+        logger.info(f"🚀 Starting real-time streamer (coalesced flush every {FLUSH_INTERVAL}s / {FLUSH_MAX_SYMBOLS} symbols)")
+        if args.workers > 1:
+            supervise(args.workers)
+        else:
+            asyncio.run(stream_trades())
     except Exception as e:
-        logger.exception(f"[FATAL] Crashed: {e}")
\ No newline at end of file
+        logger.exception(f"[FATAL] Crashed: {e}")
+
@@ -0,0 +1,34 @@
+# services/background.py
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("background")
+
+RESTART_DELAY = 3
+
+# -------------------------- LONG-LIVED HELPER TASKS -------------------------------------------
+# Flushers, watchers and listeners run next to a service's main loop for the life of the process. The
+# event loop only keeps a weak reference to a bare create_task(), and an exception ending one surfaces, if
+# ever, as "Task exception was never retrieved" while the service carries on without it. keep_running()
+# holds the handle and restarts the coroutine whenever it ends; cancelling the returned task stops it.
+
+_running: set[asyncio.Task] = set()
+
+async def _run_forever(factory: Callable[[], Awaitable], name: str, restart_delay: float):
+    while True:
+        try:
+            await factory()
+            logger.error(f"[{name}] Exited — restarting in {restart_delay}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"[{name}] Crashed — restarting in {restart_delay}s")
+        await asyncio.sleep(restart_delay)
+
+def keep_running(factory: Callable[[], Awaitable], name: str, restart_delay: float = RESTART_DELAY) -> asyncio.Task:
+    task = asyncio.create_task(_run_forever(factory, name, restart_delay), name=name)
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
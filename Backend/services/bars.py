@@ -0,0 +1,243 @@
+# services/bars.py
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+
+import asyncpg
+
+from symbol_cache import SymbolResolver
+from background import keep_running
+
+logger = logging.getLogger("bars")
+
+# -------------------- CONFIG ---------------------
+RESOLUTIONS_MS = {"1s": 1_000, "1m": 60_000, "5m": 300_000}
+BAR_RESOLUTIONS = [r for r in os.environ.get("BAR_RESOLUTIONS", "1s,1m,5m").split(",") if r in RESOLUTIONS_MS]
+BAR_GRACE_MS = int(os.environ.get("BAR_GRACE_MS", "2000"))          # how long a bar stays open for late ticks
+BAR_PERSIST_INTERVAL = float(os.environ.get("BAR_PERSIST_INTERVAL", "1"))
+BAR_MAX_PENDING = 500_000                                           # closed bars kept for retry while Postgres is down
+
+BAR_KEY_PREFIX = "stock:bar:"                                       # stock:bar:<resolution>:<symbol> (in-progress bar)
+BARS_TABLE = "stock_bars"
+BAR_COLUMNS = ("stock_id", "resolution", "bucket_start", "open", "high", "low", "close", "volume", "vwap", "trade_count")
+
+BARS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {BARS_TABLE} (
+        stock_id     INTEGER NOT NULL REFERENCES stocks(id),
+        resolution   TEXT NOT NULL,
+        bucket_start TIMESTAMP NOT NULL,
+        open         DOUBLE PRECISION NOT NULL,
+        high         DOUBLE PRECISION NOT NULL,
+        low          DOUBLE PRECISION NOT NULL,
+        close        DOUBLE PRECISION NOT NULL,
+        volume       DOUBLE PRECISION NOT NULL,
+        vwap         DOUBLE PRECISION,
+        trade_count  INTEGER NOT NULL,
+        PRIMARY KEY (stock_id, resolution, bucket_start)
+    )
+"""
+
+# Closed bars are COPYed into a temp table and merged, so a bar re-closed after a restart
+# (or a late tick after a partial persist) updates the row instead of failing the batch
+UPSERT_SQL = f"""
+    INSERT INTO {BARS_TABLE} ({", ".join(BAR_COLUMNS)})
+    SELECT {", ".join(BAR_COLUMNS)} FROM bars_staging
+    ON CONFLICT (stock_id, resolution, bucket_start) DO UPDATE SET
+        open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close,
+        volume = EXCLUDED.volume, vwap = EXCLUDED.vwap, trade_count = EXCLUDED.trade_count
+"""
+
+def bar_key(resolution: str, symbol: str) -> str:
+    return f"{BAR_KEY_PREFIX}{resolution}:{symbol}"
+
+# -------------------- BAR STATE ---------------------
+
+class Bar:
+    __slots__ = ("start", "open", "high", "low", "close", "volume", "notional", "trades")
+
+    def __init__(self, start: int, price: float):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = 0.0
+        self.notional = 0.0   # Σ price·volume, for VWAP
+        self.trades = 0
+
+    def update(self, price: float, volume: float):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.notional += price * volume
+        self.trades += 1
+
+    @property
+    def vwap(self):
+        return self.notional / self.volume if self.volume else None
+
+    def to_hash(self) -> dict:
+        return {
+            "start": self.start, "o": self.open, "h": self.high, "l": self.low, "c": self.close,
+            "v": self.volume, "pv": self.notional, "n": self.trades,
+        }
+
+    @classmethod
+    def from_hash(cls, data: dict) -> "Bar":
+        bar = cls(int(data["start"]), float(data["o"]))
+        bar.high, bar.low, bar.close = float(data["h"]), float(data["l"]), float(data["c"])
+        bar.volume, bar.notional, bar.trades = float(data["v"]), float(data["pv"]), int(data["n"])
+        return bar
+
+# -------------------- AGGREGATOR ---------------------
+# Every tick touches one bar per resolution through a dict lookup — O(1) per tick. Bars are closed in
+# a separate sweep once the watermark (newest exchange time seen, or wall clock if later) has passed
+# bar end + grace; ticks for a bar that has already closed are counted as late and dropped.
+
+class BarAggregator:
+    def __init__(self, resolutions: list[str] = BAR_RESOLUTIONS, grace_ms: int = BAR_GRACE_MS):
+        self.resolutions = [(name, RESOLUTIONS_MS[name]) for name in resolutions]
+        self.grace_ms = grace_ms
+        self._open: dict[tuple[str, str], dict[int, Bar]] = {}   # (symbol, resolution) → start → bar
+        self._closed_through: dict[tuple[str, str], int] = {}    # newest closed bar start per series
+        self._touched: set[tuple[str, str]] = set()              # series to mirror into Redis on next flush
+        self._closed: list[tuple[str, str, Bar]] = []
+        self.max_ts = 0
+
+        self.ticks = 0
+        self.late_dropped = 0
+        self.bars_closed = 0
+
+    # --- tick sink interface (see WebSocket.flush_loop) ---
+    def on_ticks(self, trades: list[dict]):
+        for trade in trades:
+            symbol, price, ts = trade.get("s"), trade.get("p"), trade.get("t")
+            if not symbol or price is None or not ts:
+                continue
+            self.add(symbol, float(price), float(trade.get("v") or 0), int(ts))
+
+    def write(self, pipe):
+        for symbol, resolution in self._touched:
+            bars = self._open.get((symbol, resolution))
+            if not bars:
+                continue
+            bar = bars[max(bars)]   # the newest open bar is the in-progress one
+            key = bar_key(resolution, symbol)
+            pipe.hset(key, mapping=bar.to_hash())
+            pipe.pexpire(key, RESOLUTIONS_MS[resolution] * 2 + self.grace_ms)
+        self._touched.clear()
+
+    # --- core ---
+    def add(self, symbol: str, price: float, volume: float, ts: int):
+        self.ticks += 1
+        if ts > self.max_ts:
+            self.max_ts = ts
+
+        for resolution, size in self.resolutions:
+            start = ts - ts % size
+            series = (symbol, resolution)
+            bars = self._open.get(series)
+            if bars is None:
+                bars = self._open[series] = {}
+            bar = bars.get(start)
+            if bar is None:
+                if start <= self._closed_through.get(series, -1):
+                    self.late_dropped += 1
+                    continue
+                bar = bars[start] = Bar(start, price)
+            bar.update(price, volume)
+            self._touched.add(series)
+
+    def close_due(self, now_ms: int = None) -> list[tuple[str, str, Bar]]:
+        watermark = max(self.max_ts, now_ms or int(time.time() * 1000)) - self.grace_ms
+        for (symbol, resolution), bars in self._open.items():
+            size = RESOLUTIONS_MS[resolution]
+            for start in [s for s in bars if s + size <= watermark]:
+                self._closed.append((symbol, resolution, bars.pop(start)))
+                if start > self._closed_through.get((symbol, resolution), -1):
+                    self._closed_through[(symbol, resolution)] = start
+                self.bars_closed += 1
+
+        closed, self._closed = self._closed, []
+        return closed
+
+    def requeue(self, closed: list[tuple[str, str, Bar]]):
+        # Keep failed batches for the next attempt, shedding the oldest if Postgres stays down
+        self._closed = (closed + self._closed)[-BAR_MAX_PENDING:]
+
+    async def restore(self, redis, symbols):
+        # Resume in-progress bars written by a previous run of this shard
+        keys = [(symbol, resolution) for symbol in symbols for resolution, _ in self.resolutions]
+        if not keys:
+            return
+        pipe = redis.pipeline()
+        for symbol, resolution in keys:
+            pipe.hgetall(bar_key(resolution, symbol))
+        restored = 0
+        for (symbol, resolution), data in zip(keys, await pipe.execute()):
+            if data:
+                bar = Bar.from_hash(data)
+                self._open.setdefault((symbol, resolution), {})[bar.start] = bar
+                restored += 1
+        logger.info(f"Restored {restored} in-progress bars from Redis")
+
+    def stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "open_bars": sum(len(bars) for bars in self._open.values()),
+            "bars_closed": self.bars_closed,
+            "late_dropped": self.late_dropped,
+            "pending_persist": len(self._closed),
+        }
+
+# -------------------- PERSISTENCE ---------------------
+
+async def ensure_bars_table(pg_pool):
+    async with pg_pool.acquire() as conn:
+        await conn.execute(BARS_DDL)
+
+async def persist_closed_bars(aggregator: BarAggregator, pg_pool, resolver) -> int:
+    closed = aggregator.close_due()
+    if not closed:
+        return 0
+    try:
+        stock_ids = await resolver.resolve_many(pg_pool, {symbol for symbol, _, _ in closed})
+        records = [
+            (stock_ids[symbol], resolution, datetime.utcfromtimestamp(bar.start / 1000.0),
+             bar.open, bar.high, bar.low, bar.close, bar.volume, bar.vwap, bar.trades)
+            for symbol, resolution, bar in closed if symbol in stock_ids
+        ]
+        if records:
+            async with pg_pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        f"CREATE TEMP TABLE IF NOT EXISTS bars_staging (LIKE {BARS_TABLE}) ON COMMIT DELETE ROWS"
+                    )
+                    await conn.copy_records_to_table("bars_staging", records=records, columns=BAR_COLUMNS)
+                    await conn.execute(UPSERT_SQL)
+        return len(records)
+    except Exception as e:
+        logger.error(f"[ERROR] Persisting {len(closed)} bars failed: {e}")
+        aggregator.requeue(closed)
+        return 0
+
+async def run_bar_persister(aggregator: BarAggregator, pg_pool, resolver):
+    while True:
+        await asyncio.sleep(BAR_PERSIST_INTERVAL)
+        await persist_closed_bars(aggregator, pg_pool, resolver)
+
+async def start_bar_engine(redis, dsn: str, symbols) -> BarAggregator:
+    pg_pool = await asyncpg.create_pool(dsn, min_size=1, max_size=2)
+    await ensure_bars_table(pg_pool)
+    resolver = SymbolResolver()
+    await resolver.load(pg_pool)
+    keep_running(lambda: resolver.listen(dsn, pg_pool), "bar-resolver")
+
+    aggregator = BarAggregator()
+    await aggregator.restore(redis, symbols)
+    keep_running(lambda: run_bar_persister(aggregator, pg_pool, resolver), "bar-persister")
+    logger.info(f"Bar engine started ({', '.join(BAR_RESOLUTIONS)}, grace {BAR_GRACE_MS}ms)")
+    return aggregator
@@ -1,7 +1,7 @@
 # services/cleaner.py
 
 import asyncio
-from datetime import datetime, time
+from datetime import datetime
 import asyncpg
 import os
 from dotenv import load_dotenv
@@ -27,46 +27,42 @@ async def table_not_empty(conn, table: str) -> bool:
         return False
 
 # ------------------------------------ MAIN CLEANUP TASK --------------------------------------
+# stock_price_history is range-partitioned: retention drops whole partitions in the hourly `partitions`
+# job (partitions.py), so ingestion never pauses and there is no table rewrite. predicted_prices is
+# small and still truncated nightly; TRUNCATE already returns the space, so no VACUUM FULL afterwards.
+# The scheduler decides when "nightly" is (CLEANUP_SCHEDULE in trigger.py); every run truncates.
 
-async def run_cleanup():
+async def run_cleanup(pg_pool):
     now_utc = datetime.utcnow()
-    current_time = now_utc.time()
     print(f"[CLEANER] Triggered at: {now_utc.isoformat()} UTC")
 
     try:
-        pg_pool = await asyncpg.create_pool(DATABASE_URL)
+        start = datetime.utcnow()
 
+        # --- predicted_prices ---
         async with pg_pool.acquire() as conn:
-            start = datetime.utcnow()
-
-            # --- stock_price_history 
-            if time(5, 2) <= current_time <= time(5, 5):
-                if await table_not_empty(conn, "stock_price_history"):
-                    print("🧹 Cleaning stock_price_history")
-                    await conn.execute("TRUNCATE stock_price_history RESTART IDENTITY")
-                    await conn.execute("VACUUM FULL VERBOSE ANALYZE stock_price_history")
-                else:
-                    print("✅ stock_price_history already empty — skipping")
-
-            # --- predicted_prices: Between 23:00 - 00:00 UTC ---
-            elif time(23, 0) <= current_time or current_time < time(0, 0):
-                if await table_not_empty(conn, "predicted_prices"):
-                    print("🧹 Cleaning predicted_prices")
-                    await conn.execute("TRUNCATE predicted_prices RESTART IDENTITY")
-                    await conn.execute("VACUUM FULL VERBOSE ANALYZE predicted_prices")
-                else:
-                    print("✅ predicted_prices already empty — skipping")
-
+            if await table_not_empty(conn, "predicted_prices"):
+                print("🧹 Cleaning predicted_prices")
+                await conn.execute("TRUNCATE predicted_prices RESTART IDENTITY")
             else:
-                print("⏳ Not in cleanup window — skipping")
+                print("✅ predicted_prices already empty — skipping")
 
-            duration = (datetime.utcnow() - start).total_seconds()
-            print(f"[CLEANER] Finished in {duration:.2f} seconds ✅")
+        duration = (datetime.utcnow() - start).total_seconds()
+        print(f"[CLEANER] Finished in {duration:.2f} seconds ✅")
+        return True
 
     except Exception as e:
         print(f"[ERROR] Cleanup failed: {e}")
+        return False
 
 # ------------------------------------ CLI ENTRY ----------------------------------------
 
+async def main():
+    pg_pool = await asyncpg.create_pool(DATABASE_URL)
+    try:
+        await run_cleanup(pg_pool)
+    finally:
+        await pg_pool.close()
+
 if __name__ == "__main__":
-    asyncio.run(run_cleanup())
+    asyncio.run(main())
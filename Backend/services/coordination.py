@@ -0,0 +1,392 @@
+# services/coordination.py
+#
+# Redis-based coordination so several trigger/fetcher replicas can run side by side:
+#
+#   Lease             a named lock with a TTL. Every acquisition bumps a per-lease counter, and the new
+#                     value is the fencing token: a holder that stalled past its TTL still carries the old
+#                     token, so Postgres writes guarded by check_fences() reject it after a takeover
+#   LeaderElector     one lease that every trigger campaigns for; singleton jobs (backup, cleanup, symbol
+#                     sync, partition maintenance) only run on the holder and are cancelled if it loses it
+#   PartitionManager  splits the fetch workload into FETCH_PARTITIONS symbol partitions, one lease each.
+#                     Replicas heartbeat into a sorted set, and each one holds roughly partitions / live
+#                     replicas leases: when a heartbeat expires its leases lapse and the survivors pick them
+#                     up, and when a replica joins the others release their surplus
+#
+# A lease is only trusted locally until (acquire/renew time + TTL minus a drift margin), so a replica that
+# can't reach Redis stops acting before anyone else can take over.
+
+import os
+import time
+import socket
+import asyncio
+import logging
+
+from metrics import counter, gauge
+from sharding import shard_for
+
+logger = logging.getLogger("coordination")
+
+# -------------------- CONFIG ---------------------
+
+INSTANCE_ID = os.environ.get("INSTANCE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+LEASE_TTL = float(os.environ.get("LEASE_TTL", "15"))       # seconds; renewed every TTL / 3
+LEASE_DRIFT = 0.1                                          # fraction of the TTL not trusted locally
+
+LEASE_PREFIX = "coord:lease:"      # lease name → "<owner>|<token>" (PX TTL)
+FENCE_PREFIX = "coord:fence:"      # lease name → last issued fencing token (INCR)
+MEMBERS_PREFIX = "coord:members:"  # group → ZSET of replica id scored by last heartbeat (ms)
+
+FENCES_DDL = """
+    CREATE TABLE IF NOT EXISTS coordination_fences (
+        name       TEXT PRIMARY KEY,
+        token      BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+    )
+"""
+
+# Records the highest token seen per lease; a write carrying a lower one returns no row for that name.
+# The row lock is held until commit, so a stale and a current holder can't interleave their writes.
+CHECK_FENCES_SQL = """
+    INSERT INTO coordination_fences (name, token)
+    SELECT * FROM unnest($1::text[], $2::bigint[])
+    ON CONFLICT (name) DO UPDATE SET token = EXCLUDED.token, updated_at = now() AT TIME ZONE 'utc'
+    WHERE coordination_fences.token <= EXCLUDED.token
+    RETURNING name
+"""
+
+LEADER = gauge("coordination_leader", "1 while this replica holds the leader lease", ("lease",))
+PARTITIONS_OWNED = gauge("coordination_partitions_owned", "Partition leases held by this replica", ("group",))
+GROUP_MEMBERS = gauge("coordination_group_members", "Live replicas seen by the last heartbeat", ("group",))
+LEASES_LOST = counter("coordination_leases_lost_total", "Leases that failed to renew", ("group",))
+
+# -------------------- LUA ---------------------
+# Values are "<owner>|<token>"; comparing the full value means a holder can only touch its own grant.
+
+ACQUIRE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local owner, token = string.match(current, '^(.*)|(%d+)$')
+    if owner == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return tonumber(token)
+    end
+    return false
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. '|' .. token, 'PX', ARGV[2])
+return token
+"""
+
+RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class FencingError(Exception):
+    """A write carried a fencing token older than one already seen for the same lease."""
+
+class LeadershipLost(Exception):
+    """The leader lease lapsed while a singleton job was running."""
+
+async def ensure_fences_table(pg_pool):
+    async with pg_pool.acquire() as conn:
+        await conn.execute(FENCES_DDL)
+
+async def check_fences(conn, tokens: dict[str, int]):
+    # Call inside the transaction that does the guarded write. No tokens means nothing vouches for the write
+    if not tokens:
+        raise FencingError("No fencing token held for this write")
+    names = sorted(tokens)   # fixed lock order, so two writers can't deadlock on each other's rows
+    accepted = {row["name"] for row in await conn.fetch(CHECK_FENCES_SQL, names, [tokens[n] for n in names])}
+    stale = [name for name in names if name not in accepted]
+    if stale:
+        raise FencingError(f"Stale fencing token for {', '.join(stale)}")
+
+# -------------------- LEASE ---------------------
+
+class Lease:
+    def __init__(self, redis, name: str, owner: str = INSTANCE_ID, ttl: float = LEASE_TTL):
+        self.redis = redis
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.key = f"{LEASE_PREFIX}{name}"
+        self.fence_key = f"{FENCE_PREFIX}{name}"
+        self.token = None
+        self._valid_until = 0.0
+        self._acquire = redis.register_script(ACQUIRE_LUA)
+        self._renew = redis.register_script(RENEW_LUA)
+        self._release = redis.register_script(RELEASE_LUA)
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None and time.monotonic() < self._valid_until
+
+    @property
+    def value(self) -> str:
+        return f"{self.owner}|{self.token}"
+
+    def remaining(self) -> float:
+        return max(self._valid_until - time.monotonic(), 0.0) if self.token is not None else 0.0
+
+    # Queue/settle pairs let PartitionManager batch many leases into one pipeline
+    def queue_acquire(self, client=None):
+        return self._acquire(keys=[self.key, self.fence_key], args=[self.owner, int(self.ttl * 1000)], client=client)
+
+    def queue_renew(self, client=None):
+        return self._renew(keys=[self.key], args=[self.value, int(self.ttl * 1000)], client=client)
+
+    def settle(self, token, started: float) -> bool:
+        # token is the granted fencing token, None when refused; `started` is taken before the request,
+        # so the local deadline never outlives the one in Redis
+        if token is None:
+            self.token = None
+            return False
+        self.token = int(token)
+        self._valid_until = started + self.ttl * (1 - LEASE_DRIFT)
+        return True
+
+    async def acquire(self) -> bool:
+        started = time.monotonic()
+        return self.settle(await self.queue_acquire(), started)
+
+    async def renew(self) -> bool:
+        if self.token is None:
+            return False
+        started = time.monotonic()
+        return self.settle(self.token if await self.queue_renew() else None, started)
+
+    async def release(self):
+        if self.token is None:
+            return
+        value, self.token = self.value, None
+        try:
+            await self._release(keys=[self.key], args=[value])
+        except Exception as e:
+            logger.warning(f"Releasing lease {self.name} failed (it will expire): {e}")
+
+# -------------------- LEADER ELECTION ---------------------
+
+class LeaderElector:
+    def __init__(self, redis, name: str = "leader", owner: str = INSTANCE_ID, ttl: float = LEASE_TTL):
+        self.lease = Lease(redis, name, owner, ttl)
+        self._was_leader = False
+        self._changed = asyncio.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lease.held
+
+    @property
+    def token(self):
+        return self.lease.token if self.lease.held else None
+
+    def fence(self) -> dict[str, int]:
+        # check_fences() argument for writes made on the leader's behalf. Take it once when the job starts:
+        # a token read at write time would vouch for work begun under an earlier, since-lost lease
+        if not self.lease.held:
+            raise LeadershipLost(f"Lease {self.lease.name} is not held")
+        return {self.lease.name: self.lease.token}
+
+    def _notify(self):
+        leader = self.is_leader
+        if leader != self._was_leader:
+            self._was_leader = leader
+            LEADER.labels(self.lease.name).set(int(leader))
+            if leader:
+                logger.info(f"👑 {self.lease.owner} is leader for {self.lease.name} (token {self.lease.token})")
+            else:
+                logger.warning(f"{self.lease.owner} is no longer leader for {self.lease.name}")
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def step(self):
+        try:
+            if self.lease.token is None or not await self.lease.renew():
+                await self.lease.acquire()
+        except Exception as e:
+            logger.error(f"Leader lease {self.lease.name} update failed: {e}")
+        self._notify()
+
+    async def run(self):
+        # Long-running; trigger.py supervises it as a scheduler service
+        try:
+            while True:
+                await self.step()
+                await asyncio.sleep(self.lease.ttl / 3)
+        finally:
+            await self.lease.release()
+            self._notify()
+
+    async def wait_until(self, leader: bool):
+        while self.is_leader != leader:
+            changed = self._changed
+            # While leading, wake when the local lease deadline passes even if nobody notifies
+            timeout = self.lease.remaining() if self.is_leader else None
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_until_lost(self, func) -> bool:
+        # True when func finished (its exception propagates), False when leadership lapsed first
+        task = asyncio.create_task(func())
+        lost = asyncio.create_task(self.wait_until(False))
+        try:
+            await asyncio.wait({task, lost}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            finished = task.done()
+            for pending in (task, lost):
+                pending.cancel()
+            await asyncio.gather(task, lost, return_exceptions=True)
+        if finished:
+            task.result()
+        return finished
+
+    def leader_service(self, func):
+        # Scheduler.service() wrapper: idle on followers, started on election, stopped when the lease lapses
+        async def run():
+            while True:
+                await self.wait_until(True)
+                if await self._run_until_lost(func):
+                    return
+                logger.warning(f"Leadership of {self.lease.name} lost; stopped the service")
+        return run
+
+    def leader_only(self, func):
+        # Scheduler.cron() wrapper: followers skip the run; a leader that loses the lease mid-run fails it
+        async def run():
+            if not self.is_leader:
+                logger.info(f"Not leader for {self.lease.name}; skipping run")
+                return
+            if not await self._run_until_lost(func):
+                raise LeadershipLost(f"Lease {self.lease.name} lapsed mid-run")
+        return run
+
+# -------------------- PARTITIONED WORK ---------------------
+
+class PartitionManager:
+    def __init__(self, redis, group: str, partitions: int, owner: str = INSTANCE_ID, ttl: float = LEASE_TTL):
+        self.redis = redis
+        self.group = group
+        self.owner = owner
+        self.ttl = ttl
+        self.members_key = f"{MEMBERS_PREFIX}{group}"
+        self.leases = [Lease(redis, f"{group}:{p}", owner, ttl) for p in range(partitions)]
+        self.members = 1
+        self.rebalances = 0
+        # Scan free partitions from an owner-specific offset so joining replicas don't all race for the same ones
+        self._offset = shard_for(owner, partitions)
+
+    def owned(self) -> dict[int, int]:
+        return {p: lease.token for p, lease in enumerate(self.leases) if lease.held}
+
+    def fences(self, partitions) -> dict[str, int]:
+        return {self.leases[p].name: self.leases[p].token for p in partitions if self.leases[p].held}
+
+    def check_held(self, tokens: dict[str, int]):
+        # Local counterpart of check_fences() for writes Postgres can't vouch for yet (rows going to the
+        # spill log, replayed later without a fence): every lease must still be held under the same token
+        if not tokens:
+            raise FencingError("No fencing token held for this write")
+        leases = {lease.name: lease for lease in self.leases}
+        stale = [name for name, token in sorted(tokens.items())
+                 if name not in leases or not leases[name].held or leases[name].token != token]
+        if stale:
+            raise FencingError(f"Lease no longer held for {', '.join(stale)}")
+
+    async def heartbeat(self) -> int:
+        now = int(time.time() * 1000)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(self.members_key, {self.owner: now})
+        pipe.zremrangebyscore(self.members_key, 0, now - int(self.ttl * 1000))
+        pipe.zcard(self.members_key)
+        *_, members = await pipe.execute()
+        return max(members, 1)
+
+    async def rebalance(self):
+        self.members = await self.heartbeat()
+        fair = -(-len(self.leases) // self.members)
+
+        held = [lease for lease in self.leases if lease.token is not None]
+        if held:
+            started = time.monotonic()
+            pipe = self.redis.pipeline(transaction=False)
+            for lease in held:
+                lease.queue_renew(client=pipe)
+            renewed = await pipe.execute()
+            for lease, ok in zip(held, renewed):
+                if not lease.settle(lease.token if ok else None, started):
+                    LEASES_LOST.labels(self.group).inc()
+                    logger.warning(f"Lost partition lease {lease.name}")
+            held = [lease for lease in held if lease.token is not None]
+
+        if len(held) > fair:
+            # A replica joined: hand back the surplus so it can claim its share
+            for lease in held[fair:]:
+                await lease.release()
+            logger.info(f"Released {len(held) - fair} {self.group} partitions ({self.members} replicas)")
+        elif len(held) < fair:
+            await self._claim(fair - len(held))
+
+        self.rebalances += 1
+        owned = len(self.owned())
+        PARTITIONS_OWNED.labels(self.group).set(owned)
+        GROUP_MEMBERS.labels(self.group).set(self.members)
+
+    async def _claim(self, wanted: int):
+        count = len(self.leases)
+        order = [(self._offset + i) % count for i in range(count)]
+        values = await self.redis.mget([self.leases[p].key for p in order])
+        free = [
+            self.leases[p] for p, value in zip(order, values)
+            if self.leases[p].token is None and (value is None or value.rsplit("|", 1)[0] == self.owner)
+        ][:wanted]
+        if not free:
+            return
+        started = time.monotonic()
+        pipe = self.redis.pipeline(transaction=False)
+        for lease in free:
+            lease.queue_acquire(client=pipe)
+        granted = await pipe.execute()
+        claimed = sum(lease.settle(token, started) for lease, token in zip(free, granted))
+        if claimed:
+            logger.info(f"Claimed {claimed} {self.group} partitions ({self.members} replicas)")
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self.rebalance()
+                except Exception as e:
+                    logger.error(f"{self.group} rebalance failed: {e}")
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            await self.leave()
+
+    async def leave(self):
+        for lease in self.leases:
+            await lease.release()
+        try:
+            await self.redis.zrem(self.members_key, self.owner)
+        except Exception as e:
+            logger.warning(f"Leaving {self.group} failed (heartbeat will expire): {e}")
+        PARTITIONS_OWNED.labels(self.group).set(0)
+
+    def stats(self) -> dict:
+        return {
+            "group": self.group,
+            "members": self.members,
+            "owned": len(self.owned()),
+            "partitions": len(self.leases),
+            "rebalances": self.rebalances,
+        }
@@ -1,15 +1,23 @@
 import os
 import asyncio
-import json
 import time as pytime
 import logging
-from datetime import datetime, time
+from datetime import datetime
 from pathlib import Path
 
 from redis.asyncio import Redis
 import asyncpg
 from dotenv import load_dotenv
 
+from symbol_cache import SymbolResolver
+from history_writer import HistoryWriter, create_history_writer, ensure_history_schema
+from tick_streams import TickConsumer, run_tick_consumer
+from history_writer import REDIS_TO_POSTGRES
+from metrics import histogram, start_metrics_server, SIZE_BUCKETS
+from trade_codec import queue_reads, decode, fill_legacy
+from sharding import DIRTY_SET_KEY, FETCH_PARTITIONS, dirty_key, group_by_partition
+from coordination import PartitionManager, check_fences, ensure_fences_table
+
 # -------------------- LOGGING SETUP ---------------------
 logging.basicConfig(
     level=logging.INFO,
@@ -23,89 +31,240 @@ if not os.environ.get("ENV"):
 
 REDIS_URL = os.environ.get("REDIS_URL")
 DATABASE_URL = os.environ.get("DATABASE_URL")
-TRADE_KEY_PREFIX = "stock:trade:"
+DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
 SYMBOL_SET_KEY = "stock:symbols"
+PERSISTED_TS_KEY = "stock:persisted_ts"     # symbol → exchange timestamp (ms) of the last stored trade
 FETCH_INTERVAL = 10  # seconds
+INGEST_MODE = os.environ.get("INGEST_MODE", "snapshot")  # "snapshot" samples stock:snap:*, "streams" consumes every tick
+
+CYCLE_SECONDS = histogram("fetcher_cycle_seconds", "Duration of one fetch-and-store cycle")
+DIRTY_SYMBOLS = histogram("fetcher_dirty_symbols", "Changed symbols drained per cycle", buckets=SIZE_BUCKETS)
+
+# -------------------- DIRTY SETS ---------------------
+# One set per symbol partition (sharding.dirty_key); a replica only drains the partitions it holds a lease
+# for, so two fetchers never store the same symbol's trade.
+
+async def drain_dirty_symbols(redis, partitions) -> set[str]:
+    # SMEMBERS + DEL in one MULTI so a symbol marked mid-drain lands in the next cycle, not nowhere
+    pipe = redis.pipeline(transaction=True)
+    for partition in partitions:
+        pipe.smembers(dirty_key(partition))
+        pipe.delete(dirty_key(partition))
+    replies = await pipe.execute()
+    return {s.decode() if isinstance(s, bytes) else s for members in replies[::2] for s in members}
+
+async def mark_dirty(redis, symbols):
+    pipe = redis.pipeline(transaction=False)
+    for partition, members in group_by_partition(symbols).items():
+        pipe.sadd(dirty_key(partition), *members)
+    await pipe.execute()
+
+async def redistribute_legacy_dirty(redis):
+    # Older streamers (and the startup seed) write the unpartitioned set; move it into the partition sets
+    pipe = redis.pipeline(transaction=True)
+    pipe.smembers(DIRTY_SET_KEY)
+    pipe.delete(DIRTY_SET_KEY)
+    symbols, _ = await pipe.execute()
+    if symbols:
+        await mark_dirty(redis, symbols)
+
+async def remark_dirty(redis, symbols):
+    # Rows for these symbols were not persisted — the next cycle (on whichever replica owns them) retries
+    if not symbols:
+        return
+    try:
+        await mark_dirty(redis, symbols)
+    except Exception as e:
+        logger.error(f"Failed to re-mark {len(symbols)} symbols dirty: {e}")
+
+async def commit_marks(redis, writer: HistoryWriter, marks: dict, flushed: int, failed_before: int,
+                       stored_at: dict = None):
+    if not marks:
+        return
+    try:
+        if flushed and not len(writer):
+            if stored_at:
+                now = pytime.time()
+                for written in stored_at.values():
+                    REDIS_TO_POSTGRES.observe(max(now - written, 0.0))
+            await redis.hset(PERSISTED_TS_KEY, mapping=marks)
+            marks.clear()
+        elif writer.rows_failed > failed_before:
+            await remark_dirty(redis, list(marks))
+            marks.clear()
+        if not marks and stored_at:
+            stored_at.clear()
+    except Exception as e:
+        logger.error(f"Failed to record persisted timestamps: {e}")
 
 # -------------------- FETCH + WRITE ---------------------
-async def fetch_and_store(redis, pg_pool):
+async def fetch_and_store(redis, pg_pool, resolver: SymbolResolver, writer: HistoryWriter, marks: dict,
+                          stored_at: dict, partitions: PartitionManager, fences: dict):
+    owned = partitions.owned()
+    if not owned:
+        logger.info(f"No {partitions.group} partitions held ({partitions.members} replicas); waiting")
+        return
     try:
-        symbols = await redis.smembers(SYMBOL_SET_KEY)
-        symbols = {s.decode() if isinstance(s, bytes) else s for s in symbols}
-        logger.info(f"Fetched {len(symbols)} symbols from Redis")
+        if 0 in owned:
+            await redistribute_legacy_dirty(redis)
+        symbols = list(await drain_dirty_symbols(redis, owned))
+        # Every buffered row must still be ours when the batch commits; the writer's fence checks these tokens.
+        # Keep the oldest token per partition: a lease lost and re-won meanwhile must not vouch for older rows
+        for name, token in partitions.fences(owned).items():
+            fences.setdefault(name, token)
+        logger.info(f"Drained {len(symbols)} changed symbols from Redis ({len(owned)}/{len(partitions.leases)} partitions)")
+        DIRTY_SYMBOLS.observe(len(symbols))
     except Exception as e:
         logger.error(f"Failed to fetch symbols from Redis: {e}")
         return
 
-    pipe = redis.pipeline()
-    for symbol in symbols:
-        pipe.get(f"{TRADE_KEY_PREFIX}{symbol}")
-    results = await pipe.execute()
-
-    rows = []
-    for symbol, raw_trade in zip(symbols, results):
-        if raw_trade is None:
-            logger.debug(f"No trade data for {symbol}, skipping.")
-            continue
+    if symbols:
+        pipe = redis.pipeline()
+        queue_reads(pipe, symbols)
+        pipe.hmget(PERSISTED_TS_KEY, symbols)
         try:
-            trade_info = json.loads(raw_trade)
-            price = float(trade_info["price"])
-            timestamp_ms = trade_info["timestamp"]
-            trade_time = datetime.utcfromtimestamp(timestamp_ms / 1000.0)
-
-            async with pg_pool.acquire() as conn:
-                stock_id = await conn.fetchval("SELECT id FROM stocks WHERE symbol = $1", symbol)
-                if stock_id:
-                    rows.append((stock_id, price, trade_time))
-                else:
-                    logger.warning(f"Stock symbol {symbol} not found in DB.")
+            *replies, persisted = await pipe.execute()
         except Exception as e:
-            logger.error(f"[ERROR] Issue with {symbol}: {e}")
+            # The drain already removed them from the dirty set: put them back or their trades are never stored
+            logger.error(f"Failed to read snapshots for {len(symbols)} symbols: {e}")
+            await remark_dirty(redis, symbols)
+            return
+    else:
+        replies, persisted = [], []
 
-    if rows:
+    snapshots = {}
+    for symbol, reply in zip(symbols, replies):
         try:
-            async with pg_pool.acquire() as conn:
-                await conn.executemany(
-                    """
-                    INSERT INTO stock_price_history (stock_id, price, trade_time_stamp)
-                    VALUES ($1, $2, $3)
-                    """,
-                    rows
-                )
-            logger.info(f"✅ Inserted {len(rows)} trades")
+            snapshots[symbol] = decode(reply)
         except Exception as e:
-            logger.error(f"[ERROR] Insert failed: {e}")
+            logger.error(f"[ERROR] Bad snapshot for {symbol}: {e}")
+            snapshots[symbol] = None
+    try:
+        await fill_legacy(redis, snapshots)
+    except Exception as e:
+        logger.error(f"[ERROR] Legacy key read failed: {e}")
+
+    trades = []
+    for symbol, persisted_ts in zip(symbols, persisted):
+        snapshot = snapshots.get(symbol)
+        if snapshot is None or not snapshot.timestamp:
+            logger.debug(f"No trade data for {symbol}, skipping.")
+            continue
+
+        # Already written (or buffered) this exact trade — don't store it twice
+        last_ts = marks.get(symbol) or int(persisted_ts or 0)
+        if snapshot.timestamp <= last_ts:
+            continue
+
+        trade_time = datetime.utcfromtimestamp(snapshot.timestamp / 1000.0)
+        written = snapshot.ingested_at / 1000.0 if snapshot.ingested_at else None   # when it reached Redis
+        trades.append((symbol, snapshot.price, trade_time, snapshot.volume, snapshot.timestamp, written))
+
+    try:
+        stock_ids = await resolver.resolve_many(pg_pool, [trade[0] for trade in trades])
+    except Exception as e:
+        logger.error(f"[ERROR] Symbol lookup failed: {e}")
+        await remark_dirty(redis, [trade[0] for trade in trades])
+        return
+
+    rows = []
+    for symbol, price, trade_time, volume, timestamp_ms, written in trades:
+        stock_id = stock_ids.get(symbol)
+        if stock_id:
+            rows.append((stock_id, price, trade_time, volume))
+            marks[symbol] = timestamp_ms
+            if written is not None:
+                stored_at[symbol] = written
+        else:
+            logger.warning(f"Stock symbol {symbol} not found in DB.")
+
+    if rows:
+        writer.add(rows)
     else:
         logger.info("No rows to insert.")
 
+    failed_before = writer.rows_failed
+    flushed = await writer.maybe_flush()
+    await commit_marks(redis, writer, marks, flushed, failed_before, stored_at)
+    if not len(writer):
+        fences.clear()
+
 # -------------------- MAIN LOOP ---------------------
 async def run_fetcher():
     logger.info(f"🚀 Fetcher launched at {datetime.utcnow().isoformat()}")
 
     redis = Redis.from_url(REDIS_URL, decode_responses=True)
-    pg_pool = await asyncpg.create_pool(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
+    pg_pool = await asyncpg.create_pool(DSN)
+
+    # Torn down in `finally`: the scheduler restarts this function after a crash and cancels it when the
+    # fetcher window closes, so nothing below may outlive one run
+    listener = rebalancer = writer = None
+    marks: dict[str, int] = {}   # symbol → timestamp of rows buffered in the writer but not yet flushed
+    stored_at: dict[str, float] = {}   # symbol → when those trades reached Redis (epoch s), for latency metrics
+    try:
+        resolver = SymbolResolver()
+        await resolver.load(pg_pool)
+        listener = asyncio.create_task(resolver.listen(DSN, pg_pool))
+        await ensure_history_schema(pg_pool)
 
-    while True:
-        now = datetime.utcnow()
-        current_time = now.time()
+        if INGEST_MODE == "streams":
+            logger.info("Ingest mode: Redis Streams consumer")
+            await run_tick_consumer(TickConsumer(redis, pg_pool, resolver))
+            return
 
-        # Pause during 05:00 to 05:05 UTC
-        
-        if time(5, 0) <= current_time < time(5, 5):
-            logger.info("⏸️ Skipping fetch — cleaner window (05:00–05:05 UTC)")
-            await asyncio.sleep(60)
-            continue
+        # Streams mode needs no partitioning: the consumer group already hands each entry to one replica.
+        # Snapshot mode splits symbols across live replicas by partition lease, fenced in Postgres.
+        await ensure_fences_table(pg_pool)
+        partitions = PartitionManager(redis, "fetch", FETCH_PARTITIONS)
+        await partitions.rebalance()
+        rebalancer = asyncio.create_task(partitions.run())
 
-        start = pytime.time()
-        await fetch_and_store(redis, pg_pool)
-        elapsed = pytime.time() - start
+        writer = create_history_writer(pg_pool)
+        fences: dict[str, int] = {}   # partition lease → fencing token for the rows buffered in the writer
+        writer.fence = lambda conn: check_fences(conn, fences)
+        writer.spill_guard = lambda: partitions.check_held(fences)
 
-        if elapsed < FETCH_INTERVAL:
-            await asyncio.sleep(FETCH_INTERVAL - elapsed)
-        else:
-            logger.warning(f"⚠️ Fetch took {elapsed:.2f}s — skipping delay")
-            await asyncio.sleep(FETCH_INTERVAL)
+        # Older streamers never marked anything dirty; seed once so every symbol is checked at least once
+        await redis.sunionstore(DIRTY_SET_KEY, [DIRTY_SET_KEY, SYMBOL_SET_KEY])
+
+        while True:
+            start = pytime.time()
+            await fetch_and_store(redis, pg_pool, resolver, writer, marks, stored_at, partitions, fences)
+            elapsed = pytime.time() - start
+            CYCLE_SECONDS.observe(elapsed)
+            logger.info(f"Resolver cache: {resolver.stats()} | Writer: {writer.stats()} | Partitions: {partitions.stats()}")
+
+            if elapsed < FETCH_INTERVAL:
+                await asyncio.sleep(FETCH_INTERVAL - elapsed)
+            else:
+                logger.warning(f"⚠️ Fetch took {elapsed:.2f}s — skipping delay")
+                await asyncio.sleep(FETCH_INTERVAL)
+    finally:
+        # Background tasks first; awaited so the rebalancer hands its partitions back while Redis is still open
+        tasks = [task for task in (rebalancer, listener) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if writer is not None:
+            try:
+                # Buffered rows go to Postgres (or the spill log) and their persisted_ts marks are recorded
+                failed_before = writer.rows_failed
+                await commit_marks(redis, writer, marks, await writer.flush(), failed_before, stored_at)
+            except Exception as e:
+                logger.error(f"Final flush failed: {e}")
+            writer.close()   # fsyncs and unlocks the spill log so a restarted fetcher can reopen it
+
+        await redis.close()
+        await pg_pool.close()
+        logger.info("Fetcher shutdown complete.")
+
+# -------------------- STANDALONE ---------------------
+# Normally started (and supervised) by trigger.py; run directly for benchmarks/bench_pipeline.py
+
+async def main():
+    await start_metrics_server(int(os.environ.get("METRICS_PORT", "9102")))
+    await run_fetcher()
 
-    await redis.close()
-    await pg_pool.close()
-    logger.info("Fetcher shutdown complete.")
+if __name__ == "__main__":
+    asyncio.run(main())
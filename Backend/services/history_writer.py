@@ -0,0 +1,335 @@
+# services/history_writer.py
+
+import os
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from metrics import counter, gauge, histogram, timed_acquire, SIZE_BUCKETS
+from spill_log import SpillLog, OFFSETS_TABLE, OFFSETS_DDL, DEAD_LETTER_FILE
+
+logger = logging.getLogger("history-writer")
+
+# -------------------- CONFIG ---------------------
+HISTORY_TABLE = "stock_price_history"
+HISTORY_COLUMNS = ("stock_id", "price", "trade_time_stamp", "volume")
+
+HISTORY_WRITER = os.environ.get("HISTORY_WRITER", "copy")                       # "copy" or "executemany"
+HISTORY_BATCH_ROWS = int(os.environ.get("HISTORY_BATCH_ROWS", "5000"))          # flush once this many rows are buffered
+HISTORY_BATCH_AGE = float(os.environ.get("HISTORY_BATCH_AGE", "0"))             # ...or once the oldest row is this old (s)
+
+# Batches Postgres can't take right now go to a local spill log (see spill_log.py) and are replayed later
+SPILL_DIR = os.environ.get("SPILL_DIR", str(Path(__file__).resolve().parents[1] / "spill"))   # empty = drop them
+SPILL_ACQUIRE_TIMEOUT = float(os.environ.get("SPILL_ACQUIRE_TIMEOUT", "5"))     # waiting longer for a connection spills
+SPILL_REPLAY_ROWS = int(os.environ.get("SPILL_REPLAY_ROWS", "50000"))           # rows per replay transaction
+SPILL_REPLAY_BATCHES = int(os.environ.get("SPILL_REPLAY_BATCHES", "10"))        # replay transactions per flush
+SPILL_RETRY_SECONDS = float(os.environ.get("SPILL_RETRY_SECONDS", "5"))         # pause after a failed replay
+
+# "Postgres isn't taking writes right now": down, restarting, failing over (read-only), out of connections or
+# disk, statement timeout. Anything else (bad rows, a stale fencing token) would fail again on replay.
+UNAVAILABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.OperatorInterventionError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.ReadOnlySQLTransactionError,
+)
+
+SPILL_OFFSET_SQL = f"""
+    INSERT INTO {OFFSETS_TABLE} (log_id, last_seq) VALUES ($1, $2)
+    ON CONFLICT (log_id) DO UPDATE SET last_seq = EXCLUDED.last_seq, updated_at = now() AT TIME ZONE 'utc'
+"""
+
+INSERT_SQL = f"""
+    INSERT INTO {HISTORY_TABLE} ({", ".join(HISTORY_COLUMNS)})
+    VALUES ($1, $2, $3, $4)
+"""
+
+# Older deployments predate the volume column and the composite (stock_id, trade_time_stamp) index
+HISTORY_SCHEMA_DDL = [
+    f"ALTER TABLE {HISTORY_TABLE} ADD COLUMN IF NOT EXISTS volume DOUBLE PRECISION",
+    f"CREATE INDEX IF NOT EXISTS ix_stock_price_history_stock_time ON {HISTORY_TABLE} (stock_id, trade_time_stamp)",
+]
+
+# -------------------- METRICS ---------------------
+# Shared with tick_streams.TickConsumer, which writes the same table from Redis Streams
+
+ROWS_WRITTEN = counter("history_rows_written_total", "Rows written to stock_price_history", ("path",))
+ROWS_FAILED = counter("history_rows_failed_total", "Rows dropped after a failed write", ("path",))
+BATCH_ROWS = histogram("history_batch_rows", "Rows per stock_price_history write", buckets=SIZE_BUCKETS)
+FLUSH_SECONDS = histogram("history_flush_seconds", "stock_price_history write duration", ("path",))
+EXCHANGE_TO_POSTGRES = histogram(
+    "history_exchange_to_postgres_seconds", "Exchange trade timestamp to row committed in Postgres"
+)
+REDIS_TO_POSTGRES = histogram("history_redis_to_postgres_seconds", "Trade written to Redis to row committed in Postgres")
+SPILL_ROWS = counter("history_spill_rows_total", "Rows written to the local spill log instead of Postgres")
+SPILL_REPLAYED = counter("history_spill_replayed_rows_total", "Spilled rows replayed into Postgres")
+SPILL_BYTES = gauge("history_spill_pending_bytes", "Spill log bytes not yet replayed")
+SPILL_LAG = gauge("history_spill_replay_lag_seconds", "Age of the oldest spilled record not yet replayed")
+SPILL_DEAD_LETTERED = counter("history_spill_dead_letter_rows_total", "Spilled rows Postgres rejected, moved to the dead-letter file")
+SPILL_DEAD_LETTER_BYTES = gauge("history_spill_dead_letter_bytes", "Size of the spill dead-letter file; alert when non-zero")
+
+def observe_committed(rows: list[tuple]):
+    # rows are HISTORY_COLUMNS tuples; trade_time_stamp is naive UTC
+    now = datetime.utcnow()
+    for row in rows:
+        EXCHANGE_TO_POSTGRES.observe(max((now - row[2]).total_seconds(), 0.0))
+
+async def ensure_history_schema(pg_pool):
+    async with pg_pool.acquire() as conn:
+        for ddl in HISTORY_SCHEMA_DDL:
+            await conn.execute(ddl)
+
+# -------------------- BASE WRITER ---------------------
+
+class HistoryWriter(ABC):
+    name = "base"
+
+    def __init__(self, pg_pool, max_rows: int = HISTORY_BATCH_ROWS, max_age: float = HISTORY_BATCH_AGE,
+                 spill: SpillLog = None):
+        self.pg_pool = pg_pool
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.spill = spill
+        self.acquire_timeout = SPILL_ACQUIRE_TIMEOUT if spill is not None else None
+        self._replay_after = 0.0
+        self._offsets_ready = False
+        if spill is not None:
+            SPILL_BYTES.set_function(spill.pending_bytes)
+            SPILL_LAG.set_function(spill.lag_seconds)
+            SPILL_DEAD_LETTER_BYTES.set_function(spill.dead_letter_bytes)
+        self._rows: list[tuple] = []
+        self._first_row_at = None
+        # Optional `async fence(conn)` run in the write's transaction; raising (e.g. coordination.FencingError)
+        # rolls the batch back and counts it as failed
+        self.fence = None
+        # Optional `spill_guard()` run before rows are spilled. Replay can't fence them (the write it would
+        # guard happens later, maybe under another owner), so a batch is only accepted while the guard holds;
+        # raising refuses it and counts it as failed
+        self.spill_guard = None
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_spilled = 0
+        self.rows_replayed = 0
+        self.flushes = 0
+        self.write_seconds = 0.0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, rows: list[tuple]):
+        if not rows:
+            return
+        if not self._rows:
+            self._first_row_at = time.monotonic()
+        self._rows.extend(rows)
+
+    def due(self) -> bool:
+        if not self._rows:
+            return False
+        return len(self._rows) >= self.max_rows or time.monotonic() - self._first_row_at >= self.max_age
+
+    async def maybe_flush(self) -> int:
+        if self.spill is not None and self.spill.pending:
+            await self.replay_spill()
+        if self.due():
+            return await self.flush()
+        return 0
+
+    async def flush(self) -> int:
+        # Returns the rows handed off durably: committed to Postgres or appended to the spill log
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, []
+        if self.spill is not None and self.spill.pending:
+            # Nothing jumps the queue while older rows are still waiting on disk
+            return await self._spill(rows)
+
+        start = time.perf_counter()
+        try:
+            async with timed_acquire(self.pg_pool, "history", self.acquire_timeout) as conn:
+                if self.fence is None:
+                    await self._write(conn, rows)
+                else:
+                    async with conn.transaction():
+                        await self.fence(conn)
+                        await self._write(conn, rows)
+        except Exception as e:
+            if self.spill is not None and isinstance(e, UNAVAILABLE_ERRORS):
+                logger.warning(f"Postgres unavailable ({type(e).__name__}: {e}) — spilling {len(rows)} rows to disk")
+                return await self._spill(rows)
+            self.rows_failed += len(rows)
+            ROWS_FAILED.labels(self.name).inc(len(rows))
+            logger.error(f"[ERROR] Insert failed ({self.name}, {len(rows)} rows): {e}")
+            return 0
+
+        latency = time.perf_counter() - start
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.write_seconds += latency
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        ROWS_WRITTEN.labels(self.name).inc(len(rows))
+        BATCH_ROWS.observe(len(rows))
+        FLUSH_SECONDS.labels(self.name).observe(latency)
+        observe_committed(rows)
+        logger.info(f"✅ Inserted {len(rows)} trades via {self.name} in {latency * 1000:.1f}ms "
+                    f"({len(rows) / latency if latency else 0:.0f} rows/s)")
+        return len(rows)
+
+    @abstractmethod
+    async def _write(self, conn, rows: list[tuple]):
+        ...
+
+    # -------------------- SPILL ---------------------
+
+    async def _spill(self, rows: list[tuple]) -> int:
+        try:
+            if self.spill_guard is not None:
+                self.spill_guard()
+            await asyncio.to_thread(self.spill.append, rows)
+        except Exception as e:
+            self.rows_failed += len(rows)
+            ROWS_FAILED.labels("spill").inc(len(rows))
+            logger.error(f"[ERROR] Spill failed, {len(rows)} rows dropped: {e}")
+            return 0
+        self.rows_spilled += len(rows)
+        SPILL_ROWS.inc(len(rows))
+        return len(rows)
+
+    async def _replay_records(self, records: list[tuple[int, list[tuple]]], write: bool = True) -> int:
+        # One transaction: the rows of every record past the committed seq, plus the new seq
+        async with timed_acquire(self.pg_pool, "history", self.acquire_timeout) as conn:
+            if not self._offsets_ready:
+                await conn.execute(OFFSETS_DDL)
+                self._offsets_ready = True
+            async with conn.transaction():
+                committed = await conn.fetchval(
+                    f"SELECT last_seq FROM {OFFSETS_TABLE} WHERE log_id = $1 FOR UPDATE", self.spill.log_id
+                ) or 0
+                rows = [row for seq, batch in records if seq > committed for row in batch]
+                if rows and write:
+                    await self._write(conn, rows)
+                await conn.execute(SPILL_OFFSET_SQL, self.spill.log_id, max(records[-1][0], committed))
+        return len(rows) if write else 0
+
+    async def replay_spill(self) -> int:
+        # Oldest first, SPILL_REPLAY_ROWS per transaction; backs off while Postgres is still unavailable
+        if time.monotonic() < self._replay_after:
+            return 0
+        replayed, max_records, skip = 0, None, False
+        for _ in range(SPILL_REPLAY_BATCHES):
+            if not self.spill.pending:
+                break
+            records, cursor = await asyncio.to_thread(self.spill.read_batch, SPILL_REPLAY_ROWS, max_records)
+            if not records:
+                break
+            try:
+                written = await self._replay_records(records, write=not skip)
+            except UNAVAILABLE_ERRORS as e:
+                self._replay_after = time.monotonic() + SPILL_RETRY_SECONDS
+                logger.warning(f"Spill replay paused, Postgres still unavailable ({type(e).__name__}: {e})")
+                break
+            except Exception as e:
+                if len(records) > 1:
+                    max_records = 1   # narrow down to the record Postgres rejects
+                    continue
+                # A record Postgres refuses outright (e.g. its stock was deleted) must not wedge the log:
+                # keep it in the dead-letter file, then commit past it without writing it
+                seq, rows = records[0]
+                try:
+                    await asyncio.to_thread(self.spill.dead_letter, seq, rows)
+                except Exception as dead_letter_error:
+                    logger.error(f"[ERROR] Dead-lettering spilled record {seq} failed, replay stalled: {dead_letter_error}")
+                    self._replay_after = time.monotonic() + SPILL_RETRY_SECONDS
+                    break
+                SPILL_DEAD_LETTERED.inc(len(rows))
+                logger.error(f"[ERROR] Spilled record {seq} rejected ({e}); moved {len(rows)} rows to "
+                             f"{self.spill.directory / DEAD_LETTER_FILE}")
+                skip = True
+                continue
+            await asyncio.to_thread(self.spill.commit, records[-1][0], cursor)
+            replayed += written
+            self.rows_replayed += written
+            SPILL_REPLAYED.inc(written)
+            max_records, skip = None, False
+        if replayed:
+            logger.info(f"♻️ Replayed {replayed} spilled rows ({self.spill.pending_bytes()} bytes, "
+                        f"{self.spill.lag_seconds():.0f}s behind still pending)")
+        return replayed
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+    def stats(self) -> dict:
+        return {
+            "writer": self.name,
+            "buffered": len(self._rows),
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_spilled": self.rows_spilled,
+            "rows_replayed": self.rows_replayed,
+            "flushes": self.flushes,
+            "rows_per_sec": round(self.rows_written / self.write_seconds, 1) if self.write_seconds else 0.0,
+            "last_flush_ms": round(self.last_flush_latency * 1000, 2),
+            "max_flush_ms": round(self.max_flush_latency * 1000, 2),
+        }
+
+# -------------------- EXECUTEMANY WRITER ---------------------
+
+class ExecutemanyHistoryWriter(HistoryWriter):
+    name = "executemany"
+
+    async def _write(self, conn, rows: list[tuple]):
+        await conn.executemany(INSERT_SQL, rows)
+
+# -------------------- BINARY COPY WRITER ---------------------
+
+class CopyHistoryWriter(HistoryWriter):
+    name = "copy"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._copy_supported = True
+
+    async def _write(self, conn, rows: list[tuple]):
+        if self._copy_supported:
+            try:
+                # asyncpg streams records using the binary COPY format; inside a fenced transaction it runs
+                # under a savepoint so a refused COPY doesn't abort the executemany fallback
+                if conn.is_in_transaction():
+                    async with conn.transaction():
+                        await conn.copy_records_to_table(HISTORY_TABLE, records=rows, columns=HISTORY_COLUMNS)
+                else:
+                    await conn.copy_records_to_table(HISTORY_TABLE, records=rows, columns=HISTORY_COLUMNS)
+                return
+            except (asyncpg.FeatureNotSupportedError, asyncpg.InsufficientPrivilegeError) as e:
+                # e.g. a pooler or role that refuses COPY — stay on executemany from now on
+                logger.warning(f"COPY unavailable ({e}) — falling back to executemany")
+                self._copy_supported = False
+                self.name = "executemany"
+        await conn.executemany(INSERT_SQL, rows)
+
+# -------------------- FACTORY ---------------------
+
+WRITERS = {
+    "copy": CopyHistoryWriter,
+    "executemany": ExecutemanyHistoryWriter,
+}
+
+def create_history_writer(pg_pool, kind: str = HISTORY_WRITER, spill_dir: str = SPILL_DIR, **kwargs) -> HistoryWriter:
+    if kind not in WRITERS:
+        raise ValueError(f"Unknown HISTORY_WRITER '{kind}' (expected one of {', '.join(WRITERS)})")
+    spill = SpillLog(spill_dir) if spill_dir else None
+    return WRITERS[kind](pg_pool, spill=spill, **kwargs)
@@ -0,0 +1,245 @@
+# services/indicators.py
+#
+# Live technical indicators (EMA, rolling volatility, session VWAP, RSI) maintained from every tick the
+# streamer sees. Each symbol has a fixed-size IndicatorState updated in O(1) per tick; snapshots are
+# mirrored into `stock:ind:<symbol>` hashes inside the streamer's flush pipeline.
+#
+# compute_batch() produces the same per-tick values from historical arrays — see
+# benchmarks/bench_indicators.py for the parity check between the two.
+
+import os
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# -------------------- CONFIG ---------------------
+EMA_SPANS = [int(s) for s in os.environ.get("INDICATOR_EMA_SPANS", "12,26").split(",") if s]
+VOL_WINDOW = int(os.environ.get("INDICATOR_VOL_WINDOW", "60"))        # log returns in the volatility window
+RSI_PERIOD = int(os.environ.get("INDICATOR_RSI_PERIOD", "14"))        # Wilder smoothing period
+INDICATOR_TTL = int(os.environ.get("INDICATOR_TTL", "86400"))        # seconds a snapshot outlives its last tick
+
+INDICATOR_KEY_PREFIX = "stock:ind:"                                   # stock:ind:<symbol>
+DAY_MS = 86_400_000                                                   # VWAP resets at 00:00 UTC
+
+def indicator_key(symbol: str) -> str:
+    return f"{INDICATOR_KEY_PREFIX}{symbol}"
+
+def indicator_fields(ema_spans=EMA_SPANS) -> list[str]:
+    return [f"ema_{span}" for span in ema_spans] + ["vol", "vwap", "rsi"]
+
+# -------------------- STREAMING STATE ---------------------
+# Volatility is a sliding Welford mean/M² over a ring of the last VOL_WINDOW log returns, so adding a
+# return and evicting the oldest is constant work without re-summing the window.
+
+class IndicatorState:
+    __slots__ = (
+        "last", "ts", "count", "alphas", "emas",
+        "returns", "ret_pos", "ret_n", "ret_mean", "ret_m2",
+        "rsi_period", "changes", "avg_gain", "avg_loss",
+        "day", "pv", "volume",
+    )
+
+    def __init__(self, ema_spans=EMA_SPANS, vol_window=VOL_WINDOW, rsi_period=RSI_PERIOD):
+        self.last = None
+        self.ts = 0
+        self.count = 0
+        self.alphas = [2.0 / (span + 1) for span in ema_spans]
+        self.emas = [0.0] * len(ema_spans)
+
+        self.returns = array("d", bytes(8 * vol_window))
+        self.ret_pos = 0
+        self.ret_n = 0
+        self.ret_mean = 0.0
+        self.ret_m2 = 0.0
+
+        self.rsi_period = rsi_period
+        self.changes = 0
+        self.avg_gain = 0.0   # Σ gains until the period is seeded, Wilder average afterwards
+        self.avg_loss = 0.0
+
+        self.day = -1
+        self.pv = 0.0
+        self.volume = 0.0
+
+    def update(self, price: float, volume: float, ts: int):
+        last = self.last
+        if last is None:
+            self.emas = [price] * len(self.alphas)
+        else:
+            for i, alpha in enumerate(self.alphas):
+                self.emas[i] = (1 - alpha) * self.emas[i] + alpha * price
+            if price > 0 and last > 0:
+                self._add_return(math.log(price / last))
+            self._add_change(price - last)
+
+        day = ts // DAY_MS
+        if day != self.day:
+            self.day, self.pv, self.volume = day, 0.0, 0.0
+        self.pv += price * volume
+        self.volume += volume
+
+        self.last = price
+        self.ts = ts
+        self.count += 1
+
+    def _add_return(self, r: float):
+        window = len(self.returns)
+        if self.ret_n < window:
+            self.ret_n += 1
+            delta = r - self.ret_mean
+            self.ret_mean += delta / self.ret_n
+            self.ret_m2 += delta * (r - self.ret_mean)
+        else:
+            old = self.returns[self.ret_pos]
+            mean = self.ret_mean + (r - old) / window
+            self.ret_m2 = max(self.ret_m2 + (r - old) * (r - mean + old - self.ret_mean), 0.0)
+            self.ret_mean = mean
+        self.returns[self.ret_pos] = r
+        self.ret_pos = (self.ret_pos + 1) % window
+
+    def _add_change(self, change: float):
+        gain, loss = (change, 0.0) if change > 0 else (0.0, -change)
+        period = self.rsi_period
+        self.changes += 1
+        if self.changes <= period:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.changes == period:
+                self.avg_gain /= period
+                self.avg_loss /= period
+        else:
+            self.avg_gain = (self.avg_gain * (period - 1) + gain) / period
+            self.avg_loss = (self.avg_loss * (period - 1) + loss) / period
+
+    # --- readouts (None until defined) ---
+    @property
+    def volatility(self):
+        return math.sqrt(self.ret_m2 / self.ret_n) if self.ret_n >= 2 else None
+
+    @property
+    def vwap(self):
+        return self.pv / self.volume if self.volume else None
+
+    @property
+    def rsi(self):
+        if self.changes < self.rsi_period:
+            return None
+        if self.avg_loss == 0:
+            return 100.0 if self.avg_gain else 50.0
+        return 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+    def values(self) -> list:
+        return [*self.emas, self.volatility, self.vwap, self.rsi]
+
+# -------------------- ENGINE ---------------------
+
+class IndicatorEngine:
+    def __init__(self, ema_spans=EMA_SPANS, vol_window=VOL_WINDOW, rsi_period=RSI_PERIOD):
+        self.ema_spans = ema_spans
+        self.vol_window = vol_window
+        self.rsi_period = rsi_period
+        self.fields = indicator_fields(ema_spans)
+        self._states: dict[str, IndicatorState] = {}
+        self._touched: set[str] = set()
+
+        self.ticks = 0
+        self.snapshots = 0
+
+    # --- tick sink interface (see WebSocket.flush_loop) ---
+    def on_ticks(self, trades: list[dict]):
+        for trade in trades:
+            symbol, price, ts = trade.get("s"), trade.get("p"), trade.get("t")
+            if not symbol or price is None or not ts:
+                continue
+            self.add(symbol, float(price), float(trade.get("v") or 0), int(ts))
+
+    def write(self, pipe):
+        for symbol in self._touched:
+            key = indicator_key(symbol)
+            pipe.hset(key, mapping=self.snapshot(symbol))
+            pipe.expire(key, INDICATOR_TTL)
+        self.snapshots += len(self._touched)
+        self._touched.clear()
+
+    # --- core ---
+    def add(self, symbol: str, price: float, volume: float, ts: int):
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = IndicatorState(self.ema_spans, self.vol_window, self.rsi_period)
+        state.update(price, volume, ts)
+        self._touched.add(symbol)
+        self.ticks += 1
+
+    def snapshot(self, symbol: str) -> dict:
+        state = self._states[symbol]
+        snapshot = {"p": state.last, "t": state.ts, "n": state.count}
+        for field, value in zip(self.fields, state.values()):
+            snapshot[field] = "" if value is None else value   # Redis has no null; "" = not enough data yet
+        return snapshot
+
+    def stats(self) -> dict:
+        return {"ticks": self.ticks, "symbols": len(self._states), "snapshots": self.snapshots}
+
+# -------------------- BATCH MODE ---------------------
+# Same definitions over one symbol's ticks in arrival order; row i is the state after tick i, NaN where
+# the streaming readout would be None.
+
+def batch_ema(prices: np.ndarray, span: int) -> np.ndarray:
+    # adjust=False is exactly ema = (1-α)·ema + α·p seeded with the first price
+    return pd.Series(prices).ewm(alpha=2.0 / (span + 1), adjust=False).mean().to_numpy()
+
+def batch_volatility(prices: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(prices), np.nan)
+    if len(prices) < 3:
+        return out
+    returns = np.log(prices[1:] / prices[:-1])
+    shifted = returns - returns.mean()      # centre before the running sums to keep E[r²]−E[r]² well conditioned
+    s1 = np.concatenate(([0.0], np.cumsum(shifted)))
+    s2 = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    end = np.arange(1, len(returns) + 1)
+    start = np.maximum(end - window, 0)
+    n = end - start
+    mean = (s1[end] - s1[start]) / n
+    var = np.maximum((s2[end] - s2[start]) / n - mean * mean, 0.0)
+    out[1:] = np.where(n >= 2, np.sqrt(var), np.nan)
+    return out
+
+def batch_vwap(prices: np.ndarray, volumes: np.ndarray, times: np.ndarray) -> np.ndarray:
+    day = times // DAY_MS
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    lengths = np.diff(np.r_[starts, len(day)])
+    pv = np.cumsum(prices * volumes)
+    vol = np.cumsum(volumes)
+    # Subtract the running totals as of the end of the previous day
+    pv -= np.repeat(np.r_[0.0, pv[starts[1:] - 1]], lengths)
+    vol -= np.repeat(np.r_[0.0, vol[starts[1:] - 1]], lengths)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(vol > 0, pv / vol, np.nan)
+
+def batch_rsi(prices: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(prices), np.nan)
+    if len(prices) <= period:
+        return out
+    changes = np.diff(prices)
+    gains, losses = np.maximum(changes, 0.0), np.maximum(-changes, 0.0)
+    # Wilder smoothing is an EMA with α = 1/period, seeded with the simple mean of the first period changes
+    alpha = 1.0 / period
+    avg_gain = pd.Series(np.r_[gains[:period].mean(), gains[period:]]).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    avg_loss = pd.Series(np.r_[losses[:period].mean(), losses[period:]]).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    out[period:] = rsi
+    return out
+
+def compute_batch(prices, volumes, times, ema_spans=EMA_SPANS, vol_window=VOL_WINDOW,
+                  rsi_period=RSI_PERIOD) -> dict[str, np.ndarray]:
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    times = np.asarray(times, dtype=np.int64)
+    result = {f"ema_{span}": batch_ema(prices, span) for span in ema_spans}
+    result["vol"] = batch_volatility(prices, vol_window)
+    result["vwap"] = batch_vwap(prices, volumes, times)
+    result["rsi"] = batch_rsi(prices, rsi_period)
+    return result
@@ -0,0 +1,259 @@
+# services/inference.py
+#
+# CPU inference worker: keeps the last WINDOW_SIZE 10s-sampled prices per symbol in a preallocated
+# ring buffer fed from the live `stock:prices` channel, and every INFERENCE_INTERVAL seconds runs one
+# batched forward pass over every symbol with a full window, COPYing the results into predicted_prices.
+#
+# Needs torch on top of requirements.txt (see requirements-inference.txt).
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import torch
+import asyncpg
+from redis.asyncio import Redis
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from price_model import load_model, load_scaler
+from symbol_cache import SymbolResolver
+from background import keep_running
+from trade_codec import read_snapshots
+from windows import WINDOW_SIZE, LOOKAHEAD, THRESHOLD, DOWN, UP
+
+# -------------------- LOGGING SETUP ---------------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("inference")
+
+# -------------------- ENV SETUP ---------------------
+if not os.environ.get("ENV"):
+    load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
+
+REDIS_URL = os.environ.get("REDIS_URL")
+DATABASE_URL = os.environ.get("DATABASE_URL")
+DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+MODEL_PATH = os.environ.get("MODEL_PATH", "cnn_price_classifier.pt")
+SCALER_PATH = os.environ.get("SCALER_PATH", "cnn_price_scaler.npz")
+INFERENCE_INTERVAL = 10                                               # seconds — the cadence the model was trained on
+INFERENCE_BATCH = int(os.environ.get("INFERENCE_BATCH", "4096"))     # windows per forward pass
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))    # 0 = torch default
+
+SEED_LOOKBACK = timedelta(hours=1)        # stored history a seeded window may carry a price forward from
+SEED_ORIGIN = datetime(2000, 1, 1)        # date_bin origin, so bins line up across restarts
+
+PRICES_CHANNEL = "stock:prices"
+SYMBOL_SET_KEY = "stock:symbols"
+
+PREDICTION_COLUMNS = ("stock_id", "predicted_price", "prediction_time", "generated_at", "direction", "confidence")
+PREDICTION_SCHEMA_DDL = [
+    "ALTER TABLE predicted_prices ADD COLUMN IF NOT EXISTS direction SMALLINT",
+    "ALTER TABLE predicted_prices ADD COLUMN IF NOT EXISTS confidence DOUBLE PRECISION",
+]
+
+# -------------------- RING BUFFER ---------------------
+# One row per symbol, WINDOW_SIZE slots per row. `head` is the next slot to overwrite, which once a
+# row is full is also its oldest price, so a chronological window is a single fancy-index gather.
+
+class PriceRing:
+    def __init__(self, window: int = WINDOW_SIZE, capacity: int = 1024):
+        self.window = window
+        self.buf = np.zeros((capacity, window), dtype=np.float32)
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.rows: dict[str, int] = {}
+        self.symbols: list[str] = []
+
+    def _row(self, symbol: str) -> int:
+        row = self.rows.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row == len(self.buf):
+                grow = len(self.buf)
+                self.buf = np.vstack([self.buf, np.zeros((grow, self.window), dtype=np.float32)])
+                self.head = np.concatenate([self.head, np.zeros(grow, dtype=np.int64)])
+                self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+            self.rows[symbol] = row
+            self.symbols.append(symbol)
+        return row
+
+    def push_many(self, prices: dict[str, float]):
+        if not prices:
+            return
+        rows = np.fromiter((self._row(s) for s in prices), dtype=np.int64, count=len(prices))
+        self.buf[rows, self.head[rows]] = np.fromiter(prices.values(), dtype=np.float32, count=len(prices))
+        self.head[rows] = (self.head[rows] + 1) % self.window
+        self.count[rows] += 1
+
+    def full_windows(self) -> tuple[list[str], np.ndarray]:
+        ready = np.flatnonzero(self.count[:len(self.symbols)] >= self.window)
+        order = (self.head[ready, None] + np.arange(self.window)) % self.window
+        return [self.symbols[r] for r in ready], self.buf[ready[:, None], order]
+
+# -------------------- MODEL ---------------------
+
+def warm_up(model, batch: int):
+    # First calls allocate and pick kernels; keep that out of the first real cycle
+    dummy = torch.zeros(batch, WINDOW_SIZE, 1)
+    with torch.inference_mode():
+        for _ in range(3):
+            model(dummy)
+
+def predict(model, scaler, windows: np.ndarray) -> np.ndarray:
+    x = windows if scaler is None else (windows - scaler[0]) / scaler[1]
+    probs = []
+    with torch.inference_mode():
+        for i in range(0, len(x), INFERENCE_BATCH):
+            batch = torch.from_numpy(np.ascontiguousarray(x[i:i + INFERENCE_BATCH], dtype=np.float32)).unsqueeze(-1)
+            probs.append(torch.softmax(model(batch), dim=1).numpy())
+    return np.concatenate(probs) if probs else np.empty((0, 3), dtype=np.float32)
+
+# -------------------- FEED ---------------------
+
+async def follow_prices(redis, latest: dict):
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(PRICES_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    for symbol, (price, _) in json.loads(message["data"]).items():
+                        latest[symbol] = float(price)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Price feed lost: {e}")
+        finally:
+            await pubsub.close()
+        await asyncio.sleep(3)
+
+async def seed_history(pg_pool, ring: PriceRing):
+    # Fill windows from stored history so predictions start now, not WINDOW_SIZE cycles from now. Raw rows
+    # arrive at whatever rate trades did, so they are resampled like the live feed: the last price per
+    # INFERENCE_INTERVAL bin (date_bin in SQL), carried forward through bins without a trade.
+    step = timedelta(seconds=INFERENCE_INTERVAL)
+    async with pg_pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT s.symbol, b.bin, b.price FROM (
+                SELECT DISTINCT ON (stock_id, bin) stock_id, bin, price FROM (
+                    SELECT stock_id, price, trade_time_stamp,
+                           date_bin($1::interval, trade_time_stamp, $2::timestamp) AS bin
+                    FROM stock_price_history
+                    WHERE trade_time_stamp > (now() AT TIME ZONE 'utc') - $3::interval
+                ) t
+                ORDER BY stock_id, bin, trade_time_stamp DESC
+            ) b JOIN stocks s ON s.id = b.stock_id
+            ORDER BY s.symbol, b.bin
+            """,
+            step, SEED_ORIGIN, SEED_LOOKBACK,
+        )
+    current_bin = (datetime.utcnow() - SEED_ORIGIN) // step
+    series: dict[str, list[tuple[int, float]]] = {}
+    for row in rows:
+        series.setdefault(row["symbol"], []).append(((row["bin"] - SEED_ORIGIN) // step, row["price"]))
+
+    by_position: dict[int, dict[str, float]] = {}
+    for symbol, points in series.items():
+        # Each bin's price holds until the next bin that traded, the last one through the last completed
+        # bin: the first live cycle samples the current one
+        filled = []
+        for (bin_index, price), (next_bin, _) in zip(points, points[1:] + [(current_bin, None)]):
+            filled.extend([price] * (next_bin - bin_index))
+        for i, value in enumerate(filled[-WINDOW_SIZE:]):
+            by_position.setdefault(i, {})[symbol] = value
+    for i in sorted(by_position):
+        ring.push_many(by_position[i])
+    logger.info(f"Seeded ring buffer from {len(rows)} {INFERENCE_INTERVAL}s bins for {len(series)} symbols")
+
+async def seed_latest(redis, latest: dict):
+    snapshots = await read_snapshots(redis, await redis.smembers(SYMBOL_SET_KEY))
+    latest.update({s: snapshot.price for s, snapshot in snapshots.items() if snapshot is not None})
+
+# -------------------- CYCLE ---------------------
+
+async def run_cycle(model, scaler, ring: PriceRing, latest: dict, pg_pool, resolver: SymbolResolver):
+    # Sample every symbol's latest price (carried forward if it hasn't traded), like the 10s history
+    ring.push_many(dict(latest))
+    symbols, windows = ring.full_windows()
+    if not symbols:
+        logger.info("No symbol has a full window yet")
+        return
+
+    start = time.perf_counter()
+    probs = predict(model, scaler, windows)
+    forward_ms = (time.perf_counter() - start) * 1000
+
+    now = datetime.utcnow()
+    prediction_time = now + timedelta(seconds=INFERENCE_INTERVAL * LOOKAHEAD)
+    current = windows[:, -1].astype(np.float64)
+    # Expected move: ±THRESHOLD weighted by how much more likely UP is than DOWN
+    predicted = current * (1 + THRESHOLD * (probs[:, UP] - probs[:, DOWN]))
+    direction = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+
+    stock_ids = await resolver.resolve_many(pg_pool, symbols)
+    records = [
+        (stock_ids[s], float(predicted[i]), prediction_time, now, int(direction[i]), float(confidence[i]))
+        for i, s in enumerate(symbols) if s in stock_ids
+    ]
+
+    start = time.perf_counter()
+    async with pg_pool.acquire() as conn:
+        await conn.copy_records_to_table("predicted_prices", records=records, columns=PREDICTION_COLUMNS)
+    insert_ms = (time.perf_counter() - start) * 1000
+
+    logger.info(f"✅ Predicted {len(records)} symbols | forward {forward_ms:.1f}ms "
+                f"({forward_ms / len(symbols) * 1000:.1f}µs/symbol) | insert {insert_ms:.1f}ms")
+
+# -------------------- MAIN LOOP ---------------------
+
+async def run_inference():
+    if INFERENCE_THREADS:
+        torch.set_num_threads(INFERENCE_THREADS)
+
+    model = load_model(MODEL_PATH)
+    scaler = load_scaler(SCALER_PATH) if Path(SCALER_PATH).exists() else None
+    warm_up(model, min(INFERENCE_BATCH, 256))
+    logger.info(f"🚀 Model loaded from {MODEL_PATH} (scaler: {'yes' if scaler else 'no'}), warmed up")
+
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    pg_pool = await asyncpg.create_pool(DSN)
+    async with pg_pool.acquire() as conn:
+        for ddl in PREDICTION_SCHEMA_DDL:
+            await conn.execute(ddl)
+
+    resolver = SymbolResolver()
+    await resolver.load(pg_pool)
+    keep_running(lambda: resolver.listen(DSN, pg_pool), "resolver")
+
+    ring = PriceRing()
+    latest: dict[str, float] = {}
+    await seed_history(pg_pool, ring)
+    await seed_latest(redis, latest)
+    keep_running(lambda: follow_prices(redis, latest), "price-feed")
+
+    while True:
+        start = time.perf_counter()
+        try:
+            await run_cycle(model, scaler, ring, latest, pg_pool, resolver)
+        except Exception as e:
+            logger.error(f"[ERROR] Inference cycle failed: {e}")
+        elapsed = time.perf_counter() - start
+        if elapsed >= INFERENCE_INTERVAL:
+            logger.warning(f"⚠️ Inference took {elapsed:.2f}s — longer than the {INFERENCE_INTERVAL}s cadence")
+        await asyncio.sleep(max(INFERENCE_INTERVAL - elapsed, 0))
+
+if __name__ == "__main__":
+    asyncio.run(run_inference())
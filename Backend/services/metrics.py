@@ -0,0 +1,239 @@
+# services/metrics.py
+#
+# Minimal Prometheus-compatible metrics shared by the services (WebSocket.py, fetcher.py, trigger.py)
+# and the FastAPI app (imported there as `services.metrics`). Everything runs on one event loop per
+# process, so recording is a plain attribute update — no locks — and cheap enough for the per-tick path:
+# Counter.inc is one add, Histogram.observe one bisect plus two adds.
+#
+# Services expose the text format with start_metrics_server(port); the app serves render() at /metrics.
+
+import math
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger("metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans sub-millisecond Redis hops up to minutes of Postgres backlog
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+# -------------------- METRIC TYPES ---------------------
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, "_Metric"] = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self) -> "_Metric":
+        ...
+
+    @abstractmethod
+    def _samples(self, name, labelnames, values) -> list[str]:
+        ...
+
+    def _series(self):
+        # (label values, child); an unlabelled metric is its own single series
+        return self._children.items() if self.labelnames else [((), self)]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(child._samples(self.name, self.labelnames, values))
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+        self._fn = None
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set_function(self, fn):
+        # For totals already counted elsewhere (e.g. a stats attribute); must never decrease
+        self._fn = fn
+
+    def _samples(self, name, labelnames, values):
+        return Gauge._samples(self, name, labelnames, values)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+        self._fn = None
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, fn):
+        # Sampled at scrape time, for values that already live elsewhere (queue sizes, client counts)
+        self._fn = fn
+
+    def _samples(self, name, labelnames, values):
+        value = self.value
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                value = math.nan
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)   # last slot = above the highest bound
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.bounds)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _samples(self, name, labelnames, values):
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.bounds, math.inf), self.counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound)) if bound != math.inf else "+Inf"}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {self.count}")
+        return lines
+
+# -------------------- REGISTRY ---------------------
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def get_or_create(self, cls, name: str, documentation: str, labelnames=(), **kwargs):
+        # Idempotent, so modules can declare their metrics at import time in any process layout
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.kind}")
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return REGISTRY.get_or_create(Counter, name, documentation, labelnames)
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    return REGISTRY.get_or_create(Gauge, name, documentation, labelnames)
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+def render() -> str:
+    return REGISTRY.render()
+
+# -------------------- SHARED HELPERS ---------------------
+
+POOL_ACQUIRE_SECONDS = histogram(
+    "pg_pool_acquire_seconds", "Time spent waiting for an asyncpg pool connection", ("pool",)
+)
+
+@asynccontextmanager
+async def timed_acquire(pg_pool, pool_name: str, timeout: float = None):
+    # pg_pool.acquire() with the wait recorded, so pool starvation shows up as latency, not mystery stalls
+    start = time.perf_counter()
+    async with pg_pool.acquire(timeout=timeout) as conn:
+        POOL_ACQUIRE_SECONDS.labels(pool_name).observe(time.perf_counter() - start)
+        yield conn
+
+# -------------------- HTTP EXPOSITION ---------------------
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+        if path.split(b"?")[0] == b"/metrics":
+            status, body, content_type = "200 OK", render().encode(), CONTENT_TYPE
+        else:
+            status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    # Scrape endpoint for processes without FastAPI; port 0 disables it
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return server
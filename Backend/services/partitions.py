@@ -0,0 +1,201 @@
+# services/partitions.py
+
+import os
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("partitions")
+
+# -------------------- CONFIG ---------------------
+HISTORY_TABLE = "stock_price_history"
+PARTITION_GRANULARITY = os.environ.get("PARTITION_GRANULARITY", "day")      # "day" or "hour"
+PARTITIONS_AHEAD = int(os.environ.get("PARTITIONS_AHEAD", "3"))              # future partitions kept ready
+HISTORY_RETENTION_DAYS = float(os.environ.get("HISTORY_RETENTION_DAYS", "7"))
+
+STEP = timedelta(hours=1) if PARTITION_GRANULARITY == "hour" else timedelta(days=1)
+SUFFIX_FORMAT = "%Y%m%d%H" if PARTITION_GRANULARITY == "hour" else "%Y%m%d"
+TRUNC_UNIT = "hour" if PARTITION_GRANULARITY == "hour" else "day"
+
+# Catches rows no range partition covers (late replays, clock skew) so their insert doesn't fail;
+# maintenance moves them into real partitions. partition_start() returns None for it, so it's never dropped.
+DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+
+# Same columns as before; the primary key has to include the partition key
+PARENT_DDL = f"""
+    CREATE TABLE {HISTORY_TABLE} (
+        id               BIGSERIAL,
+        stock_id         INTEGER NOT NULL REFERENCES stocks(id),
+        price            DOUBLE PRECISION NOT NULL,
+        trade_time_stamp TIMESTAMP NOT NULL,
+        volume           DOUBLE PRECISION,
+        PRIMARY KEY (id, trade_time_stamp)
+    ) PARTITION BY RANGE (trade_time_stamp)
+"""
+
+PARENT_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS ix_stock_price_history_stock_time ON {HISTORY_TABLE} (stock_id, trade_time_stamp)",
+]
+
+# -------------------- NAMING ---------------------
+
+def period_start(ts: datetime) -> datetime:
+    if PARTITION_GRANULARITY == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def partition_name(start: datetime) -> str:
+    return f"{HISTORY_TABLE}_p{start.strftime(SUFFIX_FORMAT)}"
+
+def partition_start(name: str):
+    try:
+        return datetime.strptime(name.rsplit("_p", 1)[1], SUFFIX_FORMAT)
+    except (IndexError, ValueError):
+        return None   # not one of ours (or a different granularity) — never touched
+
+# -------------------- INSPECTION ---------------------
+
+async def table_kind(conn):
+    # 'p' = partitioned parent, 'r' = plain table, None = missing
+    return await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", HISTORY_TABLE)
+
+async def list_partitions(conn) -> list[str]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass($1)
+        ORDER BY c.relname
+        """,
+        HISTORY_TABLE,
+    )
+    return [row["relname"] for row in rows]
+
+# -------------------- CREATION ---------------------
+
+async def create_partition(conn, start: datetime):
+    end = start + STEP
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {HISTORY_TABLE}
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """
+    )
+
+async def ensure_partitions(conn, now: datetime = None, ahead: int = PARTITIONS_AHEAD,
+                            retention_days: float = HISTORY_RETENTION_DAYS) -> int:
+    # Every period from the retention cutoff to `ahead` periods out, so a late insert anywhere inside
+    # retention has a partition (after an outage the gap can be days, not just the previous period)
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+    await conn.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {HISTORY_TABLE} DEFAULT")
+    created = await move_default_rows(conn, cutoff)
+
+    existing = set(await list_partitions(conn))
+    start, last = period_start(cutoff), period_start(now) + STEP * ahead
+    while start <= last:
+        if partition_name(start) not in existing:
+            await create_partition(conn, start)
+            created += 1
+        start += STEP
+    return created
+
+async def move_default_rows(conn, cutoff: datetime) -> int:
+    # A range partition can't be created while the default partition holds rows in that range, so the
+    # rows are lifted out, the partition created and the rows routed back in, one period per transaction.
+    # Rows already past retention are deleted, as dropping their partition would have done.
+    periods = await conn.fetch(
+        f"SELECT DISTINCT date_trunc('{TRUNC_UNIT}', trade_time_stamp) AS start FROM {DEFAULT_PARTITION} ORDER BY 1"
+    )
+    created = 0
+    for row in periods:
+        start = row["start"]
+        end = start + STEP
+        async with conn.transaction():
+            # Blocks inserts into the default partition until the period has moved
+            await conn.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE")
+            if end <= cutoff:
+                status = await conn.execute(
+                    f"DELETE FROM {DEFAULT_PARTITION} WHERE trade_time_stamp >= $1 AND trade_time_stamp < $2", start, end,
+                )
+                logger.warning(f"Deleted {status.split()[-1]} expired rows from {DEFAULT_PARTITION} ({start:%Y-%m-%d %H:00})")
+                continue
+            await conn.execute(f"CREATE TEMP TABLE moved_rows (LIKE {HISTORY_TABLE}) ON COMMIT DROP")
+            status = await conn.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION} WHERE trade_time_stamp >= $1 AND trade_time_stamp < $2 RETURNING *
+                )
+                INSERT INTO moved_rows SELECT * FROM moved
+                """,
+                start, end,
+            )
+            await create_partition(conn, start)
+            await conn.execute(f"INSERT INTO {HISTORY_TABLE} SELECT * FROM moved_rows")
+        created += 1
+        logger.warning(f"Moved {status.split()[-1]} rows from {DEFAULT_PARTITION} into {partition_name(start)}")
+    return created
+
+async def migrate_to_partitioned(conn):
+    # One-off: swap the plain table for a partitioned parent and move the rows across
+    legacy = f"{HISTORY_TABLE}_legacy"
+    async with conn.transaction():
+        await conn.execute(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {legacy}")
+        for index in ("ix_stock_price_history_stock_time",):
+            await conn.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy")
+        await conn.execute(PARENT_DDL)
+        for ddl in PARENT_INDEXES:
+            await conn.execute(ddl)
+
+        bounds = await conn.fetchrow(f"SELECT min(trade_time_stamp) AS lo, max(trade_time_stamp) AS hi FROM {legacy}")
+        if bounds["lo"] is not None:
+            start = period_start(bounds["lo"])
+            while start <= bounds["hi"]:
+                await create_partition(conn, start)
+                start += STEP
+            columns = "stock_id, price, trade_time_stamp" + (", volume" if await has_volume(conn, legacy) else "")
+            await conn.execute(f"INSERT INTO {HISTORY_TABLE} ({columns}) SELECT {columns} FROM {legacy}")
+        await ensure_partitions(conn)
+        await conn.execute(f"DROP TABLE {legacy}")
+    logger.info(f"Migrated {HISTORY_TABLE} to {PARTITION_GRANULARITY}ly range partitions")
+
+async def has_volume(conn, table: str) -> bool:
+    return bool(await conn.fetchval(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = $1 AND column_name = 'volume'", table
+    ))
+
+# -------------------- RETENTION ---------------------
+
+async def drop_expired_partitions(conn, now: datetime = None, retention_days: float = HISTORY_RETENTION_DAYS) -> list[str]:
+    # A partition goes once its whole range is older than the retention horizon — DETACH + DROP
+    # is a catalog operation, so there is no bulk DELETE, no bloat and nothing for VACUUM to do
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    dropped = []
+    for name in await list_partitions(conn):
+        start = partition_start(name)
+        if start is None or start + STEP > cutoff:
+            continue
+        await conn.execute(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}")
+        await conn.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+    return dropped
+
+# -------------------- MAINTENANCE ENTRY ---------------------
+
+async def create_partitioned_table(conn):
+    async with conn.transaction():
+        await conn.execute(PARENT_DDL)
+        for ddl in PARENT_INDEXES:
+            await conn.execute(ddl)
+    logger.info(f"Created partitioned {HISTORY_TABLE}")
+
+async def run_partition_maintenance(pg_pool):
+    async with pg_pool.acquire() as conn:
+        kind = await table_kind(conn)
+        if kind is None:
+            await create_partitioned_table(conn)
+        elif kind != "p":
+            await migrate_to_partitioned(conn)
+        created = await ensure_partitions(conn)
+        dropped = await drop_expired_partitions(conn)
+    logger.info(f"Partition maintenance: created {created}, dropped {len(dropped)} {dropped or ''}")
+    return created, dropped
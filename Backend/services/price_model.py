@@ -0,0 +1,60 @@
+# services/price_model.py
+#
+# CNNPriceClassifier from Modelling/Stocks.ipynb, importable by the inference worker.
+# The notebook saves `cnn_price_classifier.pt` (state_dict) and `cnn_price_scaler.npz`
+# (StandardScaler mean_/scale_ over the 60 window positions) for load_model/load_scaler below.
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from windows import WINDOW_SIZE
+
+class CNNPriceClassifier(nn.Module):
+    def __init__(self, input_length=WINDOW_SIZE):
+        super().__init__()
+        self.input_length = input_length
+
+        self.conv1 = nn.Conv1d(in_channels=1, out_channels=64, kernel_size=3)
+        self.bn1 = nn.BatchNorm1d(64)
+        self.pool1 = nn.MaxPool1d(2)
+
+        self.conv2 = nn.Conv1d(64, 128, kernel_size=3)
+        self.bn2 = nn.BatchNorm1d(128)
+        self.pool2 = nn.MaxPool1d(2)
+
+        # Dynamically compute flattened size
+        with torch.no_grad():
+            dummy = torch.zeros(1, 1, input_length)
+            x = self.pool1(F.relu(self.bn1(self.conv1(dummy))))
+            x = self.pool2(F.relu(self.bn2(self.conv2(x))))
+            self.flattened_size = x.view(1, -1).shape[1]
+
+        self.fc1 = nn.Linear(self.flattened_size, 64)
+        self.dropout = nn.Dropout(0.3)
+        self.fc2 = nn.Linear(64, 3)
+
+    def forward(self, x):
+        x = x.permute(0, 2, 1)  # (B, 1, 60)
+        x = self.pool1(F.relu(self.bn1(self.conv1(x))))
+        x = self.pool2(F.relu(self.bn2(self.conv2(x))))
+        x = x.view(x.size(0), -1)
+        x = F.relu(self.fc1(x))
+        x = self.dropout(x)
+        return self.fc2(x)
+
+# -------------------- ARTIFACTS ---------------------
+
+def load_model(path, input_length=WINDOW_SIZE) -> CNNPriceClassifier:
+    model = CNNPriceClassifier(input_length=input_length)
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    return model
+
+def load_scaler(path):
+    # Returns (mean, scale) as float32 arrays, or None when the model was trained on raw prices
+    if not path:
+        return None
+    with np.load(path) as data:
+        return data["mean"].astype(np.float32), data["scale"].astype(np.float32)
@@ -0,0 +1,299 @@
+# services/scheduler.py
+#
+# Small asyncio scheduler for the trigger process. Two kinds of jobs:
+#
+#   CronJob     one-shot coroutine fired on a 5-field cron schedule (UTC), with start jitter and
+#               retry/backoff; a run that overlaps the next fire time skips it instead of stacking up
+#   ServiceJob  one long-running coroutine kept alive as a single instance: restarted with backoff when
+#               it crashes or returns, and (optionally) only running inside a daily UTC window, being
+#               cancelled when the window closes
+#
+# Every job keeps run metrics, logged periodically and mirrored to the `scheduler:jobs` Redis hash.
+
+import json
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta, time
+
+from metrics import counter, histogram
+
+logger = logging.getLogger("scheduler")
+
+STATS_KEY = "scheduler:jobs"      # job name → JSON stats
+STATS_INTERVAL = 300              # seconds between stats reports
+MAX_SLEEP = 60                    # long waits are chunked so wall-clock jumps are noticed
+
+JOB_RUNS = counter("scheduler_job_runs_total", "Scheduler job runs by outcome", ("job", "result"))
+JOB_SECONDS = histogram("scheduler_job_seconds", "Scheduler job run duration", ("job",),
+                        buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600, 14400, 86400))
+JOB_RESTARTS = counter("scheduler_job_restarts_total", "Service job restarts", ("job",))
+
+# -------------------- CRON ---------------------
+
+class CronSchedule:
+    # minute, hour, day of month, month, day of week (0 = Sunday, 7 accepted as Sunday)
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self.BOUNDS)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> set[int]:
+        values = set()
+        for part in field.split(","):
+            rng, _, step = part.partition("/")
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                start, end = (int(v) for v in rng.split("-", 1))
+            else:
+                start = end = int(rng)
+                if step:
+                    end = hi
+            if not lo <= start <= end <= hi:
+                raise ValueError(f"Cron field {field!r} out of range {lo}-{hi}")
+            values.update(range(start, end + 1, int(step or 1)))
+        return values
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return dom and dow
+        return dom or dow   # cron semantics: both restricted → either matches
+
+    def next_after(self, now: datetime) -> datetime:
+        t = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression {self.expr!r} never fires")
+
+# -------------------- HELPERS ---------------------
+
+async def sleep_until(when: datetime):
+    while (remaining := (when - datetime.utcnow()).total_seconds()) > 0:
+        await asyncio.sleep(min(remaining, MAX_SLEEP))
+
+def in_window(now: time, start: time, end: time) -> bool:
+    # Windows may wrap midnight, e.g. (22:00, 02:00)
+    return start <= now < end if start <= end else now >= start or now < end
+
+def next_boundary(now: datetime, at: time) -> datetime:
+    candidate = datetime.combine(now.date(), at)
+    return candidate if candidate > now else candidate + timedelta(days=1)
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # Exponential with full jitter, so restarting jobs don't hit a recovering dependency in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# -------------------- JOBS ---------------------
+
+class Job:
+    def __init__(self, name: str, func):
+        self.name = name
+        self.func = func
+        self.runs = 0
+        self.failures = 0
+        self.running = False
+        self.last_start = None
+        self.last_end = None
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = None
+
+    async def _invoke(self, timeout: float = None):
+        self.running = True
+        self.runs += 1
+        self.last_start = datetime.utcnow()
+        result = "error"
+        try:
+            await asyncio.wait_for(self.func(), timeout)
+            result = "ok"
+        except asyncio.CancelledError:
+            result = "cancelled"
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.running = False
+            self.last_end = datetime.utcnow()
+            self.last_duration = (self.last_end - self.last_start).total_seconds()
+            JOB_RUNS.labels(self.name, result).inc()
+            JOB_SECONDS.labels(self.name).observe(self.last_duration)
+
+    def stats(self) -> dict:
+        iso = lambda dt: dt.isoformat() if dt else None
+        return {
+            "kind": type(self).__name__,
+            "runs": self.runs,
+            "failures": self.failures,
+            "running": self.running,
+            "last_start": iso(self.last_start),
+            "last_end": iso(self.last_end),
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "next_run": iso(self.next_run),
+        }
+
+class CronJob(Job):
+    def __init__(self, name: str, schedule: str, func, *, jitter: float = 0, retries: int = 0,
+                 backoff: float = 30, max_backoff: float = 600, timeout: float = None, run_at_start: bool = False):
+        super().__init__(name, func)
+        self.schedule = CronSchedule(schedule)
+        self.jitter = jitter
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.run_at_start = run_at_start
+        self.skipped = 0
+
+    async def run(self):
+        if self.run_at_start:
+            await self._run_once()
+        while True:
+            fire = self.schedule.next_after(datetime.utcnow())
+            self.next_run = fire + timedelta(seconds=random.uniform(0, self.jitter))
+            await sleep_until(self.next_run)
+            await self._run_once()
+
+            missed = 0
+            while self.schedule.next_after(fire) <= datetime.utcnow():
+                fire = self.schedule.next_after(fire)
+                missed += 1
+            if missed:
+                self.skipped += missed
+                logger.warning(f"[{self.name}] Run overlapped {missed} scheduled time(s); skipped them")
+
+    async def _run_once(self):
+        for attempt in range(self.retries + 1):
+            try:
+                await self._invoke(self.timeout)
+                logger.info(f"[{self.name}] Finished in {self.last_duration:.2f}s")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"[{self.name}] Run failed (attempt {attempt + 1}/{self.retries + 1})")
+                if attempt < self.retries:
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+
+    def stats(self) -> dict:
+        return {**super().stats(), "schedule": self.schedule.expr, "skipped": self.skipped}
+
+class ServiceJob(Job):
+    def __init__(self, name: str, func, *, window: tuple[time, time] = None, backoff: float = 5,
+                 max_backoff: float = 300, healthy_after: float = 60):
+        super().__init__(name, func)
+        self.window = window
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.healthy_after = healthy_after      # a run this long resets the restart backoff
+        self.restarts = 0
+
+    async def run(self):
+        attempt = 0
+        while True:
+            now = datetime.utcnow()
+            deadline = None
+            if self.window:
+                start, end = self.window
+                if not in_window(now.time(), start, end):
+                    self.next_run = next_boundary(now, start)
+                    logger.info(f"[{self.name}] Outside window, next start {self.next_run.isoformat()}")
+                    await sleep_until(self.next_run)
+                    continue
+                deadline = next_boundary(now, end)
+            self.next_run = None
+
+            task = asyncio.create_task(self._invoke())
+            logger.info(f"[{self.name}] Started")
+            try:
+                if deadline is None:
+                    await asyncio.wait({task})
+                else:
+                    await asyncio.wait({task}, timeout=(deadline - datetime.utcnow()).total_seconds())
+            finally:
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    logger.info(f"[{self.name}] Window closed, stopped")
+
+            if task.cancelled():
+                attempt = 0
+                continue
+            if task.exception() is None:
+                logger.warning(f"[{self.name}] Exited; restarting")
+            else:
+                logger.error(f"[{self.name}] Crashed: {self.last_error}")
+
+            attempt = 0 if self.last_duration >= self.healthy_after else attempt + 1
+            self.restarts += 1
+            JOB_RESTARTS.labels(self.name).inc()
+            delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            self.next_run = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        window = self.window and [t.isoformat() for t in self.window]
+        return {**super().stats(), "window": window, "restarts": self.restarts}
+
+# -------------------- SCHEDULER ---------------------
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+
+    def add(self, job: Job) -> Job:
+        if job.name in self.jobs:
+            raise ValueError(f"Job {job.name!r} is already scheduled")
+        self.jobs[job.name] = job
+        return job
+
+    def cron(self, name: str, schedule: str, func, **kwargs) -> CronJob:
+        return self.add(CronJob(name, schedule, func, **kwargs))
+
+    def service(self, name: str, func, **kwargs) -> ServiceJob:
+        return self.add(ServiceJob(name, func, **kwargs))
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    async def report(self, redis=None, interval: float = STATS_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.stats()
+            for name, job in stats.items():
+                logger.info(f"[Stats] {name}: runs={job['runs']} failures={job['failures']} "
+                            f"running={job['running']} next={job['next_run']}")
+            if redis is not None:
+                try:
+                    await redis.hset(STATS_KEY, mapping={name: json.dumps(job) for name, job in stats.items()})
+                except Exception as e:
+                    logger.error(f"Publishing scheduler stats failed: {e}")
+
+    async def run(self, redis=None):
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs: {', '.join(self.jobs)}")
+        await asyncio.gather(*(job.run() for job in self.jobs.values()), self.report(redis))
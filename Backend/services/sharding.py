@@ -0,0 +1,33 @@
+# services/sharding.py
+
+import os
+import zlib
+from typing import Iterable
+
+# -------------------------- STABLE SYMBOL HASHING ---------------------------------------------
+# crc32 is stable across processes and restarts (unlike hash(), which is salted per interpreter),
+# so a symbol always lands on the same shard for a given shard count.
+
+def shard_for(symbol: str, shard_count: int) -> int:
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(symbol.encode("utf-8")) % shard_count
+
+def symbols_for_shard(symbols: Iterable[str], shard_index: int, shard_count: int) -> set[str]:
+    return {s for s in symbols if shard_for(s, shard_count) == shard_index}
+
+# -------------------------- FETCH PARTITIONS --------------------------------------------------
+# WebSocket.py marks changed symbols in one dirty set per partition, and each fetcher replica only drains
+# the partitions it holds a lease for (see coordination.py). Streamers and fetchers must agree on the count.
+
+FETCH_PARTITIONS = int(os.environ.get("FETCH_PARTITIONS", "64"))
+DIRTY_SET_KEY = "stock:dirty"   # pre-partitioning set; still drained and redistributed by fetcher.py
+
+def dirty_key(partition: int) -> str:
+    return f"{DIRTY_SET_KEY}:{partition}"
+
+def group_by_partition(symbols: Iterable[str], partition_count: int = FETCH_PARTITIONS) -> dict[int, list[str]]:
+    groups: dict[int, list[str]] = {}
+    for symbol in symbols:
+        groups.setdefault(shard_for(symbol, partition_count), []).append(symbol)
+    return groups
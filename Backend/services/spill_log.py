@@ -0,0 +1,291 @@
+# services/spill_log.py
+#
+# Local append-only log for stock_price_history rows that couldn't reach Postgres (down, failing over,
+# refusing connections, pool starved). HistoryWriter appends a batch here instead of dropping it, and
+# replays the log in large ordered batches once the database answers again.
+#
+# On disk: a directory of segments named after the first sequence number they hold, plus `spill.id`,
+# a random id for this log. A record is
+#
+#     <u32 payload length> <u32 crc32> <u64 seq> <u64 spilled_at ms> <payload>
+#
+# where the crc covers seq, spilled_at and payload, and the payload is packed (stock_id, price,
+# trade_time µs, volume) rows. A torn record at the tail (crash mid-append) is truncated away on open.
+#
+# Replay is idempotent: each batch is inserted in the same transaction that advances the log's row in
+# spill_offsets, and records at or below the committed seq are skipped. A crash between commit and
+# segment deletion therefore re-reads those records but never inserts them twice.
+#
+# A record Postgres rejects outright (not "unavailable": e.g. its stock was deleted) is moved to
+# `dead-letter.log` in the same record format, so the log keeps draining and the rows can still be
+# inspected and replayed by hand.
+
+import os
+import math
+import fcntl
+import time
+import uuid
+import zlib
+import struct
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("spill-log")
+
+# -------------------- CONFIG ---------------------
+
+SPILL_FSYNC = os.environ.get("SPILL_FSYNC", "always")                     # "always", "interval" or "never"
+SPILL_FSYNC_INTERVAL = float(os.environ.get("SPILL_FSYNC_INTERVAL", "1"))  # seconds, for "interval"
+SPILL_SEGMENT_BYTES = int(os.environ.get("SPILL_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+
+OFFSETS_TABLE = "spill_offsets"
+OFFSETS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {OFFSETS_TABLE} (
+        log_id     TEXT PRIMARY KEY,
+        last_seq   BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+    )
+"""
+
+HEADER = struct.Struct("<IIQQ")
+ROW = struct.Struct("<idqd")
+EPOCH = datetime(1970, 1, 1)
+SEGMENT_SUFFIX = ".seg"
+DEAD_LETTER_FILE = "dead-letter.log"
+
+# -------------------- RECORD CODEC ---------------------
+
+def encode_rows(rows: list[tuple]) -> bytes:
+    # rows are history_writer.HISTORY_COLUMNS tuples; trade_time_stamp is naive UTC, volume may be None
+    pack = ROW.pack
+    return b"".join(
+        pack(stock_id, price, (trade_time - EPOCH) // timedelta(microseconds=1), math.nan if volume is None else volume)
+        for stock_id, price, trade_time, volume in rows
+    )
+
+def decode_rows(payload: bytes) -> list[tuple]:
+    return [
+        (stock_id, price, EPOCH + timedelta(microseconds=micros), None if math.isnan(volume) else volume)
+        for stock_id, price, micros, volume in ROW.iter_unpack(payload)
+    ]
+
+def encode_record(seq: int, spilled_at_ms: int, payload: bytes) -> bytes:
+    meta = struct.pack("<QQ", seq, spilled_at_ms)
+    return HEADER.pack(len(payload), zlib.crc32(meta + payload), seq, spilled_at_ms) + payload
+
+def read_records(path: Path, offset: int = 0):
+    # Yields (offset, end, seq, spilled_at_ms, payload); stops at the first short or corrupt record
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, crc, seq, spilled_at = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(header[8:] + payload) != crc:
+                return
+            end = offset + HEADER.size + length
+            yield offset, end, seq, spilled_at, payload
+            offset = end
+
+# -------------------- LOG ---------------------
+
+class SpillLog:
+    def __init__(self, directory, fsync: str = SPILL_FSYNC, segment_bytes: int = SPILL_SEGMENT_BYTES):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown SPILL_FSYNC '{fsync}' (expected always, interval or never)")
+        self.directory = Path(directory)
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # One writer per directory: a second process appending to the same segments would interleave records
+        self._lock = open(self.directory / "spill.lock", "w")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise RuntimeError(f"Spill log {self.directory} is in use by another process; give each replica its own SPILL_DIR")
+
+        id_path = self.directory / "spill.id"
+        if not id_path.exists():
+            id_path.write_text(uuid.uuid4().hex)
+        self.log_id = id_path.read_text().strip()
+
+        self.next_seq = 1
+        self.replayed_seq = 0                 # highest seq known committed to Postgres (this process)
+        self._cursor = None                   # (segment, byte offset) of the next record to replay
+        self._file = None
+        self._last_fsync = 0.0
+        self.oldest_pending_ms = None         # spilled_at of the next record to replay
+        self._recover()
+
+    # ---- segments ----
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def _segment_path(self, first_seq: int) -> Path:
+        return self.directory / f"{first_seq:020d}{SEGMENT_SUFFIX}"
+
+    def _recover(self):
+        segments = self.segments()
+        if not segments:
+            self._segment_path(self.next_seq).touch()
+            segments = self.segments()
+
+        # Only the active (last) segment can hold a torn append
+        active = segments[-1]
+        self.next_seq = int(active.stem)
+        valid = 0
+        for _, end, seq, _, _ in read_records(active):
+            self.next_seq, valid = seq + 1, end
+        if valid < active.stat().st_size:
+            logger.warning(f"Truncating torn spill record in {active.name} at byte {valid}")
+            with open(active, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+
+        self._cursor = (segments[0], 0)
+        self._refresh_oldest()
+        if self.pending:
+            logger.warning(f"Spill log {self.directory} holds {self.pending_bytes()} bytes awaiting replay")
+
+    def _open_active(self):
+        if self._file is None:
+            self._file = open(self.segments()[-1], "ab")
+        return self._file
+
+    def _rotate(self):
+        # The new (empty) segment's name carries next_seq, so numbering survives every segment being deleted
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._segment_path(self.next_seq).touch()
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ---- state ----
+
+    @property
+    def pending(self) -> bool:
+        return self.oldest_pending_ms is not None
+
+    def pending_bytes(self) -> int:
+        segment, offset = self._cursor
+        return sum(path.stat().st_size for path in self.segments() if path >= segment) - offset
+
+    def lag_seconds(self) -> float:
+        return max(time.time() - self.oldest_pending_ms / 1000.0, 0.0) if self.pending else 0.0
+
+    def _refresh_oldest(self):
+        segment, offset = self._cursor
+        for path in self.segments():
+            if path < segment:
+                continue
+            for _, _, seq, spilled_at, _ in read_records(path, offset if path == segment else 0):
+                if seq > self.replayed_seq:
+                    self.oldest_pending_ms = spilled_at
+                    return
+        self.oldest_pending_ms = None
+
+    # ---- append ----
+
+    def append(self, rows: list[tuple]) -> int:
+        # Blocking (file write + fsync); HistoryWriter calls it through asyncio.to_thread
+        seq = self.next_seq
+        now_ms = int(time.time() * 1000)
+        f = self._open_active()
+        start = f.tell()
+        try:
+            f.write(encode_record(seq, now_ms, encode_rows(rows)))
+            f.flush()
+        except OSError:
+            # e.g. disk full: cut the partial record off, or every later append would sit behind it unread
+            f.truncate(start)
+            raise
+        if self.fsync == "always" or (self.fsync == "interval" and time.monotonic() - self._last_fsync >= SPILL_FSYNC_INTERVAL):
+            os.fsync(f.fileno())
+            self._last_fsync = time.monotonic()
+        self.next_seq = seq + 1
+        if self.oldest_pending_ms is None:
+            self.oldest_pending_ms = now_ms
+        if f.tell() >= self.segment_bytes:
+            self._rotate()
+        return seq
+
+    # ---- replay ----
+
+    def read_batch(self, max_rows: int, max_records: int = None) -> tuple[list[tuple[int, list[tuple]]], tuple]:
+        # Records after the replay cursor as (seq, rows), up to max_rows but always at least one record,
+        # and the cursor just past them
+        if self._file is not None:
+            self._file.flush()
+        segment, offset = self._cursor
+        records, rows, cursor = [], 0, self._cursor
+        for path in self.segments():
+            if path < segment:
+                continue
+            for _, end, seq, _, payload in read_records(path, offset if path == segment else 0):
+                count = len(payload) // ROW.size
+                if records and (rows + count > max_rows or len(records) == max_records):
+                    return records, cursor
+                records.append((seq, decode_rows(payload)))
+                rows, cursor = rows + count, (path, end)
+        return records, cursor
+
+    def commit(self, last_seq: int, cursor: tuple):
+        # Postgres has everything up to last_seq: advance, then drop segments that are fully replayed
+        self.replayed_seq = max(self.replayed_seq, last_seq)
+        segments = self.segments()
+        active = segments[-1]
+        segment, offset = cursor
+        if offset and offset >= segment.stat().st_size:
+            if segment == active:
+                self._rotate()
+            segment, offset = next(path for path in self.segments() if path > segment), 0
+        for path in segments:
+            if path >= segment:
+                break
+            path.unlink()
+        self._cursor = (segment, offset)
+        self._refresh_oldest()
+
+    # ---- dead letters ----
+
+    def dead_letter(self, seq: int, rows: list[tuple]):
+        # Blocking; called (through asyncio.to_thread) before the rejected record is committed past
+        with open(self.directory / DEAD_LETTER_FILE, "ab") as f:
+            f.write(encode_record(seq, int(time.time() * 1000), encode_rows(rows)))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def dead_letter_bytes(self) -> int:
+        path = self.directory / DEAD_LETTER_FILE
+        return path.stat().st_size if path.exists() else 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        self._lock.close()
+
+    def stats(self) -> dict:
+        return {
+            "log_id": self.log_id,
+            "next_seq": self.next_seq,
+            "replayed_seq": self.replayed_seq,
+            "pending_bytes": self.pending_bytes(),
+            "lag_s": round(self.lag_seconds(), 1),
+            "dead_letter_bytes": self.dead_letter_bytes(),
+        }
@@ -0,0 +1,139 @@
+# services/symbol_cache.py
+
+import asyncio
+import json
+import logging
+from typing import Iterable, Optional
+
+import asyncpg
+
+logger = logging.getLogger("symbol-cache")
+
+NOTIFY_CHANNEL = "stock_changed"
+LISTEN_CHECK_INTERVAL = 30  # seconds between listener connection health checks
+NOTIFY_BATCH = 1000         # notifications applied per refresh query
+
+# -------------------- SYMBOL → STOCK_ID RESOLVER ---------------------
+
+# In-memory copy of stocks(symbol → id), kept fresh by the stock_changed NOTIFY
+class SymbolResolver:
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._unknown: set[str] = set()   # negative cache, cleared whenever the table changes
+        self._queue: asyncio.Queue = asyncio.Queue()   # NOTIFY payloads, drained by listen()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.refreshes = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, symbol: str) -> Optional[int]:
+        return self._ids.get(symbol)
+
+    async def load(self, pg_pool):
+        async with pg_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT id, symbol FROM stocks")
+        self._ids = {row["symbol"]: row["id"] for row in rows}
+        self._unknown.clear()
+        self.reloads += 1
+        logger.info(f"Loaded {len(self._ids)} symbols into resolver cache")
+
+    async def refresh(self, pg_pool, symbols: Iterable[str]):
+        symbols = list(set(symbols))
+        if not symbols:
+            return
+        async with pg_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT id, symbol FROM stocks WHERE symbol = ANY($1::text[])", symbols)
+        found = {row["symbol"]: row["id"] for row in rows}
+        for symbol in symbols:
+            if symbol in found:
+                self._ids[symbol] = found[symbol]
+                self._unknown.discard(symbol)
+            else:
+                self._ids.pop(symbol, None)
+                self._unknown.add(symbol)
+        self.refreshes += 1
+
+    async def resolve_many(self, pg_pool, symbols: Iterable[str]) -> dict[str, int]:
+        resolved, missing = {}, []
+        for symbol in symbols:
+            stock_id = self._ids.get(symbol)
+            if stock_id is not None:
+                self.hits += 1
+                resolved[symbol] = stock_id
+            else:
+                self.misses += 1
+                if symbol not in self._unknown:
+                    missing.append(symbol)
+
+        # Anything not cached yet costs one batched lookup, never one query per symbol
+        if missing:
+            await self.refresh(pg_pool, missing)
+            for symbol in missing:
+                stock_id = self._ids.get(symbol)
+                if stock_id is not None:
+                    resolved[symbol] = stock_id
+        return resolved
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "refreshes": self.refreshes,
+        }
+
+    # -------------------- NOTIFY-DRIVEN INVALIDATION ---------------------
+
+    async def apply_notifications(self, pg_pool, payloads: list[str]):
+        # Payloads naming their symbol refresh just those rows (one query per batch); anything else forces a reload
+        symbols = []
+        for payload in payloads:
+            try:
+                data = json.loads(payload) if payload else None
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or not data.get("symbol"):
+                await self.load(pg_pool)
+                return
+            # A rename also has to forget the old symbol (see SyncRedis.STOCK_NOTIFY_DDL)
+            symbols += [s for s in (data["symbol"], data.get("old_symbol")) if s]
+        await self.refresh(pg_pool, symbols)
+
+    def on_notify(self, conn, pid, channel, payload):
+        self._queue.put_nowait(payload)
+
+    async def listen(self, dsn: str, pg_pool):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(NOTIFY_CHANNEL, self.on_notify)
+                logger.info(f"Resolver listening on '{NOTIFY_CHANNEL}'")
+                while not conn.is_closed():
+                    try:
+                        payload = await asyncio.wait_for(self._queue.get(), LISTEN_CHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        continue
+                    batch = [payload]
+                    while len(batch) < NOTIFY_BATCH and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    # A failed batch drops into the reconnect below, whose full reload covers it
+                    await self.apply_notifications(pg_pool, batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Resolver LISTEN failed: {e}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+            # Notifications may have been missed while disconnected
+            await asyncio.sleep(LISTEN_CHECK_INTERVAL)
+            try:
+                await self.load(pg_pool)
+            except Exception as e:
+                logger.error(f"Resolver reload failed: {e}")
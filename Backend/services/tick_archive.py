@@ -0,0 +1,231 @@
+# services/tick_archive.py
+#
+# Columnar on-disk tick archive for training and research.
+#
+#   <root>/index.json            {"version": 1, "symbols": {"<stock_id>": {"count", "first_ts", "last_ts", "sorted"}}}
+#   <root>/<stock_id>.ts         int64  exchange timestamps (ms since epoch), ascending
+#   <root>/<stock_id>.px         float64 prices, same length
+#
+# Each symbol's columns are plain append-only binary files, so opening one is an np.memmap and a time
+# slice is a searchsorted + view — no parse, no copy, and only the touched pages are read from disk.
+#
+# index.json is the commit point: the converter saves it after every input file, and opening an archive
+# for writing (mode="w", one writer at a time under an flock) truncates each column file back to its
+# indexed count, so ticks appended by a run that crashed before saving are dropped instead of misaligning
+# (or silently extending) the columns. Readers only ever map the indexed count and never truncate, so
+# they are safe alongside a running converter.
+#
+# Usage:
+#   python tick_archive.py convert stock_price_history.csv [more.csv | backups/*.parquet] --out ./ticks
+#   python tick_archive.py info --out ./ticks
+
+import os
+import json
+import fcntl
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ARCHIVE_VERSION = 1
+TS_DTYPE = np.dtype("<i8")
+PX_DTYPE = np.dtype("<f8")
+CONVERT_CHUNK_ROWS = 1_000_000
+
+# Backup CSV/Parquet (stock_price_history) and the older export in assets/stock_data.csv
+TIME_COLUMNS = ("trade_time_stamp", "last_updated")
+PRICE_COLUMNS = ("price", "current_price")
+
+# -------------------- ARCHIVE ---------------------
+
+class TickArchive:
+    def __init__(self, root, mode: str = "r"):
+        if mode not in ("r", "w"):
+            raise ValueError(f"Unknown mode '{mode}' (expected r or w)")
+        self.root = Path(root)
+        self.mode = mode
+        self.index_path = self.root / "index.json"
+        self._lock = None
+        if mode == "w":
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._lock = open(self.root / "archive.lock", "w")
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock.close()
+                raise RuntimeError(f"Tick archive {self.root} is already open for writing")
+        if self.index_path.exists():
+            self.index = json.loads(self.index_path.read_text())
+            if self.index.get("version") != ARCHIVE_VERSION:
+                raise ValueError(f"Unsupported archive version {self.index.get('version')}")
+        else:
+            self.index = {"version": ARCHIVE_VERSION, "symbols": {}}
+        if mode == "w":
+            self._truncate_uncommitted()
+
+    def close(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _check_writable(self):
+        if self.mode != "w":
+            raise RuntimeError(f"Tick archive {self.root} is open read-only")
+
+    def _truncate_uncommitted(self):
+        for path in [*self.root.glob("*.ts"), *self.root.glob("*.px")]:
+            entry = self.index["symbols"].get(path.stem)
+            dtype = TS_DTYPE if path.suffix == ".ts" else PX_DTYPE
+            size = (entry["count"] if entry else 0) * dtype.itemsize
+            if path.stat().st_size > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _paths(self, stock_id) -> tuple[Path, Path]:
+        return self.root / f"{stock_id}.ts", self.root / f"{stock_id}.px"
+
+    def stock_ids(self) -> list[int]:
+        return sorted(int(k) for k in self.index["symbols"])
+
+    def info(self, stock_id) -> dict:
+        return self.index["symbols"][str(stock_id)]
+
+    # --- write side ---
+    def append(self, stock_id, timestamps: np.ndarray, prices: np.ndarray):
+        self._check_writable()
+        timestamps = np.ascontiguousarray(timestamps, dtype=TS_DTYPE)
+        prices = np.ascontiguousarray(prices, dtype=PX_DTYPE)
+        if len(timestamps) != len(prices):
+            raise ValueError("timestamps and prices must have the same length")
+        if not len(timestamps):
+            return
+
+        entry = self.index["symbols"].setdefault(
+            str(stock_id), {"count": 0, "first_ts": None, "last_ts": None, "sorted": True}
+        )
+        in_order = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+        if entry["last_ts"] is not None and timestamps[0] < entry["last_ts"]:
+            in_order = False
+
+        ts_path, px_path = self._paths(stock_id)
+        with open(ts_path, "ab") as f:
+            timestamps.tofile(f)
+        with open(px_path, "ab") as f:
+            prices.tofile(f)
+
+        entry["count"] += len(timestamps)
+        first, last = int(timestamps.min()), int(timestamps.max())
+        entry["first_ts"] = first if entry["first_ts"] is None else min(entry["first_ts"], first)
+        entry["last_ts"] = last if entry["last_ts"] is None else max(entry["last_ts"], last)
+        entry["sorted"] = entry["sorted"] and in_order
+
+    def finalize(self):
+        # Out-of-order appends (e.g. a converter fed unordered chunks) are fixed once, per symbol,
+        # so memory is bounded by the largest single symbol rather than the whole archive
+        self._check_writable()
+        for key, entry in self.index["symbols"].items():
+            if entry["sorted"]:
+                continue
+            ts_path, px_path = self._paths(key)
+            ts = np.memmap(ts_path, dtype=TS_DTYPE, mode="r+", shape=(entry["count"],))
+            px = np.memmap(px_path, dtype=PX_DTYPE, mode="r+", shape=(entry["count"],))
+            order = np.argsort(ts, kind="stable")
+            ts[:] = ts[order]
+            px[:] = px[order]
+            ts.flush()
+            px.flush()
+            del ts, px
+            entry["sorted"] = True
+        self.save_index()
+
+    def save_index(self):
+        self._check_writable()
+        tmp = self.index_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.index, indent=1, sort_keys=True))
+        os.replace(tmp, self.index_path)
+
+    # --- read side ---
+    def open(self, stock_id) -> tuple[np.memmap, np.memmap]:
+        entry = self.info(stock_id)
+        if not entry["sorted"]:
+            raise RuntimeError(f"Symbol {stock_id} has unsorted appends — run finalize() first")
+        ts_path, px_path = self._paths(stock_id)
+        shape = (entry["count"],)
+        return (np.memmap(ts_path, dtype=TS_DTYPE, mode="r", shape=shape),
+                np.memmap(px_path, dtype=PX_DTYPE, mode="r", shape=shape))
+
+    def slice(self, stock_id, start_ms: int = None, end_ms: int = None) -> tuple[np.ndarray, np.ndarray]:
+        # [start_ms, end_ms) as zero-copy views into the mapped files
+        ts, px = self.open(stock_id)
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="left"))
+        return ts[lo:hi], px[lo:hi]
+
+# -------------------- CONVERTER ---------------------
+
+def _pick(columns, candidates, what):
+    for name in candidates:
+        if name in columns:
+            return name
+    raise ValueError(f"No {what} column (expected one of {', '.join(candidates)})")
+
+def _chunks(path: Path):
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=CONVERT_CHUNK_ROWS):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=CONVERT_CHUNK_ROWS)
+
+def convert(paths, root) -> TickArchive:
+    archive = TickArchive(root, mode="w")
+    try:
+        for path in map(Path, paths):
+            rows = 0
+            for chunk in _chunks(path):
+                time_col = _pick(chunk.columns, TIME_COLUMNS, "timestamp")
+                price_col = _pick(chunk.columns, PRICE_COLUMNS, "price")
+
+                ts = pd.to_datetime(chunk[time_col], errors="coerce")
+                if getattr(ts.dt, "tz", None) is not None:
+                    ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+                frame = pd.DataFrame({
+                    "stock_id": chunk["stock_id"].to_numpy(),
+                    "ts": ts.to_numpy(dtype="datetime64[ms]").astype(TS_DTYPE),
+                    "price": pd.to_numeric(chunk[price_col], errors="coerce").to_numpy(dtype=PX_DTYPE),
+                })
+                frame = frame[ts.notna().to_numpy() & np.isfinite(frame["price"].to_numpy())]
+                frame = frame.sort_values(["stock_id", "ts"], kind="stable")
+
+                for stock_id, group in frame.groupby("stock_id", sort=False):
+                    archive.append(int(stock_id), group["ts"].to_numpy(), group["price"].to_numpy())
+                rows += len(frame)
+            archive.save_index()
+            print(f"✅ {path}: {rows} ticks archived")
+
+        archive.finalize()
+    finally:
+        archive.close()
+    return archive
+
+# -------------------- CLI ---------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory-mapped tick archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="append backup CSV/Parquet files to an archive")
+    conv.add_argument("inputs", nargs="+")
+    conv.add_argument("--out", required=True)
+    info = sub.add_parser("info", help="list symbols in an archive")
+    info.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        archive = convert(args.inputs, args.out)
+    else:
+        archive = TickArchive(args.out)
+    for stock_id in archive.stock_ids():
+        entry = archive.info(stock_id)
+        print(f"{stock_id:>8}: {entry['count']:>10} ticks  "
+              f"{pd.Timestamp(entry['first_ts'], unit='ms')} → {pd.Timestamp(entry['last_ts'], unit='ms')}")
@@ -0,0 +1,269 @@
+# services/tick_streams.py
+
+import os
+import time
+import socket
+import asyncio
+import logging
+from datetime import datetime
+
+from redis.exceptions import ResponseError
+
+from sharding import shard_for
+from history_writer import (
+    HISTORY_TABLE, HISTORY_COLUMNS, ROWS_WRITTEN, BATCH_ROWS, FLUSH_SECONDS, REDIS_TO_POSTGRES, observe_committed,
+)
+from metrics import timed_acquire
+
+logger = logging.getLogger("tick-streams")
+
+# -------------------- CONFIG ---------------------
+TICK_STREAM_PREFIX = "stock:ticks:"
+TICK_STREAM_SHARDS = int(os.environ.get("TICK_STREAM_SHARDS", "4"))
+TICK_STREAM_MAXLEN = int(os.environ.get("TICK_STREAM_MAXLEN", "200000"))     # per shard, approximate trimming
+TICK_GROUP = os.environ.get("TICK_GROUP", "history-writers")
+TICK_CONSUMER_NAME = os.environ.get("TICK_CONSUMER_NAME", socket.gethostname())
+TICK_READ_COUNT = int(os.environ.get("TICK_READ_COUNT", "5000"))             # entries per XREADGROUP per stream
+TICK_BLOCK_MS = int(os.environ.get("TICK_BLOCK_MS", "2000"))
+TICK_CLAIM_IDLE_MS = int(os.environ.get("TICK_CLAIM_IDLE_MS", "60000"))     # pending this long → owner presumed dead
+TICK_RECOVER_INTERVAL = 30                                                  # seconds between pending-entry sweeps
+
+OFFSETS_TABLE = "tick_stream_offsets"
+
+# -------------------- STREAM NAMING ---------------------
+
+def stream_key(shard: int) -> str:
+    return f"{TICK_STREAM_PREFIX}{shard}"
+
+def stream_for_symbol(symbol: str) -> str:
+    return stream_key(shard_for(symbol, TICK_STREAM_SHARDS))
+
+def all_stream_keys() -> list[str]:
+    return [stream_key(i) for i in range(TICK_STREAM_SHARDS)]
+
+def claims_key(stream: str) -> str:
+    # Hash of entry id → consumer that first read it, for entries moved to another consumer by XCLAIM
+    return f"{stream}:claims"
+
+def append_ticks(pipe, trades: list[dict]):
+    # Called from the streamer's flush pipeline — one XADD per raw tick, capped per shard
+    for trade in trades:
+        symbol = trade.get("s")
+        price = trade.get("p")
+        if not symbol or price is None:
+            continue
+        pipe.xadd(
+            stream_for_symbol(symbol),
+            {"s": symbol, "p": price, "t": trade.get("t") or 0, "v": trade.get("v") or 0},
+            maxlen=TICK_STREAM_MAXLEN,
+            approximate=True,
+        )
+
+def parse_entry_id(entry_id: str) -> tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+# -------------------- SCHEMA ---------------------
+
+OFFSETS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {OFFSETS_TABLE} (
+        stream    TEXT NOT NULL,
+        consumer  TEXT NOT NULL,
+        last_id   TEXT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        PRIMARY KEY (stream, consumer)
+    )
+"""
+
+# -------------------- CONSUMER ---------------------
+# Exactly-once into Postgres: every batch is inserted in the same transaction that advances the
+# (stream, consumer) offset row, and XACK only happens after commit. A consumer reads its own entries
+# in increasing id order, so after a crash any redelivered entry at or below the committed offset is
+# already in the table and is only acknowledged, never inserted again. A claimed entry keeps being
+# deduplicated against the offset of the consumer that first read it (claims_key), however many times
+# it changes hands before it is finally acknowledged.
+
+class TickConsumer:
+    def __init__(self, redis, pg_pool, resolver, name: str = TICK_CONSUMER_NAME):
+        self.redis = redis
+        self.pg_pool = pg_pool
+        self.resolver = resolver
+        self.name = name
+        self.streams = all_stream_keys()
+
+        self.rows_written = 0
+        self.entries_acked = 0
+        self.duplicates_skipped = 0
+        self.claimed = 0
+
+    async def setup(self):
+        for stream in self.streams:
+            try:
+                await self.redis.xgroup_create(stream, TICK_GROUP, id="0", mkstream=True)
+                logger.info(f"Created consumer group '{TICK_GROUP}' on {stream}")
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        async with self.pg_pool.acquire() as conn:
+            await conn.execute(OFFSETS_DDL)
+
+    async def process(self, stream: str, owner: str, entries: list) -> int:
+        all_ids = [entry_id for entry_id, _ in entries]
+        # Entries trimmed away by MAXLEN come back without fields; they only need acknowledging
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            if all_ids:
+                await self.redis.xack(stream, TICK_GROUP, *all_ids)
+            return 0
+
+        symbols = {fields.get("s") for _, fields in entries}
+        stock_ids = await self.resolver.resolve_many(self.pg_pool, [s for s in symbols if s])
+
+        start = time.perf_counter()
+        async with timed_acquire(self.pg_pool, "tick-consumer") as conn:
+            async with conn.transaction():
+                committed = await conn.fetchval(
+                    f"SELECT last_id FROM {OFFSETS_TABLE} WHERE stream = $1 AND consumer = $2 FOR UPDATE",
+                    stream, owner,
+                )
+                floor = parse_entry_id(committed) if committed else (-1, -1)
+
+                rows, newest = [], floor
+                for entry_id, fields in entries:
+                    parsed_id = parse_entry_id(entry_id)
+                    if parsed_id <= floor:
+                        self.duplicates_skipped += 1
+                        continue
+                    newest = max(newest, parsed_id)
+                    stock_id = stock_ids.get(fields.get("s"))
+                    if not stock_id:
+                        continue
+                    try:
+                        rows.append((
+                            stock_id,
+                            float(fields["p"]),
+                            datetime.utcfromtimestamp(int(fields["t"]) / 1000.0),
+                            float(fields.get("v") or 0),
+                        ))
+                    except (KeyError, ValueError) as e:
+                        logger.error(f"[ERROR] Bad tick {entry_id} on {stream}: {e}")
+
+                if rows:
+                    await conn.copy_records_to_table(HISTORY_TABLE, records=rows, columns=HISTORY_COLUMNS)
+                if newest > floor:
+                    await conn.execute(
+                        f"""
+                        INSERT INTO {OFFSETS_TABLE} (stream, consumer, last_id) VALUES ($1, $2, $3)
+                        ON CONFLICT (stream, consumer)
+                        DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = now() AT TIME ZONE 'utc'
+                        """,
+                        stream, owner, f"{newest[0]}-{newest[1]}",
+                    )
+
+        if rows:
+            FLUSH_SECONDS.labels("streams").observe(time.perf_counter() - start)
+            ROWS_WRITTEN.labels("streams").inc(len(rows))
+            BATCH_ROWS.observe(len(rows))
+            observe_committed(rows)
+            # The entry id's millisecond part is when Redis accepted the XADD
+            now_ms = time.time() * 1000
+            for entry_id, _ in entries:
+                REDIS_TO_POSTGRES.observe(max(now_ms - parse_entry_id(entry_id)[0], 0) / 1000)
+
+        await self.redis.xack(stream, TICK_GROUP, *all_ids)
+        self.rows_written += len(rows)
+        self.entries_acked += len(all_ids)
+        return len(rows)
+
+    async def recover_own(self):
+        # Entries we read before a restart but never acknowledged
+        for stream in self.streams:
+            while True:
+                response = await self.redis.xreadgroup(TICK_GROUP, self.name, {stream: "0"}, count=TICK_READ_COUNT)
+                entries = response[0][1] if response else []
+                if not entries:
+                    break
+                await self.process_pending(stream, entries)
+                if len(entries) < TICK_READ_COUNT:
+                    break
+
+    async def recover_abandoned(self):
+        # Entries stuck with a consumer that stopped acknowledging — claim them and honour that
+        # consumer's committed offset so its last in-flight batch is not inserted twice
+        for stream in self.streams:
+            pending = await self.redis.xpending_range(
+                stream, TICK_GROUP, min="-", max="+", count=TICK_READ_COUNT, idle=TICK_CLAIM_IDLE_MS,
+            )
+            by_owner: dict[str, list[str]] = {}
+            for item in pending:
+                if item["consumer"] != self.name:
+                    by_owner.setdefault(item["consumer"], []).append(item["message_id"])
+
+            for owner, ids in by_owner.items():
+                # Record the original reader before the claim: if processing fails here, the entries sit in
+                # our own PEL and recover_own must still compare them with that reader's offset, not ours
+                origins = await self.redis.hmget(claims_key(stream), ids)
+                first_reads = {entry_id: owner for entry_id, origin in zip(ids, origins) if origin is None}
+                if first_reads:
+                    await self.redis.hset(claims_key(stream), mapping=first_reads)
+                claimed = await self.redis.xclaim(stream, TICK_GROUP, self.name, TICK_CLAIM_IDLE_MS, ids)
+                claimed.sort(key=lambda entry: parse_entry_id(entry[0]))
+                self.claimed += len(claimed)
+                await self.process_pending(stream, claimed)
+                logger.warning(f"Recovered {len(claimed)} pending ticks from '{owner}' on {stream}")
+
+    async def process_pending(self, stream: str, entries: list):
+        # Pending entries (ours or claimed), each deduplicated against the offset of its original reader
+        if not entries:
+            return
+        ids = [entry_id for entry_id, _ in entries]
+        origins = await self.redis.hmget(claims_key(stream), ids)
+        by_origin: dict[str, list] = {}
+        for entry, origin in zip(entries, origins):
+            by_origin.setdefault(origin or self.name, []).append(entry)
+        for origin, group in by_origin.items():
+            await self.process(stream, origin, group)
+        claimed_ids = [entry_id for entry_id, origin in zip(ids, origins) if origin]
+        if claimed_ids:
+            await self.redis.hdel(claims_key(stream), *claimed_ids)
+
+    async def read_batch(self) -> int:
+        response = await self.redis.xreadgroup(
+            TICK_GROUP, self.name, {stream: ">" for stream in self.streams},
+            count=TICK_READ_COUNT, block=TICK_BLOCK_MS,
+        )
+        written = 0
+        for stream, entries in response or []:
+            written += await self.process(stream, self.name, entries)
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "consumer": self.name,
+            "rows_written": self.rows_written,
+            "entries_acked": self.entries_acked,
+            "duplicates_skipped": self.duplicates_skipped,
+            "claimed": self.claimed,
+        }
+
+async def run_tick_consumer(consumer: TickConsumer):
+    await consumer.setup()
+    loop = asyncio.get_running_loop()
+    next_recover = loop.time()
+    recover_own = True
+
+    while True:
+        try:
+            # Nothing is acknowledged on failure, so a failed batch is picked up again from our own PEL
+            if recover_own:
+                await consumer.recover_own()
+                recover_own = False
+            if loop.time() >= next_recover:
+                await consumer.recover_abandoned()
+                next_recover = loop.time() + TICK_RECOVER_INTERVAL
+                logger.info(f"Tick consumer: {consumer.stats()}")
+            await consumer.read_batch()
+        except Exception as e:
+            logger.error(f"[ERROR] Tick batch failed: {e} — {consumer.stats()}")
+            recover_own = True
+            await asyncio.sleep(5)
@@ -0,0 +1,121 @@
+# services/trade_codec.py
+#
+# One Redis hash per symbol holding the latest trade in numeric form — replaces the `stock:price:<sym>`
+# string plus `stock:trade:<sym>` JSON pair. Written by WebSocket.py, read by fetcher.py, inference.py and
+# the API's /quotes (imported there as `services.trade_codec`).
+#
+#   stock:snap:<sym>  v=1  p=<price>  t=<exchange ts, ms>  vol=<volume>  at=<ingest ts, ms>
+#
+# A hash (rather than a packed binary string) keeps working with decode_responses=True clients, and
+# small hashes use Redis' listpack encoding, so one key costs less than the two it replaces.
+# Readers fall back to the old keys for symbols without a snapshot until SNAPSHOT_LEGACY_READS=0.
+# Snapshots don't expire (a quiet symbol keeps its last price); SyncRedis deletes a symbol's snapshot
+# when the symbol is removed from stocks.
+
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional
+
+logger = logging.getLogger("trade-codec")
+
+SNAPSHOT_PREFIX = "stock:snap:"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FIELDS = ("v", "p", "t", "vol", "at")
+
+LEGACY_PRICE_PREFIX = "stock:price:"
+LEGACY_TRADE_PREFIX = "stock:trade:"
+LEGACY_READS = os.environ.get("SNAPSHOT_LEGACY_READS", "1") == "1"
+
+class Snapshot(NamedTuple):
+    price: float
+    timestamp: Optional[int]      # exchange time, epoch ms
+    volume: float
+    ingested_at: Optional[int]    # when the streamer wrote it, epoch ms
+
+def snapshot_key(symbol: str) -> str:
+    return f"{SNAPSHOT_PREFIX}{symbol}"
+
+# -------------------- ENCODE ---------------------
+
+def encode(price: float, timestamp: Optional[int], volume: float, ingested_at: int) -> dict:
+    return {"v": SNAPSHOT_VERSION, "p": price, "t": timestamp or 0, "vol": volume or 0, "at": ingested_at}
+
+def write_snapshot(pipe, symbol: str, price: float, timestamp: Optional[int], volume: float, ingested_at: int):
+    pipe.hset(snapshot_key(symbol), mapping=encode(price, timestamp, volume, ingested_at))
+
+# -------------------- DECODE ---------------------
+
+def decode(values) -> Optional[Snapshot]:
+    # `values` is an HMGET reply in SNAPSHOT_FIELDS order; float()/int() take str and bytes alike
+    if not values or values[0] is None or values[1] is None:
+        return None
+    version = int(values[0])
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    _, price, timestamp, volume, ingested_at = values
+    return Snapshot(
+        float(price),
+        (int(timestamp) or None) if timestamp is not None else None,
+        float(volume or 0),
+        int(ingested_at) if ingested_at is not None else None,
+    )
+
+def decode_legacy(raw_trade, raw_price) -> Optional[Snapshot]:
+    # stock:trade:<sym> JSON (expires after an hour) carries everything; stock:price:<sym> only the price
+    if raw_trade is not None:
+        info = json.loads(raw_trade)
+        updated_at = info.get("updated_at")
+        return Snapshot(
+            float(info["price"]),
+            int(info["timestamp"]) if info.get("timestamp") else None,
+            float(info.get("volume") or 0),
+            int(datetime.fromisoformat(updated_at).timestamp() * 1000) if updated_at else None,
+        )
+    if raw_price is not None:
+        return Snapshot(float(raw_price), None, 0.0, None)
+    return None
+
+# -------------------- READ ---------------------
+
+def queue_reads(pipe, symbols: Iterable[str]):
+    # Adds one HMGET per symbol; pass the matching slice of pipe.execute() to decode_reads
+    for symbol in symbols:
+        pipe.hmget(snapshot_key(symbol), SNAPSHOT_FIELDS)
+
+def decode_reads(symbols: list[str], replies: list) -> dict[str, Optional[Snapshot]]:
+    # One unreadable (or newer-version) snapshot is that symbol's problem, not the whole batch's
+    snapshots = {}
+    for symbol, reply in zip(symbols, replies):
+        try:
+            snapshots[symbol] = decode(reply)
+        except (ValueError, TypeError) as e:
+            logger.error(f"[ERROR] Bad snapshot for {symbol}: {e}")
+            snapshots[symbol] = None
+    return snapshots
+
+async def read_legacy(redis, symbols: list[str]) -> dict[str, Optional[Snapshot]]:
+    pipe = redis.pipeline(transaction=False)
+    for symbol in symbols:
+        pipe.get(f"{LEGACY_TRADE_PREFIX}{symbol}")
+        pipe.get(f"{LEGACY_PRICE_PREFIX}{symbol}")
+    replies = await pipe.execute()
+    return {symbol: decode_legacy(replies[2 * i], replies[2 * i + 1]) for i, symbol in enumerate(symbols)}
+
+async def fill_legacy(redis, snapshots: dict[str, Optional[Snapshot]]):
+    # Migration path: one extra round trip, only when some symbols have no snapshot yet
+    if not LEGACY_READS:
+        return snapshots
+    missing = [symbol for symbol, snapshot in snapshots.items() if snapshot is None]
+    if missing:
+        snapshots.update(await read_legacy(redis, missing))
+    return snapshots
+
+async def read_snapshots(redis, symbols: Iterable[str]) -> dict[str, Optional[Snapshot]]:
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    pipe = redis.pipeline(transaction=False)
+    queue_reads(pipe, symbols)
+    return await fill_legacy(redis, decode_reads(symbols, await pipe.execute()))
@@ -2,14 +2,18 @@ import asyncio
 import os
 import asyncpg
 from redis.asyncio import Redis
-from datetime import datetime, time, date
+from datetime import time
 from pathlib import Path
 from dotenv import load_dotenv
 
-from SyncRedis import initialize_redis_symbols, sync_symbols_to_redis
+from SyncRedis import SymbolSync, ensure_notify_trigger
 from cleaner import run_cleanup
+from partitions import run_partition_maintenance
 from fetcher import run_fetcher
-import sys
+from backup import export_stock_price_history, commit_and_push
+from scheduler import Scheduler
+from metrics import start_metrics_server
+from coordination import LeaderElector, check_fences, ensure_fences_table
 
 #--------------------ENV--------------------
 
@@ -20,116 +24,52 @@ REDIS_URL = os.environ.get("REDIS_URL")
 DATABASE_URL = os.environ.get("DATABASE_URL")
 DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
 
-#--------------------POSTGRES LISTENER--------------------
-
-async def on_stock_change(conn, pid, channel, payload):
-    print("\n✅ Detected change in 'stocks' table. Syncing Redis...")
-    await sync_symbols_to_redis()
-
-async def listen_to_stock_changes():
-    try:
-        conn = await asyncpg.connect(DSN)
-        await conn.add_listener("stock_changed", on_stock_change)
-        print("✅ Listening to 'stock_changed' notifications from Postgres")
-        while True:
-            await asyncio.sleep(3600)
-    except Exception as e:
-        print(f"❌ LISTEN failed: {e}")
-
-#--------------------FLAGS--------------------
-
-fetcher_running = False
-cleanup_stock_done = False
-cleanup_predicted_done = False
-last_backup_day = None  # Track date of last successful backup
-
-#--------------------HELPERS--------------------
-
-async def table_not_empty(conn, table: str) -> bool:
-    try:
-        result = await conn.fetchval(f"SELECT EXISTS (SELECT 1 FROM {table} LIMIT 1);")
-        return result
-    except Exception as e:
-        print(f"❌ Failed to check {table}: {e}")
-        return False
-
-#--------------------TIME TRIGGERS--------------------
-
-async def time_based_trigger():
-    global fetcher_running, cleanup_stock_done, cleanup_predicted_done, last_backup_day
-
-    pg_pool = await asyncpg.create_pool(DSN)
-
-    while True:
-        now = datetime.utcnow()
-        current_time = now.time()
-        today = now.date()
-
-#--------------------BACKUP--------------------
-
-        if time(5, 0) <= current_time < time(5, 2):
-            if last_backup_day != today:
-                print("✅ Running backup.py for daily export...")
-                try:
-                    process = await asyncio.create_subprocess_exec(
-                        sys.executable, "backup.py",
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
-                    stdout, stderr = await process.communicate()
-
-                    if process.returncode == 0:
-                        print("✅ Backup completed successfully")
-                        print(stdout.decode().strip())
-                        last_backup_day = today
-                    else:
-                        print("❌ Backup failed")
-                        print(stderr.decode().strip())
-                except Exception as e:
-                    print(f"❌ Exception while running backup.py: {e}")
-
-#--------------------CLEANUP stock_price_history (00:05 UTC)--------------------
-
-        if time(5, 2) < current_time < time(5, 5) and not cleanup_stock_done:
-            async with pg_pool.acquire() as conn:
-                not_empty = await table_not_empty(conn, "stock_price_history")
-                if not_empty:
-                    print("✅ Running cleanup for stock_price_history")
-                    await run_cleanup()
-                else:
-                    print("✅ stock_price_history already empty — skipping")
-            cleanup_stock_done = True
-
-        if current_time >= time(5, 5):
-            cleanup_stock_done = False  # Reset flag
-
-#--------------------CLEANUP predicted_prices --------------------------------------------------
-
-        if current_time >= time(23, 0) and not cleanup_predicted_done:
-            async with pg_pool.acquire() as conn:
-                not_empty = await table_not_empty(conn, "predicted_prices")
-                if not_empty:
-                    print("✅ Running cleanup for predicted_prices")
-                    await run_cleanup()
-                else:
-                    print("✅ predicted_prices already empty — skipping")
-            cleanup_predicted_done = True
-
-        if current_time < time(23, 0):
-            cleanup_predicted_done = False  # Reset flag
-
-#--------------------FETCHER TRIGGER-------------------------------------------------------
-
-        if (current_time <= time(5, 0) or current_time >= time(5, 5)) and not fetcher_running:
-            print(f"✅ Starting fetcher at {current_time}")
-            asyncio.create_task(run_fetcher())
-            fetcher_running = True
-
-        if time(5, 0) <= current_time <= time(5,5):
-
-            fetcher_running = False  # Reset flag
-
-        await asyncio.sleep(30)
+#--------------------SCHEDULE (UTC)--------------------
+# Every job has exactly one instance: the scheduler restarts long-running ones when they crash and
+# never starts a cron run while the previous one is still going (see scheduler.py). With several trigger
+# replicas, singleton jobs only run on the elected leader and the fetcher splits symbols by partition
+# lease (see coordination.py).
+
+BACKUP_SCHEDULE = os.environ.get("BACKUP_SCHEDULE", "0 5 * * *")
+CLEANUP_SCHEDULE = os.environ.get("CLEANUP_SCHEDULE", "0 23 * * *")       # when predicted_prices is truncated
+PARTITION_SCHEDULE = os.environ.get("PARTITION_SCHEDULE", "0 * * * *")    # partitions are created days/hours ahead
+RECONCILE_SCHEDULE = os.environ.get("SYMBOL_RECONCILE_SCHEDULE", "*/30 * * * *")   # safety net behind NOTIFY deltas
+FETCHER_WINDOW = os.environ.get("FETCHER_WINDOW", "")                     # e.g. "13:30-20:00"; empty = always on
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9102"))               # fetcher + scheduler /metrics (0 = off)
+
+def parse_window(value: str):
+    if not value:
+        return None
+    start, end = value.split("-")
+    return time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+
+#--------------------JOBS--------------------
+
+async def backup_job(elector: LeaderElector):
+    tokens = elector.fence()   # the token this run was started under, fixed for the whole run
+    fence = lambda conn: check_fences(conn, tokens)
+    if not await export_stock_price_history(fence):
+        return  # nothing new (or export failed and was logged; the watermark makes the next run catch up)
+    if not await asyncio.to_thread(commit_and_push):
+        raise RuntimeError("Backup exported but push failed")
+
+async def cleanup_job(pg_pool):
+    if not await run_cleanup(pg_pool):
+        raise RuntimeError("Cleanup failed")
+
+def build_scheduler(pg_pool, symbol_sync: SymbolSync, elector: LeaderElector) -> Scheduler:
+    leader_service, leader_only = elector.leader_service, elector.leader_only
+    scheduler = Scheduler()
+    scheduler.service("leader-election", elector.run, backoff=1, max_backoff=10)
+    scheduler.service("fetcher", run_fetcher, window=parse_window(FETCHER_WINDOW))
+    scheduler.service("symbol-sync", leader_service(lambda: symbol_sync.listen(DSN)), backoff=3, max_backoff=60)
+    scheduler.cron("symbol-reconcile", RECONCILE_SCHEDULE, leader_only(symbol_sync.reconcile), jitter=30)
+    scheduler.cron("backup", BACKUP_SCHEDULE, leader_only(lambda: backup_job(elector)),
+                   jitter=60, retries=3, backoff=60)
+    scheduler.cron("cleanup", CLEANUP_SCHEDULE, leader_only(lambda: cleanup_job(pg_pool)), retries=2, backoff=60)
+    scheduler.cron("partitions", PARTITION_SCHEDULE, leader_only(lambda: run_partition_maintenance(pg_pool)),
+                   jitter=30, retries=3, backoff=30, run_at_start=True)
+    return scheduler
 
 #--------------------MAIN ENTRY--------------------
 
@@ -140,12 +80,20 @@ async def main():
     await redis.ping()
     print("✅ Redis connected")
 
-    await initialize_redis_symbols()
-
-    await asyncio.gather(
-        listen_to_stock_changes(),
-        time_based_trigger()
-    )
+    await start_metrics_server(METRICS_PORT)
+    pg_pool = await asyncpg.create_pool(DSN)
+    await ensure_notify_trigger(pg_pool)
+    await ensure_fences_table(pg_pool)
+
+    # Campaign once up front so run_at_start jobs already know whether this replica leads
+    elector = LeaderElector(redis, "trigger")
+    await elector.step()
+
+    # Seed stock:symbols before the fetcher starts; symbol-sync reconciles again once its LISTEN is attached
+    symbol_sync = SymbolSync(redis, pg_pool)
+    if elector.is_leader:
+        await symbol_sync.reconcile()
+    await build_scheduler(pg_pool, symbol_sync, elector).run(redis)
 
 if __name__ == "__main__":
     asyncio.run(main())
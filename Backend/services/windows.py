@@ -0,0 +1,144 @@
+# services/windows.py
+#
+# Sliding-window training samples for the price-direction classifier (Modelling/Stocks.ipynb).
+# Same samples and labels as the notebook loop, built from strided views instead of per-row appends.
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+WINDOW_SIZE = 60      # last 10 minutes (at 10s interval)
+LOOKAHEAD = 3         # next 30 seconds
+THRESHOLD = 0.003     # 0.3% for NEUTRAL zone
+
+DOWN, UP, NEUTRAL = 0, 1, 2
+CLASS_NAMES = {DOWN: "DOWN", UP: "UP", NEUTRAL: "NEUTRAL"}
+
+# -------------------- LABELS ---------------------
+
+def label_changes(current: np.ndarray, future: np.ndarray, threshold: float = THRESHOLD) -> np.ndarray:
+    change = (future - current) / current
+    labels = np.full(change.shape, NEUTRAL, dtype=np.int8)
+    labels[change > threshold] = UP
+    labels[change < -threshold] = DOWN
+    return labels
+
+# -------------------- PER-SYMBOL ---------------------
+
+def sample_count(n: int, window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD) -> int:
+    # Matches `for i in range(window, n - lookahead)` in the notebook
+    return max(n - lookahead - window, 0)
+
+def symbol_windows(prices: np.ndarray, timestamps: np.ndarray,
+                   window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD, threshold: float = THRESHOLD):
+    # X is a read-only strided view into `prices` — no window is copied here
+    count = sample_count(len(prices), window, lookahead)
+    if not count:
+        return np.empty((0, window), dtype=prices.dtype), np.empty(0, dtype=np.int8), timestamps[:0]
+
+    X = sliding_window_view(prices, window)[:count]
+    current = prices[window - 1:window - 1 + count]
+    future = prices[window + lookahead - 1:window + lookahead - 1 + count]
+    predict_times = timestamps[window + lookahead - 1:window + lookahead - 1 + count]
+    return X, label_changes(current, future, threshold), predict_times
+
+def group_bounds(stock_ids: np.ndarray) -> list[tuple[int, int, int]]:
+    # (stock_id, start, end) for input sorted by stock_id then time
+    starts = np.flatnonzero(np.r_[True, stock_ids[1:] != stock_ids[:-1]])
+    ends = np.r_[starts[1:], len(stock_ids)]
+    return [(stock_ids[s], s, e) for s, e in zip(starts, ends)]
+
+# -------------------- FULL DATASET ---------------------
+
+def build_dataset(stock_ids: np.ndarray, prices: np.ndarray, timestamps: np.ndarray,
+                  window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD, threshold: float = THRESHOLD):
+    # Inputs must be sorted by (stock_id, time). Returns X (n, window), y (n,), sample stock ids and
+    # predict times. X is allocated once at its final size and filled group by group.
+    prices = np.asarray(prices, dtype=np.float64)
+    bounds = group_bounds(np.asarray(stock_ids))
+    total = sum(sample_count(e - s, window, lookahead) for _, s, e in bounds)
+
+    X = np.empty((total, window), dtype=np.float64)
+    y = np.empty(total, dtype=np.int8)
+    sample_ids = np.empty(total, dtype=np.asarray(stock_ids).dtype)
+    predict_times = np.empty(total, dtype=np.asarray(timestamps).dtype)
+
+    pos = 0
+    for stock_id, s, e in bounds:
+        gX, gy, gt = symbol_windows(prices[s:e], timestamps[s:e], window, lookahead, threshold)
+        n = len(gy)
+        X[pos:pos + n] = gX
+        y[pos:pos + n] = gy
+        sample_ids[pos:pos + n] = stock_id
+        predict_times[pos:pos + n] = gt
+        pos += n
+    return X, y, sample_ids, predict_times
+
+# -------------------- BOUNDED-MEMORY BATCHES ---------------------
+
+def iter_batches(stock_ids: np.ndarray, prices: np.ndarray, timestamps: np.ndarray, batch_size: int = 4096,
+                 window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD, threshold: float = THRESHOLD):
+    # Yields fixed-size (X, y, stock_ids, predict_times) batches (the last one may be short).
+    # Only one batch of windows is ever materialised, whatever the history length.
+    prices = np.asarray(prices, dtype=np.float64)
+    groups = ((stock_id, *symbol_windows(prices[s:e], timestamps[s:e], window, lookahead, threshold))
+              for stock_id, s, e in group_bounds(np.asarray(stock_ids)))
+    yield from _rebatch(groups, batch_size, window, np.asarray(stock_ids).dtype, np.asarray(timestamps).dtype)
+
+def iter_archive_batches(archive, batch_size: int = 4096, start_ms: int = None, end_ms: int = None,
+                         window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD, threshold: float = THRESHOLD):
+    # Same as iter_batches, reading each symbol's time slice straight from a TickArchive memmap
+    def groups():
+        for stock_id in archive.stock_ids():
+            ts, px = archive.slice(stock_id, start_ms, end_ms)
+            yield (stock_id, *symbol_windows(px, ts, window, lookahead, threshold))
+    yield from _rebatch(groups(), batch_size, window, np.int64, np.int64)
+
+def _rebatch(groups, batch_size, window, id_dtype, time_dtype):
+    X = np.empty((batch_size, window), dtype=np.float64)
+    y = np.empty(batch_size, dtype=np.int8)
+    ids = np.empty(batch_size, dtype=id_dtype)
+    times = np.empty(batch_size, dtype=time_dtype)
+    fill = 0
+
+    for stock_id, gX, gy, gt in groups:
+        offset = 0
+        while offset < len(gy):
+            take = min(batch_size - fill, len(gy) - offset)
+            X[fill:fill + take] = gX[offset:offset + take]
+            y[fill:fill + take] = gy[offset:offset + take]
+            ids[fill:fill + take] = stock_id
+            times[fill:fill + take] = gt[offset:offset + take]
+            fill += take
+            offset += take
+            if fill == batch_size:
+                # Copies, because the buffers are reused for the next batch
+                yield X.copy(), y.copy(), ids.copy(), times.copy()
+                fill = 0
+
+    if fill:
+        yield X[:fill].copy(), y[:fill].copy(), ids[:fill].copy(), times[:fill].copy()
+
+# -------------------- REFERENCE LOOP ---------------------
+
+def build_dataset_loop(stock_ids, prices, timestamps,
+                       window: int = WINDOW_SIZE, lookahead: int = LOOKAHEAD, threshold: float = THRESHOLD):
+    # The notebook's original per-row loop, kept for parity checks and benchmarks/bench_windows.py
+    def get_label(curr_price, future_price, threshold):
+        change = (future_price - curr_price) / curr_price
+        if change > threshold:
+            return UP
+        elif change < -threshold:
+            return DOWN
+        else:
+            return NEUTRAL
+
+    X, y, ids, times = [], [], [], []
+    for stock_id, s, e in group_bounds(np.asarray(stock_ids)):
+        group_prices = prices[s:e]
+        group_times = timestamps[s:e]
+        for i in range(window, len(group_prices) - lookahead):
+            X.append(group_prices[i - window:i])
+            y.append(get_label(group_prices[i - 1], group_prices[i + lookahead - 1], threshold))
+            ids.append(stock_id)
+            times.append(group_times[i + lookahead - 1])
+    return np.array(X), np.array(y), np.array(ids), np.array(times)
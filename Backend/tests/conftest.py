@@ -0,0 +1,13 @@
+# tests/conftest.py
+#
+# Run from Backend/:  python -m pytest tests
+# The app imports `app.*` and `services.*`; the services import each other flat (`from metrics import ...`),
+# as they do when started from services/.
+
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+for path in (BACKEND, BACKEND / "services"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
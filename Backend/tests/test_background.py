@@ -0,0 +1,27 @@
+# tests/test_background.py
+
+import asyncio
+
+from services.background import keep_running
+
+def test_crashed_task_is_restarted_until_cancelled():
+    async def scenario():
+        runs = 0
+
+        async def flaky():
+            nonlocal runs
+            runs += 1
+            if runs < 3:
+                raise RuntimeError("boom")
+            await asyncio.Event().wait()
+
+        task = keep_running(flaky, "flaky", restart_delay=0)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert runs == 3 and not task.done()
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+
+    asyncio.run(scenario())
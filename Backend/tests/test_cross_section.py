@@ -0,0 +1,44 @@
+# tests/test_cross_section.py
+
+import asyncio
+
+import numpy as np
+
+from app.core.cross_section import CrossSection
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def filled(symbols: int = 20, buckets: int = 10) -> CrossSection:
+    clock = FakeClock()
+    cs = CrossSection(bucket_seconds=60, buckets=buckets, max_symbols=symbols, clock=clock)
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (symbols, buckets)), axis=1))
+    for col in range(buckets):
+        cs.update({f"SYM{i}": [float(closes[i, col]), None] for i in range(symbols)})
+        clock.now += 60
+    cs.roll()
+    return cs
+
+def test_owner_cancelled_while_waiter_shares_computation():
+    async def scenario():
+        cs = filled()
+        owner = asyncio.create_task(cs.correlation(5))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cs.correlation(5))
+        await asyncio.sleep(0)
+        owner.cancel()   # first client disconnects mid-computation
+
+        rows, corr = await waiter
+        assert owner.cancelled()
+        assert corr.shape == (len(rows), len(rows))
+        # Computed once, and cached despite its owner going away
+        assert cs.computations == 1
+        assert (await cs.correlation(5))[1] is corr
+        assert not cs._inflight
+
+    asyncio.run(scenario())
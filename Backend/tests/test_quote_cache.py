@@ -0,0 +1,64 @@
+# tests/test_quote_cache.py
+
+import asyncio
+
+import pytest
+
+from app.core import quote_cache
+from app.core.quote_cache import QuoteCache
+from services.trade_codec import Snapshot
+
+class SlowRedis:
+    # Stands in for read_snapshots: blocks until released, counting round trips
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.reads = 0
+
+    async def read_snapshots(self, redis, symbols):
+        self.reads += 1
+        await self.release.wait()
+        return {symbol: Snapshot(100.0, 1, 0.0, 1) for symbol in symbols}
+
+@pytest.fixture
+def slow(monkeypatch):
+    slow = SlowRedis()
+    monkeypatch.setattr(quote_cache, "read_snapshots", slow.read_snapshots)
+    return slow
+
+def test_owner_cancelled_while_waiter_coalesced(slow):
+    async def scenario():
+        cache = QuoteCache(ttl=60)
+        owner = asyncio.create_task(cache.get_many(None, ["AAPL"]))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_many(None, ["AAPL"]))
+        await asyncio.sleep(0)
+
+        owner.cancel()   # the client that started the read disconnects
+        await asyncio.sleep(0)
+        slow.release.set()
+
+        assert await waiter == {"AAPL": 100.0}
+        assert owner.cancelled()
+        assert slow.reads == 1 and cache.coalesced == 1
+        # The read finished and was cached even though its owner went away
+        assert await cache.get_many(None, ["AAPL"]) == {"AAPL": 100.0}
+        assert cache.hits == 1 and slow.reads == 1
+
+    asyncio.run(scenario())
+
+def test_failed_read_reaches_every_waiter(monkeypatch):
+    async def failing(redis, symbols):
+        await asyncio.sleep(0)
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(quote_cache, "read_snapshots", failing)
+
+    async def scenario():
+        cache = QuoteCache(ttl=60)
+        results = await asyncio.gather(
+            cache.get_many(None, ["AAPL"]), cache.get_many(None, ["AAPL"]), return_exceptions=True,
+        )
+        assert all(isinstance(r, ConnectionError) for r in results)
+        assert not cache._inflight
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+# tests/test_scheduler.py
+
+from datetime import datetime
+
+import pytest
+
+from services.scheduler import CronSchedule
+
+@pytest.mark.parametrize("expr, now, expected", [
+    # Strictly after `now`, even when `now` is itself a fire time; seconds are dropped
+    ("*/15 * * * *", datetime(2026, 10, 18, 10, 7, 30), datetime(2026, 10, 18, 10, 15)),
+    ("*/15 * * * *", datetime(2026, 10, 18, 10, 15), datetime(2026, 10, 18, 10, 30)),
+    ("*/15 * * * *", datetime(2026, 10, 18, 10, 14, 59, 999999), datetime(2026, 10, 18, 10, 15)),
+    # Day, month and year rollover
+    ("30 2 * * *", datetime(2026, 10, 18, 3, 0), datetime(2026, 10, 19, 2, 30)),
+    ("0 0 1 * *", datetime(2026, 1, 31, 12, 0), datetime(2026, 2, 1, 0, 0)),
+    ("0 0 1 1 *", datetime(2026, 12, 31, 23, 59), datetime(2027, 1, 1, 0, 0)),
+    # Feb 29 only exists in leap years
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29, 0, 0)),
+    # Ranges, lists and a start with a step
+    ("0 9-17/4 * * 1-5", datetime(2026, 10, 16, 17, 30), datetime(2026, 10, 19, 9, 0)),
+    ("5,55 * * * *", datetime(2026, 10, 18, 10, 6), datetime(2026, 10, 18, 10, 55)),
+    ("10/20 * * * *", datetime(2026, 10, 18, 10, 31), datetime(2026, 10, 18, 10, 50)),
+    # 7 is Sunday, like 0
+    ("0 9 * * 7", datetime(2026, 10, 18, 10, 0), datetime(2026, 10, 25, 9, 0)),
+    ("0 9 * * 0", datetime(2026, 10, 18, 8, 0), datetime(2026, 10, 18, 9, 0)),
+    # Day of month and day of week both restricted: either one matches
+    ("0 12 13 * 1", datetime(2026, 11, 10, 13, 0), datetime(2026, 11, 13, 12, 0)),
+    ("0 12 13 * 1", datetime(2026, 11, 13, 12, 0), datetime(2026, 11, 16, 12, 0)),
+    # Only day of month restricted: weekdays don't widen it
+    ("0 12 13 * *", datetime(2026, 11, 13, 12, 0), datetime(2026, 12, 13, 12, 0)),
+])
+def test_next_after(expr, now, expected):
+    assert CronSchedule(expr).next_after(now) == expected
+
+def test_schedule_that_never_fires():
+    with pytest.raises(ValueError, match="never fires"):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2026, 1, 1))
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "5-1 * * * *"])
+def test_invalid_expression(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
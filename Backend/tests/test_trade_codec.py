@@ -0,0 +1,20 @@
+# tests/test_trade_codec.py
+
+from trade_codec import SNAPSHOT_VERSION, Snapshot, decode_reads, encode
+
+def reply(values: dict) -> list:
+    # HMGET reply in SNAPSHOT_FIELDS order, as a decode_responses=True client returns it
+    return [None if values.get(f) is None else str(values[f]) for f in ("v", "p", "t", "vol", "at")]
+
+def test_bad_snapshot_only_fails_its_own_symbol():
+    good = reply(encode(101.5, 1_700_000_000_000, 3.0, 1_700_000_000_050))
+    future = reply({**encode(1.0, 1, 0, 1), "v": SNAPSHOT_VERSION + 1})
+    garbage = reply({"v": "x", "p": "1.0"})
+
+    snapshots = decode_reads(["AAPL", "NEXT", "BAD", "NONE"], [good, future, garbage, [None] * 5])
+    assert snapshots == {
+        "AAPL": Snapshot(101.5, 1_700_000_000_000, 3.0, 1_700_000_000_050),
+        "NEXT": None,
+        "BAD": None,
+        "NONE": None,
+    }